@@ -0,0 +1,141 @@
+"""Compare the KMP caption merge against the legacy overlap search.
+
+YouTube's auto-captions roll: each cue repeats the line(s) already on screen
+and appends one new line, so consecutive cues overlap by most of their
+words. This merges the cues of ``fixtures/rolling_auto_captions.srt`` (or of
+any auto-caption ``.srt`` fetched with ``yt-dlp --write-auto-subs``) and of
+longer synthetic cues built in the same shape, with the legacy
+implementation and with ``combine_caption_texts``, and checks both produce
+the same text.
+
+    python benchmarks/bench_caption_merge.py --cues 100 1000 10000
+    python benchmarks/bench_caption_merge.py --window 12 --words-per-line 8
+    python benchmarks/bench_caption_merge.py --filler-cues 2000
+    python benchmarks/bench_caption_merge.py --srt talk.en.srt
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from glancer.parser import parse_srt  # noqa: E402
+from glancer.slides import clean_captions, combine_caption_texts  # noqa: E402
+
+DESCRIPTION = "Compare the KMP caption merge against the legacy overlap search."
+
+# Filler-heavy speech, like the snippets in tests/test_captions.py
+WORDS = (
+    "um and yeah uh so basically this series is going to be as you already "
+    "know we can expect for the coming few days how can we make attention "
+    "mechanism so efficient as usual let's build out the popular choice in "
+    "modern models including llama from Alibaba and Gemma from Google"
+).split()
+
+FIXTURE = Path(__file__).parent / "fixtures" / "rolling_auto_captions.srt"
+
+
+def rolling_cues(cues: int, words_per_line: int, window: int, seed: int) -> list[str]:
+    """Cues that show the last ``window`` lines, one new line per cue."""
+    rng = random.Random(seed)
+    lines: list[str] = []
+    texts = []
+    for _ in range(cues):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(words_per_line)))
+        texts.append("\n".join(lines[-window:]))
+    return texts
+
+
+def filler_cues(cues: int) -> list[str]:
+    """A stretch of ``[Music]`` cues that accumulate instead of rolling.
+
+    Almost every overlap length nearly matches here, which is where the
+    legacy search goes quadratic in the cue length.
+    """
+    return [
+        " ".join(["[Music]"] * count + [f"cue{count}"]) for count in range(1, cues)
+    ]
+
+
+def legacy_combine_caption_texts(texts: list[str]) -> str:
+    """The original implementation, kept here as the baseline."""
+
+    def normalize(text: str) -> str:
+        return " ".join(text.strip().replace("\n", " ").split())
+
+    def overlapping_word_count(existing: list[str], following: list[str]) -> int:
+        for overlap in range(min(len(existing), len(following)), 4, -1):
+            if existing[-overlap:] == following[:overlap]:
+                return overlap
+        return 0
+
+    normalized = [normalize(normalize(text)) for text in texts]
+    normalized = [text for text in normalized if text]
+    if not normalized:
+        return ""
+    merged_words = normalized[0].split()
+    for text in normalized[1:]:
+        next_words = text.split()
+        overlap = overlapping_word_count(merged_words, next_words)
+        if overlap == len(next_words):
+            continue
+        merged_words.extend(next_words[overlap:])
+    return " ".join(merged_words)
+
+
+def compare(label: str, texts: list[str]) -> None:
+    started = time.perf_counter()
+    legacy = legacy_combine_caption_texts(texts)
+    legacy_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    merged = combine_caption_texts(texts)
+    merged_time = time.perf_counter() - started
+
+    if merged != legacy:
+        raise SystemExit(f"{label}: merged text differs from the legacy merge")
+    print(
+        f"{label:<24} legacy {legacy_time:8.3f}s  kmp {merged_time:8.3f}s  "
+        f"speedup {legacy_time / merged_time:6.1f}x  words={len(merged.split())}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--cues", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--words-per-line", type=int, default=7)
+    parser.add_argument(
+        "--window",
+        type=int,
+        nargs="+",
+        default=[2, 8, 32],
+        help="lines visible per cue; long windows mimic accumulating captions",
+    )
+    parser.add_argument(
+        "--filler-cues", type=int, nargs="+", default=[100, 300, 1_000]
+    )
+    parser.add_argument("--srt", type=Path, nargs="*", default=[FIXTURE])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for path in args.srt:
+        with path.open("rb") as handle:
+            captions = clean_captions(parse_srt(handle))
+        compare(path.name, list(captions.texts()))
+
+    for window in args.window:
+        for cues in args.cues:
+            texts = rolling_cues(cues, args.words_per_line, window, args.seed)
+            compare(f"cues={cues} window={window}", texts)
+
+    for cues in args.filler_cues:
+        compare(f"filler cues={cues}", filler_cues(cues))
+
+
+if __name__ == "__main__":
+    main()
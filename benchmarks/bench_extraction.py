@@ -0,0 +1,164 @@
+"""Compare the still extraction modes against the legacy chunked fan-out.
+
+Generates a synthetic video with ffmpeg's ``testsrc2`` source and extracts the
+stills each way, reporting wall time and CPU seconds spent in child processes.
+
+    python benchmarks/bench_extraction.py --duration 3600
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from glancer.process import (  # noqa: E402
+    EXTRACTION_MODES,
+    JPEG_QUALITY,
+    SECONDS_PER_SHOT,
+    _generate_shots,
+)
+
+DESCRIPTION = "Compare the still extraction modes against the legacy chunked fan-out."
+LEGACY_CHUNK_SECONDS = 300
+
+
+def make_synthetic_video(path: Path, duration: int, size: str, gop: int) -> None:
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc2=duration={duration}:size={size}:rate=25",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-g",
+            str(gop),
+            str(path),
+        ],
+        check=True,
+    )
+
+
+def run_ffmpeg(cmd: list[str]) -> None:
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"ffmpeg error: {result.stderr}", file=sys.stderr)
+        result.check_returncode()
+
+
+def delete_images(directory: Path) -> None:
+    for img_path in directory.glob("glancer-img*.jpg"):
+        img_path.unlink(missing_ok=True)
+
+
+def legacy_chunked_shots(directory: Path, filename: str, duration: int) -> None:
+    """The pre-single-pass extraction: one ffmpeg per 300s chunk plus shot 0."""
+    input_path = directory / f"{filename}.mp4"
+    encode = ["-pix_fmt", "yuvj420p", "-q:v", JPEG_QUALITY]
+    tasks = []
+    for start in range(0, duration, LEGACY_CHUNK_SECONDS):
+        length = min(LEGACY_CHUNK_SECONDS, duration - start)
+        fps = SECONDS_PER_SHOT if length >= SECONDS_PER_SHOT else max(1, length)
+        tasks.append(
+            [
+                "ffmpeg",
+                "-y",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-ss",
+                str(start),
+                "-t",
+                str(length),
+                "-i",
+                str(input_path),
+                "-vf",
+                f"fps=1/{fps}",
+                *encode,
+                "-start_number",
+                str(int(math.floor(start / SECONDS_PER_SHOT))),
+                str(directory / "glancer-img%04d.jpg"),
+            ]
+        )
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(len(tasks), (os.cpu_count() or 1) * 2))
+    ) as executor:
+        list(executor.map(run_ffmpeg, tasks))
+    run_ffmpeg(
+        [
+            "ffmpeg",
+            "-y",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-ss",
+            "3",
+            "-i",
+            str(input_path),
+            *encode,
+            "-vframes",
+            "1",
+            str(directory / "glancer-img0000.jpg"),
+        ]
+    )
+
+
+def measure(label: str, directory: Path, action) -> None:
+    delete_images(directory)
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    frames = action()
+    wall = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    if frames is None:
+        stills = len(list(directory.glob("glancer-img*.jpg")))
+    else:
+        stills = len(frames)
+    print(f"{label:<12} wall={wall:8.2f}s cpu={cpu:8.2f}s stills={stills}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--duration", type=int, default=3600, help="Seconds")
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--gop", type=int, default=250, help="Keyframe interval")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        print(f"Encoding {args.duration}s synthetic video at {args.size}...")
+        make_synthetic_video(directory / "synthetic.mp4", args.duration, args.size, args.gop)
+
+        measure(
+            "chunked",
+            directory,
+            lambda: legacy_chunked_shots(directory, "synthetic", args.duration),
+        )
+        for mode in EXTRACTION_MODES:
+            measure(
+                mode,
+                directory,
+                lambda mode=mode: _generate_shots(directory, "synthetic", "error", mode),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Scaling benchmark for the near-duplicate hash indexes.
+
+Runs first-occurrence duplicate detection over synthetic 64-bit hashes (random
+"slides" plus near copies of them) with every index in
+``glancer.hash_index.HASH_INDEXES`` and checks they all flag the same shots.
+
+    python benchmarks/bench_hash_index.py --sizes 1000 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from glancer.hash_index import HASH_INDEXES  # noqa: E402
+from glancer.image_similarity import ShotSimilarityConfig, _first_occurrences  # noqa: E402
+
+DESCRIPTION = "Scaling benchmark for the near-duplicate hash indexes."
+
+
+def synthetic_hashes(count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    slides = rng.integers(0, 2**64, size=count // 3 + 1, dtype=np.uint64)
+    hashes = slides[rng.integers(0, len(slides), size=count)]
+    noise = np.zeros(count, dtype=np.uint64)
+    for _ in range(4):
+        flips = rng.integers(0, 64, size=count).astype(np.uint64)
+        keep = rng.random(count) < 0.6
+        noise ^= np.where(keep, np.uint64(1) << flips, np.uint64(0))
+    return (hashes ^ noise).reshape(-1, 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--threshold", type=int, default=5)
+    parser.add_argument("--indexes", nargs="+", default=sorted(HASH_INDEXES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        hashes = synthetic_hashes(size, args.seed)
+        results: dict[str, dict[int, int]] = {}
+        for name in args.indexes:
+            cfg = ShotSimilarityConfig(threshold=args.threshold, index=name)
+            started = time.perf_counter()
+            results[name] = _first_occurrences(range(size), hashes, cfg)
+            elapsed = time.perf_counter() - started
+            print(
+                f"n={size:<8} {name:<12} {elapsed:9.3f}s "
+                f"duplicates={len(results[name])}"
+            )
+        if len({frozenset(result.items()) for result in results.values()}) != 1:
+            raise SystemExit(f"indexes disagree at n={size}")
+
+
+if __name__ == "__main__":
+    main()
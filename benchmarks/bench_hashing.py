@@ -0,0 +1,116 @@
+"""Compare batched NumPy hashing against the legacy per-image dHash loop.
+
+Writes a few thousand synthetic 720p stills that cycle through a set of
+"slides" with small per-frame noise, then runs duplicate detection with the
+legacy Python implementation and with ``find_similar_shots``.
+
+    python benchmarks/bench_hashing.py --stills 3000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageOps
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from glancer.frames import still_index  # noqa: E402
+from glancer.image_similarity import ShotSimilarityConfig, find_similar_shots  # noqa: E402
+
+DESCRIPTION = "Compare batched NumPy hashing against the legacy per-image dHash loop."
+
+
+def write_stills(directory: Path, count: int, slides: int, seed: int) -> None:
+    rng = random.Random(seed)
+    layouts = [
+        [
+            (
+                rng.randrange(0, 1000),
+                rng.randrange(0, 600),
+                rng.randrange(100, 280),
+                rng.randrange(40, 120),
+                tuple(rng.randrange(256) for _ in range(3)),
+            )
+            for _ in range(8)
+        ]
+        for _ in range(slides)
+    ]
+    for index in range(count):
+        image = Image.new("RGB", (1280, 720), (245, 245, 240))
+        draw = ImageDraw.Draw(image)
+        for x, y, width, height, color in layouts[(index // 3) % slides]:
+            draw.rectangle((x, y, x + width, y + height), fill=color)
+        # Speaker-cam style noise so consecutive frames are near, not exact, copies
+        x = rng.randrange(1100, 1200)
+        draw.ellipse((x, 600, x + 40, 640), fill=(rng.randrange(256), 80, 80))
+        image.save(directory / f"glancer-img{index:04d}.jpg", quality=85)
+
+
+def legacy_find_similar_shots(paths: list[Path], cfg: ShotSimilarityConfig) -> set[int]:
+    """The original per-image implementation, kept here as the baseline."""
+    duplicates: set[int] = set()
+    unique_hashes: list[int] = []
+    for path in sorted(paths):
+        shot_index = still_index(path.name)
+        if shot_index is None:
+            continue
+        with Image.open(path) as image:
+            resized = ImageOps.grayscale(image).resize(
+                (cfg.hash_size + 1, cfg.hash_size), Image.Resampling.LANCZOS
+            )
+            # Grayscale, so one byte per pixel, as getdata() would list them
+            pixels = list(resized.tobytes())
+        shot_hash = 0
+        bit_index = 0
+        for row in range(cfg.hash_size):
+            offset = row * (cfg.hash_size + 1)
+            for col in range(cfg.hash_size):
+                if pixels[offset + col] < pixels[offset + col + 1]:
+                    shot_hash |= 1 << bit_index
+                bit_index += 1
+        if any(
+            (shot_hash ^ existing).bit_count() <= cfg.threshold
+            for existing in unique_hashes
+        ):
+            duplicates.add(shot_index)
+        else:
+            unique_hashes.append(shot_hash)
+    return duplicates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--stills", type=int, default=3000)
+    parser.add_argument("--slides", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cfg = ShotSimilarityConfig()
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        print(f"Writing {args.stills} synthetic 720p stills...")
+        write_stills(directory, args.stills, args.slides, args.seed)
+        paths = list(directory.glob("glancer-img*.jpg"))
+
+        started = time.perf_counter()
+        legacy = legacy_find_similar_shots(paths, cfg)
+        legacy_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        batched = find_similar_shots(paths, cfg)
+        batched_time = time.perf_counter() - started
+
+    print(f"legacy   {legacy_time:8.2f}s duplicates={len(legacy)}")
+    print(f"batched  {batched_time:8.2f}s duplicates={len(batched)}")
+    print(f"speedup  {legacy_time / batched_time:8.1f}x")
+    print(f"decisions that differ: {len(legacy ^ batched)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Measure the bytes a PDF build writes besides the PDF itself.
+
+Builds every PDF layout of a synthetic talk, first writing the stills into
+each build directory (no ``stills_dir``) and then with a ``stills_dir``,
+where the stills are stored once and hard-linked into every build. Bytes
+are counted with ``/proc/self/io``'s ``wchar`` (Linux only), which covers
+everything this process writes: stills, the ``.typ`` file and any copies.
+Typst itself isn't run, so neither it nor the PDF count and the benchmark
+works without it. Exits non-zero when a build
+reusing stored stills writes more than ``--max-fraction`` of the still
+bytes, so it can gate CI.
+
+    python benchmarks/bench_pdf_staging.py --stills 240 --width 1280
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from PIL import Image  # noqa: E402
+
+from glancer import pdf_builder  # noqa: E402
+from glancer.frames import Frame, FrameStore  # noqa: E402
+from glancer.parser import Caption  # noqa: E402
+from glancer.process import Video  # noqa: E402
+from glancer.typst_compiler import TypstBuild  # noqa: E402
+
+DESCRIPTION = "Measure the bytes a PDF build writes besides the PDF itself."
+# Layout name -> (compact, slide_mode)
+LAYOUTS = {
+    "pdf": (False, False),
+    "pdf-compact": (True, False),
+    "pdf-slide": (False, True),
+}
+
+
+def written_bytes() -> int:
+    for line in Path("/proc/self/io").read_text().splitlines():
+        name, _, value = line.partition(":")
+        if name == "wchar":
+            return int(value)
+    raise SystemExit("no wchar in /proc/self/io")
+
+
+def synthetic_stills(count: int, width: int, seed: int) -> FrameStore:
+    """Noisy stills, so JPEG can't shrink them to nothing."""
+    rng = random.Random(seed)
+    height = width * 9 // 16
+    frames = FrameStore()
+    for index in range(count):
+        image = Image.effect_noise((width, height), 40 + rng.random() * 20)
+        output = io.BytesIO()
+        image.convert("RGB").save(output, "JPEG", quality=85)
+        frames.add(Frame(index, output.getvalue(), timestamp=index * 30.0))
+    return frames
+
+
+def build(
+    frames: FrameStore,
+    captions: list[Caption],
+    output: Path,
+    stills_dir: Path | None,
+    compact: bool,
+    slide_mode: bool,
+) -> tuple[int, float]:
+    before = written_bytes()
+    started = time.perf_counter()
+    pdf_builder.convert_to_pdf(
+        Video("http://example.com/watch?v=x", "Talk", "x"),
+        frames,
+        captions,
+        output,
+        detect_duplicates=False,
+        compact=compact,
+        slide_mode=slide_mode,
+        stills_dir=stills_dir,
+    )
+    return written_bytes() - before, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--stills", type=int, default=240)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-fraction", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if not Path("/proc/self/io").exists():
+        raise SystemExit("needs /proc/self/io (Linux) to count written bytes")
+    # Write the .typ file as a real build would, then stop
+    write_only = patch.object(
+        TypstBuild,
+        "compile",
+        lambda build, content, output_path: (
+            build.main_file.write_text("".join(content), encoding="utf-8")
+        ),
+    )
+
+    frames = synthetic_stills(args.stills, args.width, args.seed)
+    still_bytes = sum(len(frame.data) for frame in frames)
+    captions = [
+        Caption(index * 30.0, index * 30.0 + 29, f"caption {index}")
+        for index in range(args.stills)
+    ]
+    print(f"{args.stills} stills, {still_bytes / 1e6:.1f}MB")
+
+    worst_linked = 0
+    with write_only, tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = Path(tmp_dir)
+        for mode in ("written", "linked"):
+            stills_dir = tmp_path / "stills" if mode == "linked" else None
+            for layout, (compact, slide_mode) in LAYOUTS.items():
+                written, seconds = build(
+                    frames,
+                    captions,
+                    tmp_path / f"{mode}-{layout}.pdf",
+                    stills_dir,
+                    compact,
+                    slide_mode,
+                )
+                print(
+                    f"{mode:8} {layout:12} {written / 1e6:8.2f}MB written "
+                    f"({written / still_bytes:6.1%} of stills) {seconds:6.2f}s"
+                )
+                if mode == "linked" and layout != "pdf":
+                    worst_linked = max(worst_linked, written)
+
+    if worst_linked > args.max_fraction * still_bytes:
+        raise SystemExit(
+            f"PDF builds with stored stills wrote {worst_linked} bytes, more "
+            f"than {args.max_fraction:.0%} of the {still_bytes} still bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
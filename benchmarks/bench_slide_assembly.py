@@ -0,0 +1,138 @@
+"""Slide assembly cost as caption and shot counts grow.
+
+Buckets synthetic captions into slides with the legacy per-caption
+implementation and with ``captions_per_slide``, checking they agree, then
+times "captions overlapping [t0, t1)" queries on a ``CaptionIndex`` against
+a linear scan.
+
+    python benchmarks/bench_slide_assembly.py --captions 1000 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import html
+import math
+import random
+import re
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from glancer.parser import Caption, CaptionIndex, CaptionStore  # noqa: E402
+from glancer.slides import SECONDS_PER_SHOT, captions_per_slide  # noqa: E402
+
+DESCRIPTION = "Slide assembly cost as caption and shot counts grow."
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+def synthetic_captions(count: int, seconds: float, seed: int) -> list[Caption]:
+    rng = random.Random(seed)
+    step = seconds / count
+    captions = []
+    for index in range(count):
+        start = round(index * step, 3)
+        end = round(start + step * rng.uniform(0.8, 2.5), 3)
+        captions.append(Caption(start, end, f"caption <i>{index}</i> &amp; more"))
+    return captions
+
+
+def legacy_captions_per_slide(captions: list[Caption]) -> list[list[Caption]]:
+    """The original implementation, kept here as the baseline."""
+    cleaned = []
+    for caption in captions:
+        text = TAG_RE.sub("", html.unescape(caption.text)).replace("\u00a0", " ")
+        cleaned.append(replace(caption, text=text.strip()))
+    cleaned = [caption for caption in cleaned if caption.text]
+    if not cleaned:
+        return []
+    total_shots = max(1, int(math.floor(cleaned[-1].end / SECONDS_PER_SHOT)))
+    slides: list[list[Caption]] = [[] for _ in range(total_shots)]
+    for caption in cleaned:
+        if caption.end <= 0:
+            slides[0].append(caption)
+            continue
+        on_boundary = math.isclose(caption.end % SECONDS_PER_SHOT, 0.0, abs_tol=1e-9)
+        anchor = caption.end
+        if on_boundary and caption.start < caption.end:
+            anchor -= 1e-9
+        index = int(anchor // SECONDS_PER_SHOT)
+        slides[min(max(index, 0), total_shots - 1)].append(caption)
+    return slides
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(
+        "--captions", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument(
+        "--shots",
+        type=int,
+        nargs="+",
+        default=[100, 1_000],
+        help="video length in 30s shots",
+    )
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for shots in args.shots:
+        for count in args.captions:
+            captions = synthetic_captions(count, shots * SECONDS_PER_SHOT, args.seed)
+            store = CaptionStore.from_captions(captions)
+
+            legacy, legacy_time = timed(legacy_captions_per_slide, captions)
+            slides, store_time = timed(captions_per_slide, store)
+            if [list(slide) for slide in slides] != legacy:
+                raise SystemExit(f"slides differ at captions={count} shots={shots}")
+            print(
+                f"captions={count:<7} shots={shots:<5} assembly: "
+                f"legacy {legacy_time:7.3f}s  store {store_time:7.3f}s  "
+                f"speedup {legacy_time / store_time:5.1f}x"
+            )
+
+            rng = random.Random(args.seed)
+            windows = []
+            for _ in range(args.queries):
+                start = rng.uniform(0, shots * SECONDS_PER_SHOT)
+                windows.append((start, start + rng.uniform(5, 60)))
+            index, build_time = timed(CaptionIndex, store)
+
+            def scan() -> int:
+                return sum(
+                    sum(
+                        1
+                        for caption in captions
+                        if caption.start < end
+                        and (caption.end > start or caption.start >= start)
+                    )
+                    for start, end in windows
+                )
+
+            def query() -> int:
+                return sum(
+                    len(index.overlapping(start, end)) for start, end in windows
+                )
+
+            scanned, scan_time = timed(scan)
+            queried, query_time = timed(query)
+            if scanned != queried:
+                raise SystemExit(f"range queries differ at captions={count}")
+            print(
+                f"{'':<27} {args.queries} queries: scan {scan_time:7.3f}s  "
+                f"index {query_time:7.3f}s (+{build_time:.3f}s build)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measure CLI startup and fail if it regresses past a budget.
+
+Imports ``glancer.cli`` in fresh interpreters with ``-X importtime`` and
+checks the median cumulative import time against ``--budget-ms``, then
+times ``glancer --help`` end to end. Exits non-zero when over budget or when
+a heavy dependency (NumPy, Pillow, Jinja2) loads at startup, so it can gate
+CI.
+
+    python benchmarks/bench_startup.py --runs 15 --budget-ms 120
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+DESCRIPTION = "Measure CLI startup and fail if it regresses past a budget."
+ROOT = Path(__file__).parent.parent
+HEAVY_MODULES = ("numpy", "PIL", "jinja2")
+
+
+def import_time_ms() -> float:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import glancer.cli"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        _, _, fields = line.partition("import time:")
+        parts = [part.strip() for part in fields.split("|")]
+        if len(parts) == 3 and parts[2] == "glancer.cli":
+            return int(parts[1]) / 1000
+    raise SystemExit("glancer.cli missing from -X importtime output")
+
+
+def help_time_ms() -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "glancer.cli", "--help"],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    return (time.perf_counter() - started) * 1000
+
+
+def heavy_modules_at_startup() -> list[str]:
+    check = (
+        "import sys, glancer.cli; "
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=120.0)
+    args = parser.parse_args()
+
+    # The first run compiles bytecode; don't count it
+    import_time_ms()
+    imports = statistics.median(import_time_ms() for _ in range(args.runs))
+    help_run = statistics.median(help_time_ms() for _ in range(args.runs))
+    heavy = heavy_modules_at_startup()
+
+    print(f"import glancer.cli  {imports:7.1f}ms (median of {args.runs})")
+    print(f"glancer --help      {help_run:7.1f}ms wall clock")
+    print(f"heavy modules       {', '.join(heavy) or 'none'}")
+
+    if heavy:
+        raise SystemExit(f"startup imports {', '.join(heavy)}")
+    if imports > args.budget_ms:
+        raise SystemExit(
+            f"startup regressed: {imports:.1f}ms > {args.budget_ms:.1f}ms budget"
+        )
+
+
+if __name__ == "__main__":
+    main()
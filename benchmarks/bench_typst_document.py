@@ -0,0 +1,180 @@
+"""Compare Typst escaping strategies and the streamed ``.typ`` writer.
+
+Escapes the merged captions of synthetic slides (full of Typst markup) with
+``escape_typst``'s sequential replacements, a translate table and a single
+regex, checking all three agree. Then builds the document in every layout
+the legacy way (nested into one f-string, then written) and with
+``typst_stream`` written chunk by chunk, reporting time and peak memory and
+checking both files are byte-identical.
+
+    python benchmarks/bench_typst_document.py --slides 1000
+    python benchmarks/bench_typst_document.py --slides 100 1000 5000 --runs 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from glancer import pdf_builder  # noqa: E402
+from glancer.parser import Caption, CaptionStore  # noqa: E402
+from glancer.process import Video  # noqa: E402
+from glancer.slides import Slide  # noqa: E402
+
+DESCRIPTION = "Compare Typst escaping strategies and the streamed ``.typ`` writer."
+WORDS = (
+    "so the #1 thing about $cost is *really* the_cache <T> @scale "
+    "[citation] and a\\path or two we keep coming back to"
+).split()
+LAYOUTS = {
+    "pdf": (False, False),
+    "pdf-compact": (True, False),
+    "pdf-slide": (False, True),
+}
+TRANSLATE_TABLE = str.maketrans({char: f"\\{char}" for char in "\\#$*_<>@[]"})
+SPECIAL = re.compile(r"[\\#$*_<>@\[\]]")
+
+
+def translate_escape(text: str) -> str:
+    return text.translate(TRANSLATE_TABLE)
+
+
+def regex_escape(text: str) -> str:
+    return SPECIAL.sub(lambda match: "\\" + match.group(), text)
+
+
+def legacy_generate_typst(
+    video: Video, slides: list[Slide], image_dir: Path, compact: bool, slide_mode: bool
+) -> str:
+    blocks = []
+    for slide in slides:
+        if slide_mode:
+            block = pdf_builder.render_slide_page(slide, video.url, image_dir)
+        elif compact:
+            block = pdf_builder.render_slide_compact(slide, video.url, image_dir)
+        else:
+            block = pdf_builder.render_slide_typst(slide, video.url, image_dir)
+        if block:
+            blocks.append(block)
+    slides_content = "\n".join(blocks)
+    if slide_mode:
+        header = pdf_builder.generate_header_slide_mode(video)
+        return f"""{header}
+
+{slides_content}
+"""
+    header = pdf_builder.generate_header(video, compact)
+    gutter = "0.3cm" if compact else "0.4cm"
+    return f"""{header}
+
+#columns(2, gutter: {gutter})[
+{slides_content}
+]
+"""
+
+
+def synthetic_slides(count: int, seed: int) -> list[Slide]:
+    rng = random.Random(seed)
+    slides = []
+    for index in range(count):
+        texts = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(8)]
+        captions = CaptionStore.from_captions(
+            Caption(index * 30.0 + cue, index * 30.0 + cue + 3, text)
+            for cue, text in enumerate(texts)
+        )
+        slides.append(Slide(index, captions, False, index * 30))
+    return slides
+
+
+def measure(runs: int, function) -> tuple[float, int]:
+    """Best time of ``runs`` and peak traced memory of one more run."""
+    seconds = best_of(runs, function)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def best_of(runs: int, function) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--slides", type=int, nargs="+", default=[1000])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    video = Video("http://example.com/watch?v=x", "Talk about #markup", "x")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_dir = Path(tmp_dir)
+        for count in args.slides:
+            slides = synthetic_slides(count, args.seed)
+            for index in range(count):
+                (image_dir / f"img{index:04d}.jpg").touch()
+            # Merged once up front, as every renderer shares them
+            texts = [slide.text for slide in slides]
+            escaped = [pdf_builder.escape_typst(text) for text in texts]
+            timings = {}
+            for name, escape in [
+                ("replace", pdf_builder.escape_typst),
+                ("translate", translate_escape),
+                ("regex", regex_escape),
+            ]:
+                if [escape(text) for text in texts] != escaped:
+                    raise SystemExit(f"{name} escaping differs")
+                timings[name] = best_of(
+                    args.runs, lambda: [escape(text) for text in texts]
+                )
+            print(
+                f"{count} slides: escaping "
+                + ", ".join(f"{name} {t * 1000:.1f}ms" for name, t in timings.items())
+            )
+
+            for layout, (compact, slide_mode) in LAYOUTS.items():
+                legacy_path = image_dir / "legacy.typ"
+                streamed_path = image_dir / "streamed.typ"
+
+                def legacy() -> None:
+                    document = legacy_generate_typst(
+                        video, slides, image_dir, compact, slide_mode
+                    )
+                    legacy_path.write_text(document, encoding="utf-8")
+
+                def streamed() -> None:
+                    document = pdf_builder.typst_stream(
+                        video, slides, image_dir, compact, slide_mode
+                    )
+                    with streamed_path.open("w", encoding="utf-8") as handle:
+                        handle.writelines(document)
+
+                before, before_peak = measure(args.runs, legacy)
+                after, after_peak = measure(args.runs, streamed)
+                if legacy_path.read_bytes() != streamed_path.read_bytes():
+                    raise SystemExit(f"{layout}: streamed document differs")
+                print(
+                    f"  {layout:12} {before * 1000:7.1f}ms -> {after * 1000:6.1f}ms, "
+                    f"peak {before_peak / 1e6:6.2f}MB -> {after_peak / 1e6:5.2f}MB, "
+                    "identical"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+STAGES_NAME = "stages.json"
+LOCK_DIR_NAME = "locks"
+
+
+def default_cache_root() -> Path:
+    return Path(tempfile.gettempdir()) / "glancer"
+
+
+class VideoCache:
+    """Downloaded videos, one directory per video id under ``root``.
+
+    ``manifest.json`` records every entry's artifact sizes and when it was
+    last used. Entries are locked with a file lock while a run uses them, so
+    concurrent runs (in one process or many sharing the root) never work on
+    the same video's files at once. With ``max_bytes``, closing an entry
+    evicts the least recently used entries nobody holds until the cache
+    fits.
+    """
+
+    def __init__(self, root: Path | None = None, max_bytes: int | None = None) -> None:
+        self.root = root or default_cache_root()
+        self.max_bytes = max_bytes
+        (self.root / LOCK_DIR_NAME).mkdir(parents=True, exist_ok=True)
+
+    def open(self, video_id: str) -> CacheEntry:
+        """Lock ``video_id``'s entry, waiting for other users, and create it."""
+        lock = _open_lock(self.root / LOCK_DIR_NAME / f"{video_id}.lock")
+        _lock(lock, blocking=True)
+        entry = CacheEntry(self, video_id, lock)
+        entry.path.mkdir(parents=True, exist_ok=True)
+        with self._manifest() as manifest:
+            record = manifest.setdefault(video_id, {"artifacts": {}, "size": 0})
+            record["last_access"] = time.time()
+        return entry
+
+    def total_size(self) -> int:
+        with self._manifest() as manifest:
+            return sum(record["size"] for record in manifest.values())
+
+    def evict(self, max_bytes: int | None = None) -> list[str]:
+        """Delete least recently used entries until the cache fits.
+
+        Entries another run holds are skipped. Returns the evicted ids.
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if limit is None:
+            return []
+        evicted: list[str] = []
+        with self._manifest() as manifest:
+            self._adopt_unknown_directories(manifest)
+            total = sum(record["size"] for record in manifest.values())
+            by_age = sorted(manifest, key=lambda key: manifest[key]["last_access"])
+            for video_id in by_age:
+                if total <= limit:
+                    break
+                lock = _open_lock(self.root / LOCK_DIR_NAME / f"{video_id}.lock")
+                try:
+                    if not _lock(lock, blocking=False):
+                        continue
+                    shutil.rmtree(self.root / video_id, ignore_errors=True)
+                finally:
+                    lock.close()
+                total -= manifest.pop(video_id)["size"]
+                evicted.append(video_id)
+        if evicted:
+            logger.debug(f"Evicted {len(evicted)} cached videos: {evicted}")
+        return evicted
+
+    @contextmanager
+    def _manifest(self) -> Iterator[dict[str, dict[str, Any]]]:
+        """The manifest, locked for a read-modify-write and saved atomically."""
+        path = self.root / MANIFEST_NAME
+        with _open_lock(self.root / LOCK_DIR_NAME / "manifest.lock") as lock:
+            _lock(lock, blocking=True)
+            try:
+                manifest = json.loads(path.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                manifest = {}
+            yield manifest
+            temporary = temporary_path(path)
+            temporary.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+            os.replace(temporary, path)
+
+    def _adopt_unknown_directories(self, manifest: dict[str, dict[str, Any]]) -> None:
+        # Directories from older versions or from runs that never finished;
+        # only ones holding a glancer download, never unrelated directories
+        for directory in self.root.iterdir():
+            if (
+                directory.is_dir()
+                and directory.name not in manifest
+                and _is_video_directory(directory)
+            ):
+                artifacts = _artifact_sizes(directory)
+                manifest[directory.name] = {
+                    "artifacts": artifacts,
+                    "size": sum(artifacts.values()),
+                    "last_access": directory.stat().st_mtime,
+                }
+
+
+class CacheEntry:
+    """One video's cache directory, locked until :meth:`close` or :meth:`remove`."""
+
+    def __init__(self, cache: VideoCache, video_id: str, lock: IO[bytes]) -> None:
+        self.cache = cache
+        self.video_id = video_id
+        self.path = cache.root / video_id
+        self.stages = StageManifest(self.path)
+        self._lock = lock
+
+    def close(self) -> None:
+        """Record the entry's artifacts, unlock it and evict to the budget."""
+        if self._lock.closed:
+            return
+        artifacts = _artifact_sizes(self.path)
+        with self.cache._manifest() as manifest:
+            manifest[self.video_id] = {
+                "artifacts": artifacts,
+                "size": sum(artifacts.values()),
+                "last_access": time.time(),
+            }
+        self._lock.close()
+        self.cache.evict()
+
+    def remove(self) -> None:
+        """Delete the entry's files and unlock it."""
+        if self._lock.closed:
+            return
+        shutil.rmtree(self.path, ignore_errors=True)
+        with self.cache._manifest() as manifest:
+            manifest.pop(self.video_id, None)
+        self._lock.close()
+
+    def __enter__(self) -> CacheEntry:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class StageManifest:
+    """The outputs of each stage run on a cache entry, keyed by their inputs.
+
+    A stage records the inputs it ran with (video id, extraction mode,
+    sampling interval, quality, fingerprints of the files it read...), the
+    artifacts it wrote and any small outputs. A later run looks its inputs
+    up and reuses the result when all artifacts are still there, so it
+    resumes from the first stage whose inputs changed. Each stage keeps one
+    record per distinct set of inputs, e.g. stills of both extraction modes.
+
+    The entry's lock serializes access, so the file itself isn't locked.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.path = directory / STAGES_NAME
+
+    def get(self, stage: str, inputs: dict[str, Any]) -> dict[str, Any] | None:
+        record = self._load().get(stage, {}).get(stage_key(inputs))
+        if record is None or record["inputs"] != inputs:
+            return None
+        if not all((self.directory / name).exists() for name in record["artifacts"]):
+            return None
+        return record["outputs"]
+
+    def known(self, stage: str) -> bool:
+        """Whether ``stage`` recorded anything here, under any inputs."""
+        return bool(self._load().get(stage))
+
+    def put(
+        self,
+        stage: str,
+        inputs: dict[str, Any],
+        outputs: dict[str, Any] | None = None,
+        artifacts: list[str] | None = None,
+    ) -> None:
+        stages = self._load()
+        stages.setdefault(stage, {})[stage_key(inputs)] = {
+            "inputs": inputs,
+            "outputs": outputs or {},
+            "artifacts": artifacts or [],
+        }
+        temporary = temporary_path(self.path)
+        temporary.write_text(json.dumps(stages, indent=1), encoding="utf-8")
+        os.replace(temporary, self.path)
+
+    def _load(self) -> dict[str, dict[str, dict[str, Any]]]:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+
+def stage_key(inputs: dict[str, Any]) -> str:
+    """Short digest of a stage's inputs, also used to name its artifacts."""
+    # Imported here to keep it off the CLI's startup path
+    import hashlib
+
+    encoded = json.dumps(inputs, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def temporary_path(path: Path) -> Path:
+    """A unique sibling of ``path`` to write before renaming over it."""
+    import uuid
+
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+
+
+def file_fingerprint(path: Path) -> dict[str, int]:
+    """Size and modification time, enough to tell a re-downloaded file apart."""
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _is_video_directory(directory: Path) -> bool:
+    return any(
+        (directory / f"{directory.name}{suffix}").exists()
+        for suffix in (".mp4", ".en.srt")
+    )
+
+
+def _artifact_sizes(directory: Path) -> dict[str, int]:
+    """Size of every file in ``directory``, and the total of each subdirectory."""
+    sizes = {}
+    for path in directory.iterdir():
+        if path.is_file():
+            sizes[path.name] = path.stat().st_size
+        elif path.is_dir():
+            sizes[path.name] = sum(
+                child.stat().st_size for child in path.rglob("*") if child.is_file()
+            )
+    return sizes
+
+
+def _open_lock(path: Path) -> IO[bytes]:
+    return path.open("a+b")
+
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock(file: IO[bytes], blocking: bool) -> bool:
+        mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), mode, 1)
+                return True
+            except OSError:
+                # LK_LOCK gives up after ten seconds, so keep waiting
+                if not blocking:
+                    return False
+
+else:
+    import fcntl
+
+    def _lock(file: IO[bytes], blocking: bool) -> bool:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(file.fileno(), flags)
+        except BlockingIOError:
+            return False
+        return True
@@ -4,13 +4,36 @@ import argparse
 import logging
 import re
 import sys
+from dataclasses import replace
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional, Sequence, Tuple
 
-from .slides import convert_to_html
-from .pdf_builder import convert_to_pdf
-from .parser import parse_srt
+from .cache import CacheEntry, VideoCache
+from .output_images import IMAGE_CODECS, ImageOptions, supported_codecs
+from .outputs import OUTPUT_FORMATS, OUTPUT_SUFFIXES, output_format
+from .pipeline import DEFAULT_STAGE_WORKERS, STAGE_NAMES, Stage, run_pipeline
 from .playlist import Playlist
-from .process import cleanup_cache, delete_images, process_video
+from .process import (
+    EXTRACTION_MODES,
+    DownloadProfile,
+    FetchedVideo,
+    RemoteStream,
+    Video,
+    download_for_extraction,
+    generate_stills,
+    get_video_metadata,
+    process_video,
+)
+from .typst_compiler import DEFAULT_TYPST_WORKERS, TYPST_BACKENDS, TypstCompiler
+
+if TYPE_CHECKING:
+    from .hash_store import HashStore
+
+
+# Where a video's cache entry keeps the stills its PDFs are compiled from
+PDF_STILLS_DIR_NAME = "pdf-stills"
+# Where, under the cache root, Typst builds PDFs
+TYPST_BUILD_DIR_NAME = "typst"
 
 
 def _ensure_html_suffix(path: Path) -> Path:
@@ -21,10 +44,46 @@ def _ensure_pdf_suffix(path: Path) -> Path:
     return path.with_suffix(".pdf") if path.suffix.lower() != ".pdf" else path
 
 
+def _output_paths(output_path: Path, outputs: Sequence[str]) -> dict[str, Path]:
+    """Where each output goes; several outputs share ``output_path``'s stem."""
+    if len(outputs) == 1:
+        [output] = outputs
+        if output == "html":
+            return {output: _ensure_html_suffix(output_path)}
+        return {output: _ensure_pdf_suffix(output_path)}
+    stem = output_path.with_suffix("")
+    return {
+        output: stem.with_name(stem.name + OUTPUT_SUFFIXES[output])
+        for output in outputs
+    }
+
+
 def _sanitize_filename(filename: str) -> str:
     return re.sub(r'[<>:"/\\|?*]', "_", filename)
 
 
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def _byte_size(value: str) -> int:
+    """Parse sizes like ``800000``, ``500K`` or ``5M`` for argparse."""
+    match = re.fullmatch(r"\s*([0-9]+)\s*([KMG]?)i?B?\s*", value, re.IGNORECASE)
+    if match is None:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+    number, unit = match.groups()
+    return int(number) * _SIZE_UNITS[unit.upper()]
+
+
+def _stage_workers(value: str) -> tuple[str, int]:
+    """Parse ``STAGE=N`` for argparse."""
+    name, _, count = value.partition("=")
+    if name not in STAGE_NAMES or not count.isdigit() or int(count) < 1:
+        raise argparse.ArgumentTypeError(
+            f"expected STAGE=N with STAGE one of {', '.join(STAGE_NAMES)}"
+        )
+    return name, int(count)
+
+
 def run(
     url: str,
     destination: str | None,
@@ -34,18 +93,91 @@ def run(
     output_pdf: bool,
     compact: bool,
     slide_mode: bool,
+    extraction: str = "decode",
+    hash_workers: int | None = None,
+    skip_seen_slides: bool = False,
+    external_assets: bool = False,
+    images: ImageOptions | None = None,
+    stage_workers: dict[str, int] | None = None,
+    playlist_items: str | None = None,
+    cache_dir: str | None = None,
+    cache_size: int | None = None,
+    outputs: Sequence[str] | None = None,
+    typst_backend: str = "auto",
+    typst_workers: int | None = None,
+    download_profile: DownloadProfile | None = None,
 ) -> None:
+    """Render ``url`` (a video or a playlist) to ``destination``.
+
+    ``outputs`` lists the formats to write (see
+    :data:`~glancer.outputs.OUTPUT_FORMATS`); by default the one
+    ``output_pdf``, ``compact`` and ``slide_mode`` select. Every PDF of the
+    run goes through one Typst compiler with ``typst_workers`` workers.
+    """
+    # These pull in NumPy, Pillow and Jinja2, so they're imported on first use:
+    # `glancer --help` and argument errors don't pay for them.
+    from .hash_store import HashStore
+
     ffmpeg_log_level = "info" if verbose else "error"
 
     # Use current directory if no destination provided, we'll create a new file with the video name
     dest_path = Path(destination) if destination else Path.cwd()
+    cache = VideoCache(Path(cache_dir) if cache_dir else None, cache_size)
+    # Only opened (and the database created) when something reads the hashes
+    hash_store = (
+        HashStore(cache.root / "hashes.sqlite")
+        if detect_duplicates or skip_seen_slides
+        else None
+    )
+    # Builds next to the cache, so stills are hard-linked rather than copied
+    compiler = TypstCompiler(
+        typst_workers, typst_backend, cache.root / TYPST_BUILD_DIR_NAME
+    )
+
+    try:
+        if Playlist.is_playlist(url):
+            print(f"Processing playlist: {url}", file=sys.stderr)
+            seen_video_ids: list[str] = []
 
-    if Playlist.is_playlist(url):
-        playlist = Playlist(url)
-        print(f"Processing playlist: {url}", file=sys.stderr)
-        for video_url in playlist:
+            def render(fetched: FetchedVideo) -> Video:
+                video = process_and_save_video(
+                    fetched[1].url,
+                    dest_path,
+                    ffmpeg_log_level,
+                    auto_cleanup,
+                    detect_duplicates,
+                    output_pdf,
+                    compact,
+                    slide_mode,
+                    extraction,
+                    hash_workers,
+                    hash_store,
+                    tuple(seen_video_ids) if skip_seen_slides else (),
+                    external_assets,
+                    images,
+                    fetched=fetched,
+                    outputs=outputs,
+                    compiler=compiler,
+                )
+                seen_video_ids.append(video.video_id)
+                return video
+
+            stages = playlist_stages(
+                ffmpeg_log_level,
+                extraction,
+                render,
+                stage_workers,
+                cache,
+                download_profile,
+            )
+            if skip_seen_slides:
+                # Each video is compared against the ones rendered before it
+                stages[-1] = replace(stages[-1], workers=1)
+            for _ in run_pipeline(Playlist(url, playlist_items), stages):
+                pass
+        else:
             process_and_save_video(
-                video_url,
+                url,
                 dest_path,
                 ffmpeg_log_level,
                 auto_cleanup,
@@ -53,18 +185,91 @@ def run(
                 output_pdf,
                 compact,
                 slide_mode,
+                extraction,
+                hash_workers,
+                hash_store,
+                external_assets=external_assets,
+                images=images,
+                cache=cache,
+                outputs=outputs,
+                compiler=compiler,
+                download_profile=download_profile,
             )
-    else:
-        process_and_save_video(
-            url,
-            dest_path,
-            ffmpeg_log_level,
-            auto_cleanup,
-            detect_duplicates,
-            output_pdf,
-            compact,
-            slide_mode,
-        )
+    finally:
+        if hash_store is not None:
+            hash_store.close()
+        compiler.close()
+
+
+# What the download stage hands to extraction: the video, its locked cache
+# entry, the captions and, for remote extraction, the stream
+Downloaded = Tuple[Video, CacheEntry, Path, Optional[RemoteStream]]
+
+
+def playlist_stages(
+    ffmpeg_log_level: str,
+    extraction: str,
+    render: Callable[[FetchedVideo], Video],
+    stage_workers: dict[str, int] | None = None,
+    cache: VideoCache | None = None,
+    download_profile: DownloadProfile | None = None,
+) -> list[Stage]:
+    """The steps of :func:`process_video`, then ``render``, as pipeline stages."""
+    workers = {**DEFAULT_STAGE_WORKERS, **(stage_workers or {})}
+    cache = cache or VideoCache()
+
+    def metadata(entry: Video) -> Video:
+        # Flat-playlist entries usually carry the title and duration already
+        video = entry if entry.title else get_video_metadata(entry.url)
+        print(f"Processing video: '{video.title}'", file=sys.stderr)
+        return video
+
+    def download(video: Video) -> Downloaded:
+        # Held until the video is rendered, so nothing evicts it in between
+        entry = cache.open(video.video_id)
+        try:
+            captions_path, stream = download_for_extraction(
+                video, entry.path, extraction, download_profile
+            )
+            return video, entry, captions_path, stream
+        except BaseException:
+            entry.close()
+            raise
+
+    def extract(downloaded: Downloaded) -> FetchedVideo:
+        video, entry, captions_path, stream = downloaded
+        try:
+            frames = generate_stills(
+                entry.path,
+                video.video_id,
+                ffmpeg_log_level,
+                extraction,
+                video.duration,
+                stream,
+            )
+        except BaseException:
+            entry.close()
+            raise
+        return entry, video, captions_path, frames
+
+    # Videos the pipeline stopped before rendering unlock their entries
+    def release_downloaded(downloaded: Downloaded) -> None:
+        downloaded[1].close()
+
+    def release_fetched(fetched: FetchedVideo) -> None:
+        fetched[0].close()
+
+    functions = {
+        "metadata": metadata,
+        "download": download,
+        "extract": extract,
+        "render": render,
+    }
+    cleanups = {"download": release_downloaded, "extract": release_fetched}
+    return [
+        Stage(name, functions[name], workers[name], cleanups.get(name))
+        for name in STAGE_NAMES
+    ]
 
 
 def process_and_save_video(
@@ -76,42 +281,75 @@ def process_and_save_video(
     output_pdf: bool,
     compact: bool,
     slide_mode: bool,
-) -> None:
-    dir_path, video, captions_path = process_video(url, ffmpeg_log_level)
+    extraction: str = "decode",
+    hash_workers: int | None = None,
+    hash_store: HashStore | None = None,
+    seen_video_ids: tuple[str, ...] = (),
+    external_assets: bool = False,
+    images: ImageOptions | None = None,
+    fetched: FetchedVideo | None = None,
+    cache: VideoCache | None = None,
+    outputs: Sequence[str] | None = None,
+    compiler: TypstCompiler | None = None,
+    download_profile: DownloadProfile | None = None,
+) -> Video:
+    """Fetch a video (unless ``fetched`` already holds it) and render it.
+
+    Every format in ``outputs`` is rendered from the same slides. The
+    video's cache entry is released afterwards, or deleted with
+    ``auto_cleanup``.
+    """
+    from .hash_store import HashCache
+    from .image_similarity import ShotSimilarityConfig
+    from .outputs import render_outputs
+    from .parser import load_captions
+
+    outputs = outputs or [output_format(output_pdf, compact, slide_mode)]
+    similarity = ShotSimilarityConfig(workers=hash_workers)
+    if fetched is None:
+        fetched = process_video(
+            url, ffmpeg_log_level, extraction, cache, download_profile
+        )
+    entry, video, captions_path, frames = fetched
+    hash_cache = (
+        HashCache(
+            hash_store, video.video_id, extraction, seen_video_ids, frames.key or ""
+        )
+        if hash_store is not None
+        else None
+    )
     try:
-        captions_text = captions_path.read_text(encoding="utf-8")
-        parsed = parse_srt(captions_text)
+        parsed = load_captions(captions_path)
 
         if destination.is_dir():
             output_path = destination / _sanitize_filename(video.title)
         else:
             output_path = destination
 
-        if output_pdf:
-            destination_path = _ensure_pdf_suffix(output_path.expanduser())
-            destination_path.parent.mkdir(parents=True, exist_ok=True)
-            print(f"Writing PDF to {destination_path}", file=sys.stderr)
-            convert_to_pdf(
-                video,
-                dir_path,
-                parsed,
-                destination_path,
-                detect_duplicates,
-                compact,
-                slide_mode,
-            )
-        else:
-            html = convert_to_html(video, dir_path, parsed, detect_duplicates)
-            destination_path = _ensure_html_suffix(output_path.expanduser())
-            destination_path.parent.mkdir(parents=True, exist_ok=True)
-            print(f"Writing HTML to {destination_path}", file=sys.stderr)
-            destination_path.write_text(html, encoding="utf-8")
-
+        paths = _output_paths(output_path.expanduser(), outputs)
+        for output, path in paths.items():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            kind = "HTML" if output == "html" else "PDF"
+            print(f"Writing {kind} to {path}", file=sys.stderr)
+        render_outputs(
+            video,
+            frames,
+            parsed,
+            paths,
+            detect_duplicates,
+            similarity,
+            hash_cache,
+            external_assets,
+            images,
+            stills_dir=entry.path / PDF_STILLS_DIR_NAME,
+            compiler=compiler,
+        )
     finally:
         if auto_cleanup:
-            cleanup_cache(dir_path)
+            entry.remove()
         else:
-            delete_images(dir_path)
+            entry.close()
+    return video
 
 
 def main(argv: list[str] | None = None) -> None:
@@ -145,7 +383,39 @@ def main(argv: list[str] | None = None) -> None:
     parser.add_argument(
         "--pdf",
         action="store_true",
-        help="Output as PDF instead of HTML (requires typst CLI)",
+        help=(
+            "Output as PDF instead of HTML (requires the typst Python bindings "
+            "from the 'pdf' extra, or else the typst CLI)"
+        ),
+    )
+    parser.add_argument(
+        "--output",
+        choices=OUTPUT_FORMATS,
+        action="append",
+        default=[],
+        metavar="FORMAT",
+        help=(
+            f"Write this format ({', '.join(OUTPUT_FORMATS)}); repeat it to "
+            "render several from one run, named after the destination's stem"
+        ),
+    )
+    parser.add_argument(
+        "--typst-backend",
+        choices=TYPST_BACKENDS,
+        default="auto",
+        help=(
+            "How PDFs are compiled: 'bindings' in-process through the typst "
+            "Python package, keeping fonts loaded between documents, "
+            "'subprocess' with the typst CLI; 'auto' uses the bindings when "
+            "they're installed"
+        ),
+    )
+    parser.add_argument(
+        "--typst-workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help=f"PDFs compiled at once (default: {DEFAULT_TYPST_WORKERS})",
     )
     parser.add_argument(
         "--compact-experimental",
@@ -157,7 +427,154 @@ def main(argv: list[str] | None = None) -> None:
         action="store_true",
         help="One slide per page for easy arrow-key navigation (experimental)",
     )
+    parser.add_argument(
+        "--extraction",
+        choices=EXTRACTION_MODES,
+        default="decode",
+        help=(
+            "How stills are extracted: 'decode' decodes the whole video once, "
+            "'seek' decodes only around each exact 30s timestamp, "
+            "'keyframe' decodes only the nearest keyframe (fastest on long videos) "
+            "and 'remote' seeks like 'seek' in the online video without "
+            "downloading it, fetching only the parts around each timestamp"
+        ),
+    )
+    parser.add_argument(
+        "--lean-download",
+        action="store_true",
+        help=(
+            "Download only a video stream, without audio or the merge step, "
+            "fetching fragments concurrently; glancer never uses the audio"
+        ),
+    )
+    parser.add_argument(
+        "--max-height",
+        type=int,
+        default=720,
+        metavar="PIXELS",
+        help="Tallest video downloaded, which stills are taken at (default: 720)",
+    )
+    parser.add_argument(
+        "--download-fragments",
+        type=int,
+        default=4,
+        metavar="N",
+        help="With --lean-download, fragments downloaded at once (default: 4)",
+    )
+    parser.add_argument(
+        "--remote-connections",
+        type=int,
+        default=4,
+        metavar="N",
+        help="With --extraction remote, requests to the video at once (default: 4)",
+    )
+    parser.add_argument(
+        "--hash-workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Threads used to hash stills for duplicate detection (default: all cores)",
+    )
+    parser.add_argument(
+        "--skip-seen-slides",
+        action="store_true",
+        help=(
+            "For playlists, don't embed slides already shown in an earlier "
+            "video of the playlist (e.g. shared intro or sponsor slides)"
+        ),
+    )
+    parser.add_argument(
+        "--external-assets",
+        action="store_true",
+        help=(
+            "Write stills to an assets/ directory next to the HTML, named by "
+            "content hash, instead of embedding them (HTML output only)"
+        ),
+    )
+    parser.add_argument(
+        "--image-width",
+        type=int,
+        default=None,
+        metavar="PIXELS",
+        help="Downscale stills wider than this before embedding them",
+    )
+    parser.add_argument(
+        "--image-codec",
+        choices=tuple(IMAGE_CODECS),
+        default="jpeg",
+        help="Codec stills are embedded in (webp and avif need Pillow support)",
+    )
+    parser.add_argument(
+        "--image-quality",
+        type=int,
+        default=None,
+        metavar="Q",
+        help="Encoder quality from 1 to 95 (default: keep the extracted JPEGs)",
+    )
+    parser.add_argument(
+        "--image-budget",
+        type=_byte_size,
+        default=None,
+        metavar="SIZE",
+        help=(
+            "Total size allowed for a document's stills, e.g. 5M; the highest "
+            "quality that fits is picked"
+        ),
+    )
+    parser.add_argument(
+        "--image-workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Threads used to re-encode stills (default: all cores)",
+    )
+    parser.add_argument(
+        "--stage-workers",
+        type=_stage_workers,
+        action="append",
+        default=[],
+        metavar="STAGE=N",
+        help=(
+            "For playlists, videos a stage works on at once; stages are "
+            f"{', '.join(STAGE_NAMES)} (default: "
+            + ", ".join(f"{n}={w}" for n, w in DEFAULT_STAGE_WORKERS.items())
+            + ")"
+        ),
+    )
+    parser.add_argument(
+        "--playlist-items",
+        default=None,
+        metavar="SPEC",
+        help=(
+            "Only process these playlist entries, in yt-dlp's --playlist-items "
+            "syntax: '11:' resumes at the 11th video, '1:10' takes the first ten"
+        ),
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        metavar="PATH",
+        help="Where downloads are cached (default: $TMPDIR/glancer)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=_byte_size,
+        default=None,
+        metavar="SIZE",
+        help=(
+            "Evict the least recently used cached videos beyond this size, "
+            "e.g. 20G (default: no limit)"
+        ),
+    )
     args = parser.parse_args(argv)
+    if args.image_codec != "jpeg" and args.image_codec not in supported_codecs():
+        parser.error(f"this Pillow build can't encode {args.image_codec}")
+
+    outputs = list(args.output)
+    if args.pdf or not outputs:
+        outputs.append(
+            output_format(args.pdf, args.compact_experimental, args.slide_experimental)
+        )
 
     log_level = logging.DEBUG if args.verbose else logging.WARNING
     logging.getLogger().setLevel(log_level)
@@ -171,6 +588,30 @@ def main(argv: list[str] | None = None) -> None:
         output_pdf=args.pdf,
         compact=args.compact_experimental,
         slide_mode=args.slide_experimental,
+        extraction=args.extraction,
+        hash_workers=args.hash_workers,
+        skip_seen_slides=args.skip_seen_slides,
+        external_assets=args.external_assets,
+        images=ImageOptions(
+            codec=args.image_codec,
+            width=args.image_width,
+            quality=args.image_quality,
+            byte_budget=args.image_budget,
+            workers=args.image_workers,
+        ),
+        stage_workers=dict(args.stage_workers),
+        playlist_items=args.playlist_items,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size,
+        outputs=list(dict.fromkeys(outputs)),
+        typst_backend=args.typst_backend,
+        typst_workers=args.typst_workers,
+        download_profile=DownloadProfile(
+            lean=args.lean_download,
+            max_height=args.max_height,
+            fragments=args.download_fragments,
+            connections=args.remote_connections,
+        ),
     )
 
 
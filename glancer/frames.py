@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .cache import temporary_path
+
+# (width, height) of the grayscale thumbnail decoded alongside every still,
+# sized for the default 8x8 difference hash.
+DEFAULT_THUMBNAIL_SIZE = (9, 8)
+
+STILL_PATTERN = "glancer-img*.jpg"
+
+# File suffix of every media type a still can be (re-)encoded to
+IMAGE_SUFFIXES = {"image/jpeg": ".jpg", "image/webp": ".webp", "image/avif": ".avif"}
+
+
+@dataclass(frozen=True)
+class Frame:
+    index: int
+    data: bytes
+    thumbnail: bytes | None = None
+    thumbnail_size: tuple[int, int] | None = None
+    timestamp: float | None = None
+    media_type: str = "image/jpeg"
+
+    @property
+    def suffix(self) -> str:
+        return IMAGE_SUFFIXES[self.media_type]
+
+
+class FrameStore:
+    """In-memory stills of one video keyed by shot index.
+
+    Extraction fills the store straight from ffmpeg's stdout so the encoded
+    JPEGs never touch the disk; duplicate detection, HTML embedding and the
+    PDF build all read from it. ``key`` identifies the extraction the stills
+    came from, so values cached from them can tell a re-extraction apart.
+    """
+
+    def __init__(self, frames: Iterable[Frame] = (), key: str | None = None) -> None:
+        self._frames: dict[int, Frame] = {}
+        self.key = key
+        for frame in frames:
+            self.add(frame)
+
+    def add(self, frame: Frame) -> None:
+        self._frames[frame.index] = frame
+
+    def get(self, index: int) -> Frame | None:
+        return self._frames.get(index)
+
+    def indexes(self) -> list[int]:
+        return sorted(self._frames)
+
+    def shot_times(self) -> dict[int, float]:
+        return {
+            frame.index: frame.timestamp
+            for frame in self
+            if frame.timestamp is not None
+        }
+
+    def write_pack(self, path: Path) -> None:
+        """Save every still, thumbnail and timestamp to one file.
+
+        The file is a little-endian length, a JSON index and then the image
+        and thumbnail bytes back to back, written atomically so a partial
+        pack is never read back.
+        """
+        index = []
+        for frame in self:
+            index.append(
+                {
+                    "index": frame.index,
+                    "size": len(frame.data),
+                    "thumbnail": (
+                        None if frame.thumbnail is None else len(frame.thumbnail)
+                    ),
+                    "thumbnail_size": frame.thumbnail_size,
+                    "timestamp": frame.timestamp,
+                    "media_type": frame.media_type,
+                }
+            )
+        header = json.dumps(index).encode("utf-8")
+        temporary = temporary_path(path)
+        with temporary.open("xb") as output:
+            output.write(len(header).to_bytes(8, "little"))
+            output.write(header)
+            for frame in self:
+                output.write(frame.data)
+                if frame.thumbnail is not None:
+                    output.write(frame.thumbnail)
+        os.replace(temporary, path)
+
+    @classmethod
+    def read_pack(cls, path: Path) -> FrameStore:
+        """Load the stills saved by :meth:`write_pack`."""
+        data = path.read_bytes()
+        header_size = int.from_bytes(data[:8], "little")
+        position = 8 + header_size
+        store = cls()
+        for entry in json.loads(data[8:position]):
+            image = data[position : position + entry["size"]]
+            position += entry["size"]
+            thumbnail = None
+            if entry["thumbnail"] is not None:
+                thumbnail = data[position : position + entry["thumbnail"]]
+                position += entry["thumbnail"]
+            thumbnail_size = entry["thumbnail_size"]
+            store.add(
+                Frame(
+                    entry["index"],
+                    image,
+                    thumbnail,
+                    tuple(thumbnail_size) if thumbnail_size else None,
+                    entry["timestamp"],
+                    entry["media_type"],
+                )
+            )
+        return store
+
+    def __contains__(self, index: object) -> bool:
+        return index in self._frames
+
+    def __iter__(self) -> Iterator[Frame]:
+        return (self._frames[index] for index in self.indexes())
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @classmethod
+    def from_directory(cls, directory: Path) -> FrameStore:
+        """Load ``glancer-img*.jpg`` stills written by older runs or by tests."""
+        store = cls()
+        for path in directory.glob(STILL_PATTERN):
+            index = still_index(path.name)
+            if index is not None:
+                store.add(Frame(index=index, data=path.read_bytes()))
+        return store
+
+
+def as_frame_store(frames: FrameStore | Path) -> FrameStore:
+    if isinstance(frames, FrameStore):
+        return frames
+    return FrameStore.from_directory(frames)
+
+
+def still_index(filename: str) -> int | None:
+    stem = filename.removesuffix(".jpg")
+    if not stem.startswith("glancer-img"):
+        return None
+    try:
+        number = int(stem.replace("glancer-img", ""))
+    except ValueError:
+        return None
+    return number
+
+
+def split_jpegs(data: bytes) -> list[bytes]:
+    """Split a concatenated MJPEG stream (ffmpeg's image2pipe) into images.
+
+    Marker segments are skipped by their declared length and the entropy-coded
+    data is scanned for the EOI marker, so bytes inside headers or tables can
+    never be mistaken for an image boundary.
+    """
+    images: list[bytes] = []
+    position = data.find(b"\xff\xd8")
+    while position != -1:
+        end = _jpeg_end(data, position)
+        if end is None:
+            break
+        images.append(data[position:end])
+        position = data.find(b"\xff\xd8", end)
+    return images
+
+
+def _jpeg_end(data: bytes, start: int) -> int | None:
+    position = start + 2
+    size = len(data)
+    while position + 4 <= size:
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xD9:
+            return position + 2
+        if marker == 0xFF:
+            # Fill byte before a marker
+            position += 1
+            continue
+        length = int.from_bytes(data[position + 2 : position + 4], "big")
+        position += 2 + length
+        if marker != 0xDA:
+            continue
+        # Start of scan: entropy-coded data runs until the next real marker
+        while position + 1 < size:
+            if data[position] == 0xFF:
+                following = data[position + 1]
+                if following == 0x00 or 0xD0 <= following <= 0xD7:
+                    position += 2
+                    continue
+                break
+            position += 1
+    if position + 2 <= size and data[position : position + 2] == b"\xff\xd9":
+        return position + 2
+    return None
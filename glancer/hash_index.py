@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from typing import Callable, Protocol
+
+import numpy as np
+
+
+class HashIndex(Protocol):
+    """Near-duplicate lookup over packed ``uint64`` perceptual hashes.
+
+    Every implementation answers exactly the same questions: is there a hash
+    already in the index whose Hamming distance to ``candidate`` is at most
+    ``threshold``, and which is the first one added? Hashes are numbered in
+    the order they're added. They only differ in how fast they scale.
+    """
+
+    def add(self, candidate: np.ndarray) -> None: ...
+
+    def has_near(self, candidate: np.ndarray) -> bool: ...
+
+    def first_near(self, candidate: np.ndarray) -> int | None: ...
+
+
+class LinearHashIndex:
+    """Vectorized popcount of the candidate against every stored hash."""
+
+    def __init__(self, threshold: int, words: int) -> None:
+        self.threshold = threshold
+        self._hashes = np.empty((64, words), dtype=np.uint64)
+        self._count = 0
+
+    def add(self, candidate: np.ndarray) -> None:
+        if self._count == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.empty_like(self._hashes)])
+        self._hashes[self._count] = candidate
+        self._count += 1
+
+    def has_near(self, candidate: np.ndarray) -> bool:
+        if not self._count:
+            return False
+        distances = hamming_distances(self._hashes[: self._count], candidate)
+        return bool((distances <= self.threshold).any())
+
+    def first_near(self, candidate: np.ndarray) -> int | None:
+        if not self._count:
+            return None
+        distances = hamming_distances(self._hashes[: self._count], candidate)
+        matches = np.flatnonzero(distances <= self.threshold)
+        return int(matches[0]) if len(matches) else None
+
+
+class BKTreeIndex:
+    """Burkhard-Keller tree keyed by Hamming distance.
+
+    The triangle inequality prunes every subtree whose edge distance lies
+    outside ``[d - threshold, d + threshold]``.
+    """
+
+    def __init__(self, threshold: int, words: int) -> None:
+        self.threshold = threshold
+        # Each node is (value, number, {distance: child})
+        self._root: tuple[int, int, dict[int, tuple]] | None = None
+        self._count = 0
+
+    def add(self, candidate: np.ndarray) -> None:
+        value, number = _as_int(candidate), self._count
+        self._count += 1
+        if self._root is None:
+            self._root = (value, number, {})
+            return
+        node = self._root
+        while True:
+            distance = (value ^ node[0]).bit_count()
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, number, {})
+                return
+            node = child
+
+    def has_near(self, candidate: np.ndarray) -> bool:
+        if self._root is None:
+            return False
+        value = _as_int(candidate)
+        pending = [self._root]
+        while pending:
+            node_value, _, children = pending.pop()
+            distance = (value ^ node_value).bit_count()
+            if distance <= self.threshold:
+                return True
+            low, high = distance - self.threshold, distance + self.threshold
+            pending.extend(
+                child for edge, child in children.items() if low <= edge <= high
+            )
+        return False
+
+    def first_near(self, candidate: np.ndarray) -> int | None:
+        if self._root is None:
+            return None
+        value = _as_int(candidate)
+        first = None
+        pending = [self._root]
+        while pending:
+            node_value, number, children = pending.pop()
+            distance = (value ^ node_value).bit_count()
+            if distance <= self.threshold and (first is None or number < first):
+                first = number
+            low, high = distance - self.threshold, distance + self.threshold
+            pending.extend(
+                child for edge, child in children.items() if low <= edge <= high
+            )
+        return first
+
+
+class MultiIndexHash:
+    """Exact lookups on ``threshold + 1`` disjoint bit bands.
+
+    By the pigeonhole principle two hashes within ``threshold`` bits agree
+    exactly on at least one band, so only hashes sharing a band value with the
+    candidate need their full distance checked.
+    """
+
+    def __init__(self, threshold: int, words: int) -> None:
+        self.threshold = threshold
+        self._bits = bits = words * 64
+        # Past ``bits - 1`` every pair is within the threshold; one band is enough
+        bands = threshold + 1 if threshold < bits else 1
+        edges = [round(band * bits / bands) for band in range(bands + 1)]
+        self._bands = [
+            (start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])
+        ]
+        # Band value -> hashes having it, in the order added
+        self._tables: list[dict[int, list[int]]] = [{} for _ in self._bands]
+        # Hash -> number of its first copy
+        self._numbers: dict[int, int] = {}
+        self._count = 0
+
+    def add(self, candidate: np.ndarray) -> None:
+        value = _as_int(candidate)
+        for table, key in zip(self._tables, self._keys(value)):
+            table.setdefault(key, []).append(value)
+        self._numbers.setdefault(value, self._count)
+        self._count += 1
+
+    def has_near(self, candidate: np.ndarray) -> bool:
+        if self.threshold >= self._bits:
+            return bool(self._count)
+        value = _as_int(candidate)
+        for table, key in zip(self._tables, self._keys(value)):
+            for existing in table.get(key, ()):
+                if (value ^ existing).bit_count() <= self.threshold:
+                    return True
+        return False
+
+    def first_near(self, candidate: np.ndarray) -> int | None:
+        if self.threshold >= self._bits:
+            return 0 if self._count else None
+        value = _as_int(candidate)
+        first = None
+        for table, key in zip(self._tables, self._keys(value)):
+            # Bands list their hashes in the order added, so a band's first
+            # match is its earliest
+            for existing in table.get(key, ()):
+                if (value ^ existing).bit_count() <= self.threshold:
+                    number = self._numbers[existing]
+                    if first is None or number < first:
+                        first = number
+                    break
+        return first
+
+    def _keys(self, value: int) -> list[int]:
+        return [(value >> start) & mask for start, mask in self._bands]
+
+
+HASH_INDEXES: dict[str, Callable[[int, int], HashIndex]] = {
+    "linear": LinearHashIndex,
+    "bktree": BKTreeIndex,
+    "multi-index": MultiIndexHash,
+}
+
+
+def make_hash_index(name: str, threshold: int, words: int) -> HashIndex:
+    try:
+        factory = HASH_INDEXES[name]
+    except KeyError:
+        raise ValueError(f"Unknown hash index: {name}") from None
+    return factory(threshold, words)
+
+
+def hamming_distances(hashes: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Bit distance between ``candidate`` and every row of ``hashes``."""
+    return _popcount(np.bitwise_xor(hashes, candidate)).sum(axis=1)
+
+
+def _as_int(candidate: np.ndarray) -> int:
+    packed = np.ascontiguousarray(candidate, dtype="<u8").tobytes()
+    return int.from_bytes(packed, "little")
+
+
+if hasattr(np, "bitwise_count"):
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(values)
+
+else:  # numpy < 2.0
+    _BYTE_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], np.uint8)
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        as_bytes = values.view(np.uint8).reshape(*values.shape, 8)
+        return _BYTE_POPCOUNT[as_bytes].sum(axis=-1)
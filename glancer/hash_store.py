@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shot_hashes (
+    video_id TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    hash_size INTEGER NOT NULL,
+    shot INTEGER NOT NULL,
+    hash BLOB NOT NULL,
+    stills TEXT NOT NULL,
+    PRIMARY KEY (video_id, variant, hash_size, shot)
+) WITHOUT ROWID
+"""
+
+
+class HashStore:
+    """Perceptual hashes persisted across runs, keyed by video id and shot.
+
+    ``variant`` separates stills of the same video that were extracted
+    differently (e.g. the extraction mode), since their hashes differ.
+    ``stills`` records which extraction the saved hashes came from; a video
+    keeps only its latest, and hashes of other stills aren't loaded.
+    Render workers share the store, so one lock serializes every statement
+    on its connection.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._connection:
+            columns = {
+                row[1]
+                for row in self._connection.execute("PRAGMA table_info(shot_hashes)")
+            }
+            if columns and "stills" not in columns:
+                # Hashes from before stills were recorded can't be validated
+                self._connection.execute("DROP TABLE shot_hashes")
+            self._connection.execute(SCHEMA)
+
+    def load(
+        self, video_id: str, variant: str, hash_size: int, stills: str = ""
+    ) -> tuple[list[int], np.ndarray]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT shot, hash FROM shot_hashes WHERE video_id = ? "
+                "AND variant = ? AND hash_size = ? AND stills = ? ORDER BY shot",
+                (video_id, variant, hash_size, stills),
+            ).fetchall()
+        return [shot for shot, _ in rows], _unpack([blob for _, blob in rows], hash_size)
+
+    def load_videos(
+        self, video_ids: Iterable[str], variant: str, hash_size: int
+    ) -> np.ndarray:
+        blobs: list[bytes] = []
+        with self._lock:
+            for video_id in video_ids:
+                blobs.extend(
+                    blob
+                    for (blob,) in self._connection.execute(
+                        "SELECT hash FROM shot_hashes "
+                        "WHERE video_id = ? AND variant = ? AND hash_size = ?",
+                        (video_id, variant, hash_size),
+                    )
+                )
+        return _unpack(blobs, hash_size)
+
+    def save(
+        self,
+        video_id: str,
+        variant: str,
+        hash_size: int,
+        shots: list[int],
+        hashes: np.ndarray,
+        stills: str = "",
+    ) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM shot_hashes "
+                "WHERE video_id = ? AND variant = ? AND hash_size = ?",
+                (video_id, variant, hash_size),
+            )
+            self._connection.executemany(
+                "INSERT INTO shot_hashes VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        video_id,
+                        variant,
+                        hash_size,
+                        shot,
+                        row.astype("<u8").tobytes(),
+                        stills,
+                    )
+                    for shot, row in zip(shots, hashes)
+                ],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+@dataclass(frozen=True)
+class HashCache:
+    """Where a video's hashes are persisted and which videos it may repeat.
+
+    ``seen_video_ids`` lists the videos processed before this one in the same
+    playlist; shots matching their slides are reported as already seen.
+    ``stills`` is the key of the stills being hashed (see
+    :attr:`~glancer.frames.FrameStore.key`).
+    """
+
+    store: HashStore
+    video_id: str
+    variant: str
+    seen_video_ids: tuple[str, ...] = ()
+    stills: str = ""
+
+
+def _unpack(blobs: list[bytes], hash_size: int) -> np.ndarray:
+    words = -(-(hash_size * hash_size) // 64)
+    if not blobs:
+        return np.zeros((0, words), dtype=np.uint64)
+    packed = np.frombuffer(b"".join(blobs), dtype="<u8")
+    return packed.reshape(len(blobs), words).astype(np.uint64)
@@ -1,15 +1,98 @@
 from __future__ import annotations
 
+import functools
+import hashlib
 import logging
+import os
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
+from typing import TYPE_CHECKING, Iterable, Iterator
+
 from .process import Video
 
+if TYPE_CHECKING:
+    from jinja2 import Template
+
 logger = logging.getLogger(__name__)
 
+ASSET_DIR_NAME = "assets"
+
 
 def embody(video: Video, body: str) -> str:
+    return "".join(embody_stream(video, [body]))
+
+
+def embody_stream(video: Video, slide_blocks: Iterable[str]) -> Iterator[str]:
+    """Render the page around ``slide_blocks`` chunk by chunk.
+
+    Blocks are pulled from the iterable as the template reaches them, so a
+    generator of slides is never held in memory all at once.
+    """
+    return _template().generate(video=video, slide_blocks=_joined(slide_blocks))
+
+
+@dataclass(frozen=True)
+class AssetDirectory:
+    """Content-addressed files referenced from the HTML instead of inlined.
+
+    ``path`` is where the files live and ``href`` how the page refers to
+    that directory. Identical content maps to one file, so slides and
+    documents sharing a still share its file and its HTTP cache entry.
+    """
+
+    path: Path
+    href: str = ASSET_DIR_NAME
+
+    @classmethod
+    def next_to(cls, document: Path) -> AssetDirectory:
+        return cls(document.parent / ASSET_DIR_NAME)
+
+    def store(self, data: bytes, suffix: str = ".jpg") -> str:
+        """Write ``data`` unless an identical file exists; return its URL."""
+        name = hashlib.sha256(data).hexdigest()[:32] + suffix
+        path = self.path / name
+        if not path.exists():
+            self.path.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f".{name}.{uuid.uuid4().hex}.tmp")
+            try:
+                temp_path.write_bytes(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                temp_path.unlink(missing_ok=True)
+                raise
+        return f"{self.href}/{name}"
+
+
+def write_atomically(chunks: Iterable[str], path: Path) -> None:
+    """Stream ``chunks`` to a temporary file next to ``path``, then rename it.
+
+    Readers never see a half-written document, and a failed render leaves
+    any previous file at ``path`` untouched.
+    """
+    # Not NamedTemporaryFile: its 0600 mode would outlive the rename
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with temp_path.open("x", encoding="utf-8") as handle:
+            handle.writelines(chunks)
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+@functools.lru_cache(maxsize=None)
+def _template() -> Template:
+    """``template.html``, parsed and compiled once per process."""
+    from jinja2 import Environment, FileSystemLoader
+
     template_dir = Path(__file__).parent / "templates"
-    env = Environment(loader=FileSystemLoader(str(template_dir)))
-    template = env.get_template("template.html")
-    return template.render(video=video, slides_html=body)
+    env = Environment(loader=FileSystemLoader(str(template_dir)), auto_reload=False)
+    return env.get_template("template.html")
+
+
+def _joined(blocks: Iterable[str]) -> Iterator[str]:
+    for index, block in enumerate(blocks):
+        if index:
+            yield "\n"
+        yield block
@@ -1,16 +1,31 @@
 from __future__ import annotations
 
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Sequence
+from typing import IO, Iterable, Sequence
 
-from PIL import Image, ImageOps
+import numpy as np
+
+from .frames import FrameStore, still_index
+from .hash_index import make_hash_index
+from .hash_store import HashCache
 
 
 @dataclass(frozen=True)
 class ShotSimilarityConfig:
     hash_size: int = 8
     threshold: int = 5
+    # Near-duplicate lookup structure, see glancer.hash_index.HASH_INDEXES
+    index: str = "multi-index"
+    # Threads decoding stills into thumbnails; None uses every core
+    workers: int | None = None
+
+
+# Stills decoded per pool task, large enough to amortize scheduling
+HASH_BATCH_SIZE = 32
 
 
 def find_similar_shots(
@@ -19,71 +34,245 @@ def find_similar_shots(
 ) -> set[int]:
     """Return the zero-based shot indexes whose imagery matches earlier shots."""
     cfg = config or ShotSimilarityConfig()
-    duplicates: set[int] = set()
-    unique_hashes: list[int] = []
-
-    for path in sorted(image_paths):
-        shot_index = _shot_index(path.name)
-        if shot_index is None:
-            continue
-        try:
-            shot_hash = _dhash(path, cfg.hash_size)
-        except OSError:
-            # Ignore images Pillow cannot handle; we leave the slide as non-duplicate.
-            continue
-
-        if _is_duplicate(shot_hash, unique_hashes, cfg.threshold):
-            duplicates.add(shot_index)
+    size = _thumbnail_size(cfg.hash_size)
+    shots = [
+        (shot_index, path)
+        for path in sorted(image_paths)
+        if (shot_index := still_index(path.name)) is not None
+    ]
+    decoded = _decode_thumbnails([path for _, path in shots], size, cfg.workers)
+    indexes: list[int] = []
+    thumbnails: list[np.ndarray] = []
+    for (shot_index, _), thumbnail in zip(shots, decoded):
+        # Images Pillow cannot handle are left as non-duplicates.
+        if thumbnail is not None:
+            indexes.append(shot_index)
+            thumbnails.append(thumbnail)
+    return _find_duplicates(indexes, thumbnails, cfg)
+
+
+def find_similar_frames(
+    frames: FrameStore,
+    config: ShotSimilarityConfig | None = None,
+    cache: HashCache | None = None,
+) -> set[int]:
+    """Like :func:`find_similar_shots` but over an in-memory frame store.
+
+    Frames that carry a thumbnail of the right size are hashed from it without
+    touching the full-size JPEG, and with a ``cache`` hashes persisted by an
+    earlier run are reused instead.
+    """
+    cfg = config or ShotSimilarityConfig()
+    indexes, hashes = hash_frames(frames, cfg, cache)
+    if not indexes:
+        return set()
+    return set(_first_occurrences(indexes, hashes, cfg))
+
+
+def match_similar_frames(
+    frames: FrameStore,
+    config: ShotSimilarityConfig | None = None,
+    cache: HashCache | None = None,
+) -> dict[int, int]:
+    """Like :func:`find_similar_frames`, mapping each duplicate to its original.
+
+    The original is the earliest non-duplicate shot within the threshold, so
+    renderers can reuse its image instead of the duplicate's.
+    """
+    cfg = config or ShotSimilarityConfig()
+    indexes, hashes = hash_frames(frames, cfg, cache)
+    if not indexes:
+        return {}
+    return _first_occurrences(indexes, hashes, cfg)
+
+
+def find_frames_seen_elsewhere(
+    frames: FrameStore, cache: HashCache, config: ShotSimilarityConfig | None = None
+) -> set[int]:
+    """Return the shots whose imagery already appeared in ``cache.seen_video_ids``."""
+    cfg = config or ShotSimilarityConfig()
+    # Hash first so the store has this video for the ones that come after it
+    indexes, hashes = hash_frames(frames, cfg, cache)
+    seen = cache.store.load_videos(cache.seen_video_ids, cache.variant, cfg.hash_size)
+    if not len(seen):
+        return set()
+    seen_hashes = make_hash_index(cfg.index, cfg.threshold, seen.shape[1])
+    for seen_hash in seen:
+        seen_hashes.add(seen_hash)
+    return {
+        shot_index
+        for shot_index, shot_hash in zip(indexes, hashes)
+        if seen_hashes.has_near(shot_hash)
+    }
+
+
+def hash_frames(
+    frames: FrameStore,
+    config: ShotSimilarityConfig | None = None,
+    cache: HashCache | None = None,
+) -> tuple[list[int], np.ndarray]:
+    """Return the shot indexes that could be hashed and their packed hashes."""
+    cfg = config or ShotSimilarityConfig()
+    if cache is not None:
+        shots, hashes = cache.store.load(
+            cache.video_id, cache.variant, cfg.hash_size, cache.stills
+        )
+        if shots and shots == frames.indexes():
+            return shots, hashes
+
+    size = _thumbnail_size(cfg.hash_size)
+    width, height = size
+    all_frames = list(frames)
+    undecoded = [
+        frame.data
+        for frame in all_frames
+        if frame.thumbnail is None or frame.thumbnail_size != size
+    ]
+    decoded = iter(_decode_thumbnails(undecoded, size, cfg.workers))
+    indexes: list[int] = []
+    thumbnails: list[np.ndarray] = []
+    for frame in all_frames:
+        if frame.thumbnail is not None and frame.thumbnail_size == size:
+            pixels = np.frombuffer(frame.thumbnail, dtype=np.uint8)
+            thumbnail = pixels.reshape(height, width)
         else:
-            unique_hashes.append(shot_hash)
+            thumbnail = next(decoded)
+        if thumbnail is not None:
+            indexes.append(frame.index)
+            thumbnails.append(thumbnail)
+
+    if thumbnails:
+        hashes = dhash_pixels(np.stack(thumbnails))
+    else:
+        hashes = np.zeros((0, _words(cfg.hash_size)), dtype=np.uint64)
+    if cache is not None:
+        cache.store.save(
+            cache.video_id, cache.variant, cfg.hash_size, indexes, hashes, cache.stills
+        )
+    return indexes, hashes
+
+
+def dhash_images(
+    images: Sequence[Path | bytes | IO[bytes]], hash_size: int = 8
+) -> np.ndarray:
+    """Difference-hash a batch of images.
+
+    Returns an ``(N, words)`` array of ``uint64`` where every row packs the
+    ``hash_size ** 2`` bits of one image, a single word for the default 8x8
+    hash. Raises ``OSError`` for images Pillow cannot read.
+    """
+    size = _thumbnail_size(hash_size)
+    thumbnails = [
+        _load_thumbnail(io.BytesIO(image) if isinstance(image, bytes) else image, size)
+        for image in images
+    ]
+    if not thumbnails:
+        return np.zeros((0, _words(hash_size)), dtype=np.uint64)
+    return dhash_pixels(np.stack(thumbnails))
+
+
+def dhash_pixels(pixels: np.ndarray) -> np.ndarray:
+    """Difference-hash ``(N, hash_size, hash_size + 1)`` grayscale thumbnails.
+
+    Bit ``row * hash_size + col`` of a hash is set when the pixel at ``col``
+    is darker than its right neighbour.
+    """
+    count, hash_size, _ = pixels.shape
+    bits = (pixels[:, :, :-1] < pixels[:, :, 1:]).reshape(count, -1)
+    padding = _words(hash_size) * 64 - bits.shape[1]
+    if padding:
+        bits = np.pad(bits, ((0, 0), (0, padding)))
+    packed = np.packbits(bits, axis=1, bitorder="little")
+    return packed.view("<u8").astype(np.uint64, copy=False)
+
+
+def _find_duplicates(
+    indexes: list[int], thumbnails: list[np.ndarray], cfg: ShotSimilarityConfig
+) -> set[int]:
+    if not thumbnails:
+        return set()
+    hashes = dhash_pixels(np.stack(thumbnails))
+    return set(_first_occurrences(indexes, hashes, cfg))
+
+
+def _first_occurrences(
+    indexes: Sequence[int], hashes: np.ndarray, cfg: ShotSimilarityConfig
+) -> dict[int, int]:
+    """Map every shot within ``cfg.threshold`` bits of an earlier unique shot
+    to the first of them."""
+    duplicates: dict[int, int] = {}
+    unique_hashes = make_hash_index(cfg.index, cfg.threshold, hashes.shape[1])
+    unique_shots: list[int] = []
+    for shot_index, shot_hash in zip(indexes, hashes):
+        original = unique_hashes.first_near(shot_hash)
+        if original is not None:
+            duplicates[shot_index] = unique_shots[original]
+        else:
+            unique_hashes.add(shot_hash)
+            unique_shots.append(shot_index)
 
     return duplicates
 
 
-def _is_duplicate(candidate: int, unique_hashes: Sequence[int], threshold: int) -> bool:
-    return any(
-        _hamming_distance(candidate, existing) <= threshold
-        for existing in unique_hashes
-    )
+def _decode_thumbnails(
+    sources: Sequence[Path | bytes], size: tuple[int, int], workers: int | None
+) -> list[np.ndarray | None]:
+    """Decode thumbnails in order, ``None`` for images Pillow cannot read.
+
+    Batches are spread over a thread pool: Pillow releases the GIL while
+    decoding and resampling, and ``map`` keeps results in input order so the
+    duplicate decisions stay identical to a sequential run.
+    """
+    batches = [
+        sources[start : start + HASH_BATCH_SIZE]
+        for start in range(0, len(sources), HASH_BATCH_SIZE)
+    ]
+
+    def decode(batch: Sequence[Path | bytes]) -> list[np.ndarray | None]:
+        thumbnails: list[np.ndarray | None] = []
+        for source in batch:
+            try:
+                thumbnails.append(
+                    _load_thumbnail(
+                        io.BytesIO(source) if isinstance(source, bytes) else source,
+                        size,
+                    )
+                )
+            except OSError:
+                thumbnails.append(None)
+        return thumbnails
+
+    max_workers = min(workers or os.cpu_count() or 1, len(batches))
+    if max_workers <= 1:
+        results = [decode(batch) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(decode, batches))
+    return [thumbnail for batch in results for thumbnail in batch]
 
 
-def _shot_index(filename: str) -> int | None:
-    stem = filename.removesuffix(".jpg")
-    if not stem.startswith("glancer-img"):
-        return None
-    try:
-        number = int(stem.replace("glancer-img", ""))
-    except ValueError:
-        return None
-    return number
+def _load_thumbnail(source: Path | IO[bytes], size: tuple[int, int]) -> np.ndarray:
+    """Decode an image straight to the grayscale thumbnail the hash needs.
 
+    ``draft`` lets the JPEG decoder downscale by up to 8x in the DCT domain,
+    so a 720p still is never fully decoded just to be shrunk to 9x8.
+    """
+    # Imported here so runs without duplicate detection never load Pillow
+    from PIL import Image, ImageOps
 
-def _dhash(path: Path, hash_size: int) -> int:
-    """Compute a perceptual difference hash for the given image."""
-    with Image.open(path) as image:
+    with Image.open(source) as image:
+        image.draft("L", size)
         grayscale = ImageOps.grayscale(image)
         resized = grayscale.resize(
-            (hash_size + 1, hash_size),
-            getattr(Image.Resampling, "LANCZOS", Image.LANCZOS),
+            size, getattr(Image.Resampling, "LANCZOS", Image.LANCZOS)
         )
-        pixels = list(resized.getdata())
-
-    bits = []
-    row_stride = hash_size + 1
-    for row in range(hash_size):
-        offset = row * row_stride
-        row_pixels = pixels[offset : offset + row_stride]
-        for col in range(hash_size):
-            left = row_pixels[col]
-            right = row_pixels[col + 1]
-            bits.append(1 if left < right else 0)
-
-    result = 0
-    for bit_index, bit in enumerate(bits):
-        if bit:
-            result |= 1 << bit_index
-    return result
-
-
-def _hamming_distance(left: int, right: int) -> int:
-    return (left ^ right).bit_count()
+        return np.asarray(resized, dtype=np.uint8)
+
+
+def _thumbnail_size(hash_size: int) -> tuple[int, int]:
+    return hash_size + 1, hash_size
+
+
+def _words(hash_size: int) -> int:
+    return -(-(hash_size * hash_size) // 64)
+
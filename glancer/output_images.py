@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Callable, Iterable, Sequence
+
+from .frames import Frame, FrameStore
+
+if TYPE_CHECKING:
+    from PIL.Image import Image
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and media type of every codec stills can be written in
+IMAGE_CODECS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+}
+DEFAULT_QUALITY = 80
+# Lowest quality a byte budget may push stills down to
+MIN_QUALITY = 10
+MAX_QUALITY = 95
+
+
+@dataclass(frozen=True)
+class ImageOptions:
+    """How stills are re-encoded before they go into a document.
+
+    The defaults keep the extracted JPEGs untouched. ``byte_budget`` caps
+    the total size of the document's stills: the highest quality that fits
+    is picked, and ``quality`` is then only the upper bound of that search.
+    """
+
+    codec: str = "jpeg"
+    # Stills wider than this are downscaled, keeping their aspect ratio
+    width: int | None = None
+    quality: int | None = None
+    byte_budget: int | None = None
+    # Threads encoding stills; None uses every core
+    workers: int | None = None
+
+    @property
+    def is_passthrough(self) -> bool:
+        return (
+            self.codec == "jpeg"
+            and self.width is None
+            and self.quality is None
+            and self.byte_budget is None
+        )
+
+
+def supported_codecs() -> list[str]:
+    """Codecs the installed Pillow can encode."""
+    from PIL import features
+
+    return [codec for codec in IMAGE_CODECS if codec == "jpeg" or features.check(codec)]
+
+
+def prepare_frames(
+    frames: FrameStore,
+    options: ImageOptions | None = None,
+    shots: Iterable[int] | None = None,
+) -> FrameStore:
+    """Downscale and re-encode stills for output.
+
+    Only the ``shots`` given (every still by default) are re-encoded and
+    count against a byte budget; the rest are kept as they are, as are
+    stills Pillow can't read. Stills are decoded and resized once, in
+    parallel; meeting a budget then binary-searches a single quality for
+    the whole document, re-encoding at each step.
+    """
+    options = options or ImageOptions()
+    if options.is_passthrough:
+        return frames
+    if shots is None:
+        selected = list(frames)
+    else:
+        selected = [
+            frame for shot in sorted(set(shots)) if (frame := frames.get(shot))
+        ]
+    if options.codec not in IMAGE_CODECS:
+        raise ValueError(
+            f"unknown image codec {options.codec!r}, expected one of "
+            f"{', '.join(IMAGE_CODECS)}"
+        )
+    if options.codec not in supported_codecs():
+        raise ValueError(f"this Pillow build can't encode {options.codec}")
+
+    images = _map(lambda frame: _load(frame.data, options.width), selected, options)
+    decoded = [
+        (frame, image) for frame, image in zip(selected, images) if image is not None
+    ]
+    quality = options.quality or DEFAULT_QUALITY
+    encoded = _encode_all(decoded, options, quality)
+    if options.byte_budget is not None:
+        quality, encoded = _fit_budget(decoded, options, quality, encoded)
+        logger.debug(f"Encoding stills at quality {quality} to fit the budget")
+
+    _, media_type = IMAGE_CODECS[options.codec]
+    prepared = FrameStore(frames)
+    for (frame, _), data in zip(decoded, encoded):
+        prepared.add(replace(frame, data=data, media_type=media_type))
+    return prepared
+
+
+def encode_image(image: Image, codec: str, quality: int) -> bytes:
+    pillow_format, _ = IMAGE_CODECS[codec]
+    output = io.BytesIO()
+    image.save(output, pillow_format, quality=quality)
+    return output.getvalue()
+
+
+def _fit_budget(
+    decoded: Sequence[tuple[Frame, Image]],
+    options: ImageOptions,
+    max_quality: int,
+    encoded: list[bytes],
+) -> tuple[int, list[bytes]]:
+    """Highest quality up to ``max_quality`` whose stills fit the budget."""
+    budget = options.byte_budget or 0
+    if sum(map(len, encoded)) <= budget:
+        return max_quality, encoded
+    low, high = MIN_QUALITY, min(max_quality, MAX_QUALITY) - 1
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        attempt = _encode_all(decoded, options, middle)
+        if sum(map(len, attempt)) <= budget:
+            best = middle, attempt
+            low = middle + 1
+        else:
+            high = middle - 1
+    if best is None:
+        logger.warning(
+            f"Stills don't fit in {budget} bytes even at quality {MIN_QUALITY}"
+        )
+        return MIN_QUALITY, _encode_all(decoded, options, MIN_QUALITY)
+    return best
+
+
+def _encode_all(
+    decoded: Sequence[tuple[Frame, Image]], options: ImageOptions, quality: int
+) -> list[bytes]:
+    return _map(
+        lambda item: encode_image(item[1], options.codec, quality), decoded, options
+    )
+
+
+def _load(data: bytes, width: int | None) -> Image | None:
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if width is not None and image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                # ``draft`` lets JPEG decode at a reduced scale before resizing
+                image.draft("RGB", (width, height))
+                return image.convert("RGB").resize(
+                    (width, height), Image.Resampling.LANCZOS
+                )
+            return image.convert("RGB")
+    except OSError:
+        return None
+
+
+def _map(function: Callable, items: Sequence, options: ImageOptions) -> list:
+    """``map`` over a thread pool, in order; Pillow releases the GIL."""
+    max_workers = min(options.workers or os.cpu_count() or 1, len(items))
+    if max_workers <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(function, items))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Mapping
+
+from .frames import FrameStore, as_frame_store
+from .output_images import ImageOptions, prepare_frames
+from .process import Video
+from .typst_compiler import TypstCompiler
+
+if TYPE_CHECKING:
+    from .hash_store import HashCache
+    from .image_similarity import ShotSimilarityConfig
+    from .parser import Caption, CaptionStore
+
+# Documents a run can write: HTML and the three PDF layouts
+OUTPUT_FORMATS = ("html", "pdf", "pdf-compact", "pdf-slide")
+# File name endings when one run writes several formats next to each other
+OUTPUT_SUFFIXES = {
+    "html": ".html",
+    "pdf": ".pdf",
+    "pdf-compact": ".compact.pdf",
+    "pdf-slide": ".slides.pdf",
+}
+
+
+def output_format(output_pdf: bool, compact: bool, slide_mode: bool) -> str:
+    """The format the single-output flags (``--pdf`` and its layouts) select."""
+    if not output_pdf:
+        return "html"
+    if slide_mode:
+        return "pdf-slide"
+    return "pdf-compact" if compact else "pdf"
+
+
+def render_outputs(
+    video: Video,
+    frames: FrameStore | Path,
+    captions: CaptionStore | list[Caption],
+    outputs: Mapping[str, Path],
+    detect_duplicates: bool = True,
+    similarity: ShotSimilarityConfig | None = None,
+    hash_cache: HashCache | None = None,
+    external_assets: bool = False,
+    images: ImageOptions | None = None,
+    stills_dir: Path | None = None,
+    compiler: TypstCompiler | None = None,
+) -> None:
+    """Write the video in every format of ``outputs`` to its path.
+
+    Slides, duplicate detection and the merged caption texts are computed
+    once and shared, as are stills re-encoded the same way for several
+    documents. The documents are then rendered concurrently, each PDF on a
+    Typst worker of ``compiler`` (in-process with the bindings, a typst
+    process otherwise), so PDFs compile while the HTML is written. PDFs keep
+    the stills Typst reads in ``stills_dir`` when given (see
+    :func:`~glancer.pdf_builder.convert_to_pdf`).
+    """
+    # The renderers pull in NumPy and Jinja2, which the CLI's argument
+    # parsing doesn't need
+    from .pdf_builder import convert_to_pdf, typst_image_options
+    from .slides import embedded_shots, generate_slides, write_html
+
+    for output in outputs:
+        if output not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"unknown output format {output!r}, expected one of "
+                f"{', '.join(OUTPUT_FORMATS)}"
+            )
+    frames = as_frame_store(frames)
+    slides = generate_slides(
+        captions, frames, detect_duplicates, similarity, hash_cache
+    )
+    prepared: dict[tuple[ImageOptions | None, bool], FrameStore] = {}
+
+    def prepare(options: ImageOptions | None, shared_duplicates: bool) -> FrameStore:
+        key = (options, shared_duplicates)
+        if key not in prepared:
+            shots = embedded_shots(slides, shared_duplicates)
+            prepared[key] = prepare_frames(frames, options, shots)
+        return prepared[key]
+
+    def render(output: str, path: Path, stills: FrameStore) -> None:
+        if output == "html":
+            write_html(
+                video,
+                stills,
+                captions,
+                path,
+                external_assets=external_assets,
+                slides=slides,
+            )
+        else:
+            convert_to_pdf(
+                video,
+                stills,
+                captions,
+                path,
+                compact=output == "pdf-compact",
+                slide_mode=output == "pdf-slide",
+                slides=slides,
+                stills_dir=stills_dir,
+                compiler=compiler,
+            )
+
+    # Stills are prepared up front, so documents sharing them wait for nothing
+    jobs = [
+        (
+            output,
+            path,
+            prepare(images, external_assets)
+            if output == "html"
+            else prepare(typst_image_options(images), False),
+        )
+        for output, path in outputs.items()
+    ]
+    if len(jobs) == 1:
+        render(*jobs[0])
+        return
+    with ThreadPoolExecutor(
+        max_workers=len(jobs), thread_name_prefix="render"
+    ) as executor:
+        futures = [executor.submit(render, *job) for job in jobs]
+        for future in futures:
+            future.result()
@@ -1,9 +1,18 @@
 from __future__ import annotations
 
+import io
+import mmap
+import os
+import re
+from array import array
+from collections import deque
 from dataclasses import dataclass
-from typing import List
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Sequence, Union, overload
 
-import srt
+import numpy as np
+
+from .cache import StageManifest, file_fingerprint, stage_key, temporary_path
 
 
 @dataclass(frozen=True)
@@ -13,16 +22,347 @@ class Caption:
     text: str
 
 
-def parse_srt(contents: str) -> List[Caption]:
-    parsed = srt.parse(contents)
-    captions: List[Caption] = []
-    for subtitle in parsed:
-        text = subtitle.content.replace("\r\n", "\n").replace("\r", "\n")
-        captions.append(
-            Caption(
-                start=subtitle.start.total_seconds(),
-                end=subtitle.end.total_seconds(),
-                text=text,
+class CaptionStore:
+    """Captions held as parallel arrays instead of one object per caption.
+
+    Start and end times live in float arrays and every caption's text is a
+    slice of one shared buffer: caption ``i`` is
+    ``buffer[offsets[i]:offsets[i + 1]]``. Iterating still yields
+    :class:`Caption` objects for callers that want them, but cleaning and
+    slide bucketing work on the arrays directly.
+    """
+
+    def __init__(
+        self,
+        starts: Iterable[float] = (),
+        ends: Iterable[float] = (),
+        buffer: str = "",
+        offsets: Iterable[int] | None = None,
+    ) -> None:
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.buffer = buffer
+        if offsets is None:
+            offsets = np.zeros(len(self.starts) + 1, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_captions(cls, captions: Iterable[Caption]) -> CaptionStore:
+        builder = CaptionStoreBuilder()
+        for caption in captions:
+            builder.append(caption.start, caption.end, caption.text)
+        return builder.build()
+
+    def text(self, index: int) -> str:
+        return self.buffer[self.offsets[index] : self.offsets[index + 1]]
+
+    def texts(self) -> Iterator[str]:
+        buffer, offsets = self.buffer, self.offsets.tolist()
+        return (buffer[offsets[i] : offsets[i + 1]] for i in range(len(self)))
+
+    def take(self, indexes: Sequence[int] | np.ndarray) -> CaptionStore:
+        """The captions at ``indexes``, in that order.
+
+        A contiguous run shares the text buffer with this store instead of
+        copying it.
+        """
+        positions = np.asarray(indexes, dtype=np.int64).tolist()
+        if not positions:
+            return CaptionStore()
+        first, last = positions[0], positions[-1]
+        if positions == list(range(first, last + 1)):
+            return self[first : last + 1]
+        starts = self.starts[positions].tolist()
+        ends = self.ends[positions].tolist()
+        builder = CaptionStoreBuilder()
+        for index, start, end in zip(positions, starts, ends):
+            builder.append(start, end, self.text(index))
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @overload
+    def __getitem__(self, index: int) -> Caption: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> CaptionStore: ...
+
+    def __getitem__(self, index: int | slice) -> Caption | CaptionStore:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.take(np.arange(start, stop, step))
+            stop = max(start, stop)
+            return CaptionStore(
+                self.starts[start:stop],
+                self.ends[start:stop],
+                self.buffer,
+                self.offsets[start : stop + 1],
             )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("caption index out of range")
+        return Caption(
+            start=float(self.starts[index]),
+            end=float(self.ends[index]),
+            text=self.text(index),
         )
+
+    def __iter__(self) -> Iterator[Caption]:
+        for start, end, text in zip(
+            self.starts.tolist(), self.ends.tolist(), self.texts()
+        ):
+            yield Caption(start=start, end=end, text=text)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CaptionStore):
+            return (
+                np.array_equal(self.starts, other.starts)
+                and np.array_equal(self.ends, other.ends)
+                and list(self.texts()) == list(other.texts())
+            )
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"CaptionStore({list(self)!r})"
+
+
+class CaptionStoreBuilder:
+    """Appends captions to growable arrays and joins their text once."""
+
+    def __init__(self) -> None:
+        self._starts = array("d")
+        self._ends = array("d")
+        self._offsets = array("q", [0])
+        self._parts: list[str] = []
+
+    def append(self, start: float, end: float, text: str) -> None:
+        self._starts.append(start)
+        self._ends.append(end)
+        self._offsets.append(self._offsets[-1] + len(text))
+        self._parts.append(text)
+
+    def build(self) -> CaptionStore:
+        return CaptionStore(
+            np.frombuffer(self._starts, dtype=np.float64),
+            np.frombuffer(self._ends, dtype=np.float64),
+            "".join(self._parts),
+            np.frombuffer(self._offsets, dtype=np.int64),
+        )
+
+
+class CaptionIndex:
+    """Captions ordered by start time for "what was said between t0 and t1".
+
+    Alongside the sorted start times it keeps the running maximum of the end
+    times, so both ends of the candidate range are binary searches and a
+    query costs O(log n) plus the captions it returns.
+    """
+
+    def __init__(self, captions: CaptionStore) -> None:
+        self.captions = captions
+        self._order = np.argsort(captions.starts, kind="stable")
+        self._starts = captions.starts[self._order]
+        self._max_ends = np.maximum.accumulate(captions.ends[self._order])
+
+    def overlapping(self, start: float, end: float) -> CaptionStore:
+        """Captions overlapping ``[start, end)``, in their original order.
+
+        A caption overlaps if it starts inside the range or is still showing
+        when the range starts.
+        """
+        return self.captions.take(self.overlapping_indexes(start, end))
+
+    def overlapping_indexes(self, start: float, end: float) -> np.ndarray:
+        """Positions of the captions :meth:`overlapping` returns, ascending."""
+        # Captions starting at or after ``end`` can't overlap, and neither
+        # can any before the first one whose running max end reaches start.
+        stop = np.searchsorted(self._starts, end, side="left")
+        first = np.searchsorted(self._max_ends, start, side="left")
+        candidates = self._order[first:stop]
+        hits = candidates[
+            (self.captions.ends[candidates] > start)
+            | (self.captions.starts[candidates] >= start)
+        ]
+        return np.sort(hits)
+
+    def __len__(self) -> int:
+        return len(self.captions)
+
+
+def as_caption_store(captions: CaptionStore | Iterable[Caption]) -> CaptionStore:
+    if isinstance(captions, CaptionStore):
+        return captions
+    return CaptionStore.from_captions(captions)
+
+
+# Mirrors the leniency of the ``srt`` package: any of , . : as the field
+# separator, optional milliseconds, "->" or "-->" with loose spacing, and
+# a trailing (proprietary) position spec after the end time.
+_TIMESTAMP = r"([0-9]+)[,.:，．。：]([0-9]+)[,.:，．。：]([0-9]+)[,.:，．。：]?([0-9]*)"
+TIMESTAMP_RE = re.compile(_TIMESTAMP)
+TIMING_RE = re.compile(rf"{_TIMESTAMP} *-[ -] *> *{_TIMESTAMP}")
+INDEX_RE = re.compile(r"-?[0-9]+\.?[0-9]*\s*")
+
+SrtSource = Union[str, bytes, IO[str], IO[bytes], mmap.mmap]
+
+
+def parse_srt(source: SrtSource) -> CaptionStore:
+    """Parse SRT captions from a string, an open file or an mmap.
+
+    Files are read a line at a time straight into a :class:`CaptionStore`,
+    so no intermediate subtitle objects (or a second copy of the file) are
+    built. Captions split where ``srt.parse(..., ignore_errors=True)`` splits
+    them, malformed input included: a caption's text runs until a blank line
+    followed by another caption, or until an index line directly followed by
+    a timestamp. Blank lines, timing lines and empty bodies anywhere else are
+    text, and lines outside any caption are skipped.
+    """
+    builder = CaptionStoreBuilder()
+    # Of the caption being read, None between captions
+    timing: tuple[float, float] | None = None
+    content: list[str] = []
+    # Lines after the text so far that may still end the caption: a blank
+    # line and/or an index line, then what followed while it's undecided
+    pending: list[str] = []
+    # Lines to read again, ahead of the rest
+    replay: deque[str] = deque()
+    lines = _lines(source)
+
+    while True:
+        line = replay.popleft() if replay else next(lines, None)
+        if line is None:
+            if timing is None:
+                break
+            if pending and pending != [""] and pending != ["", ""]:
+                # Nothing ends the caption there, so the pending lines are text
+                content.append(pending[0])
+                replay.extend(pending[1:])
+                pending = []
+                continue
+            # A blank last line, or one before it, ends the caption too
+            builder.append(*timing, "\n".join(content).replace("\r", "\n"))
+            break
+
+        if timing is None:
+            match = TIMING_RE.search(line) if ">" in line else None
+            if match is not None:
+                timing = _timing(match)
+                content = []
+            # Otherwise an index, or text srt would skip as garbled
+            continue
+        if not content:
+            # The line after the timing is text whatever it holds
+            content.append(line)
+            continue
+        if not pending:
+            if line and not INDEX_RE.fullmatch(line):
+                content.append(line)
+            else:
+                pending.append(line)
+            continue
+
+        # A blank line ends the caption when a timestamp follows it, or an
+        # index line and then one; an index line does when a timestamp
+        # follows it, blank lines in between allowed.
+        index_lines = pending[1:] if not pending[0] else pending
+        if not index_lines:
+            ends = TIMESTAMP_RE.match(line) is not None
+            undecided = not line or INDEX_RE.fullmatch(line) is not None
+        elif index_lines[0]:
+            ends = TIMESTAMP_RE.match(line) is not None
+            undecided = not line.strip()
+        else:
+            # A second blank line, which only ends the caption as the last one
+            ends = undecided = False
+
+        if ends:
+            builder.append(*timing, "\n".join(content).replace("\r", "\n"))
+            timing = None
+            pending = []
+            replay.appendleft(line)
+        elif undecided:
+            pending.append(line)
+        else:
+            content.append(pending[0])
+            replay.extendleft(reversed([*pending[1:], line]))
+            pending = []
+    return builder.build()
+
+
+# Bump when parse_srt's output changes, so cached captions are re-parsed
+CAPTIONS_FORMAT = 2
+
+
+def load_captions(path: Path) -> CaptionStore:
+    """:func:`parse_srt` on a file, cached next to it as arrays.
+
+    The parsed store is saved in the file's directory keyed by the file's
+    fingerprint, so re-runs load the arrays instead of parsing again.
+    """
+    stages = StageManifest(path.parent)
+    inputs = {"captions": file_fingerprint(path), "format": CAPTIONS_FORMAT}
+    cache_name = f"captions-{stage_key(inputs)}.npz"
+    if stages.get("captions", inputs) is not None:
+        with np.load(path.parent / cache_name, allow_pickle=False) as arrays:
+            return CaptionStore(
+                arrays["starts"],
+                arrays["ends"],
+                arrays["text"].tobytes().decode("utf-8"),
+                arrays["offsets"],
+            )
+
+    with path.open("rb") as source:
+        captions = parse_srt(source)
+    temporary = temporary_path(path.parent / cache_name)
+    with temporary.open("xb") as output:
+        np.savez(
+            output,
+            starts=captions.starts,
+            ends=captions.ends,
+            offsets=captions.offsets,
+            text=np.frombuffer(captions.buffer.encode("utf-8"), dtype=np.uint8),
+        )
+    os.replace(temporary, path.parent / cache_name)
+    stages.put("captions", inputs, {"count": len(captions)}, [cache_name])
     return captions
+
+
+def _lines(source: SrtSource) -> Iterator[str]:
+    if isinstance(source, str):
+        source = io.StringIO(source, newline="\n")
+    elif isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    first = True
+    ended = False
+    readline = source.readline
+    while line := readline():
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if first:
+            line = line.lstrip("\ufeff")
+            first = False
+        ended = line.endswith("\n")
+        if ended:
+            line = line[:-2] if line.endswith("\r\n") else line[:-1]
+        yield line
+    # Like str.split("\n"), a final newline leaves an empty last line
+    if ended:
+        yield ""
+
+
+def _timing(match: re.Match[str]) -> tuple[float, float]:
+    groups = match.groups()
+    return _seconds(groups[:4]), _seconds(groups[4:])
+
+
+def _seconds(fields: tuple[str, ...]) -> float:
+    hours, minutes, seconds, millis = (int(field) if field else 0 for field in fields)
+    # Same rounding as timedelta.total_seconds() on the parsed timestamp
+    return (((hours * 60 + minutes) * 60 + seconds) * 1000 + millis) / 1000
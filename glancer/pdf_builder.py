@@ -1,82 +1,142 @@
 from __future__ import annotations
 
+import logging
+import os
 import shutil
-import subprocess
-import tempfile
+from dataclasses import replace
 from pathlib import Path
-
-from .parser import Caption
+from typing import Iterable, Iterator
+
+from .frames import IMAGE_SUFFIXES, FrameStore, as_frame_store
+from .hash_store import HashCache
+from .html_builder import AssetDirectory
+from .image_similarity import ShotSimilarityConfig
+from .output_images import ImageOptions, prepare_frames
+from .parser import Caption, CaptionStore, as_caption_store
 from .process import Video
 from .slides import combine_caption_texts
-from .slides import Slide, generate_slides
+from .slides import SEEN_ELSEWHERE_NOTE, Slide, embedded_shots, generate_slides
+from .typst_compiler import TypstCompiler, default_compiler
+
+logger = logging.getLogger(__name__)
 
-SECONDS_PER_SHOT = 30
+# Image codecs Typst can place in a PDF
+TYPST_CODECS = ("jpeg", "webp")
+# Typst markup characters and their escapes, backslash first so the
+# backslashes added for the others aren't escaped again
+_TYPST_ESCAPES = tuple((char, f"\\{char}") for char in "\\#$*_<>@[]")
 
 
 def convert_to_pdf(
     video: Video,
-    directory: Path,
-    captions: list[Caption],
+    frames: FrameStore | Path,
+    captions: CaptionStore | list[Caption],
     output_path: Path,
     detect_duplicates: bool = True,
     compact: bool = False,
     slide_mode: bool = False,
+    similarity: ShotSimilarityConfig | None = None,
+    hash_cache: HashCache | None = None,
+    images: ImageOptions | None = None,
+    slides: list[Slide] | None = None,
+    stills_dir: Path | None = None,
+    compiler: TypstCompiler | None = None,
 ) -> None:
-    """Generate a dense PDF from video slides using Typst."""
-    slides = generate_slides(captions, directory, detect_duplicates)
-
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        tmp_path = Path(tmp_dir)
-
-        # Copy images to temp directory
-        for slide in slides:
-            src_img = directory / f"glancer-img{slide.index:04d}.jpg"
-            if src_img.exists():
-                dst_img = tmp_path / f"img{slide.index:04d}.jpg"
-                shutil.copy(src_img, dst_img)
-
-        # Generate Typst content
-        typst_content = generate_typst(video, slides, tmp_path, compact, slide_mode)
-
-        # Write Typst file
-        typst_file = tmp_path / "output.typ"
-        typst_file.write_text(typst_content, encoding="utf-8")
-
-        # Compile to PDF
-        subprocess.run(
-            ["typst", "compile", str(typst_file), str(output_path)],
-            check=True,
+    """Generate a dense PDF from video slides using Typst.
+
+    With ``images`` the stills are downscaled and re-encoded first, which
+    also keeps Typst from compiling full-size JPEGs. ``slides`` already
+    generated for another output are reused as they are. With
+    ``stills_dir`` (e.g. in the video's cache entry) the stills Typst reads
+    are kept there and hard-linked into each build, so further layouts and
+    re-runs write no image bytes. The PDF is compiled by ``compiler``, or
+    by the process-wide :func:`~glancer.typst_compiler.default_compiler`.
+    """
+    frames = as_frame_store(frames)
+    if slides is None:
+        slides = generate_slides(
+            captions, frames, detect_duplicates, similarity, hash_cache
         )
+    frames = prepare_frames(frames, typst_image_options(images), embedded_shots(slides))
+
+    compiler = compiler or default_compiler()
+    with compiler.build() as build:
+        # Typst reads images from disk
+        stage_stills(frames, slides, build.path, stills_dir)
+        # Blocks go straight to the .typ file, never joined into one string
+        document = typst_stream(video, slides, build.path, compact, slide_mode)
+        build.compile(document, output_path)
+
+
+def stage_stills(
+    frames: FrameStore,
+    slides: Iterable[Slide],
+    image_dir: Path,
+    stills_dir: Path | None = None,
+) -> None:
+    """Put each embedded slide's still in ``image_dir`` for Typst.
+
+    Stills are written straight to ``image_dir`` by default. With
+    ``stills_dir`` they're stored there by content instead, once, and
+    hard-linked into ``image_dir``; a filesystem without hard links gets
+    copies.
+    """
+    store = AssetDirectory(stills_dir) if stills_dir is not None else None
+    for slide in slides:
+        frame = frames.get(slide.index)
+        if frame is None or slide.seen_elsewhere:
+            continue
+        image_path = image_dir / f"img{slide.index:04d}{frame.suffix}"
+        if store is None:
+            image_path.write_bytes(frame.data)
+            continue
+        stored = store.path / Path(store.store(frame.data, frame.suffix)).name
+        try:
+            os.link(stored, image_path)
+        except OSError:
+            shutil.copyfile(stored, image_path)
+
+
+def typst_image_options(images: ImageOptions | None) -> ImageOptions | None:
+    """``images``, with JPEG instead of codecs Typst can't read."""
+    if images is not None and images.codec not in TYPST_CODECS:
+        logger.warning(f"Typst can't read {images.codec} images, using JPEG")
+        return replace(images, codec="jpeg")
+    return images
 
 
 def generate_typst(
     video: Video,
-    slides: list[Slide],
+    slides: Iterable[Slide],
     image_dir: Path,
     compact: bool = False,
     slide_mode: bool = False,
 ) -> str:
     """Generate complete Typst document content."""
+    return "".join(typst_stream(video, slides, image_dir, compact, slide_mode))
+
+
+def typst_stream(
+    video: Video,
+    slides: Iterable[Slide],
+    image_dir: Path,
+    compact: bool = False,
+    slide_mode: bool = False,
+) -> Iterator[str]:
+    """The Typst document, a slide block at a time."""
     if slide_mode:
-        header = generate_header_slide_mode(video)
-        slides_content = generate_slides_typst(
+        yield generate_header_slide_mode(video)
+        yield "\n\n"
+        yield from slides_typst_stream(
             slides, video.url, image_dir, compact=False, slide_mode=True
         )
-        return f"""{header}
-
-{slides_content}
-"""
+        yield "\n"
     else:
-        header = generate_header(video, compact)
-        slides_content = generate_slides_typst(slides, video.url, image_dir, compact)
-
+        yield generate_header(video, compact)
         gutter = "0.3cm" if compact else "0.4cm"
-        return f"""{header}
-
-#columns(2, gutter: {gutter})[
-{slides_content}
-]
-"""
+        yield f"\n\n#columns(2, gutter: {gutter})[\n"
+        yield from slides_typst_stream(slides, video.url, image_dir, compact)
+        yield "\n]\n"
 
 
 def generate_header(video: Video, compact: bool = False) -> str:
@@ -117,14 +177,25 @@ def generate_header_slide_mode(video: Video) -> str:
 
 
 def generate_slides_typst(
-    slides: list[Slide],
+    slides: Iterable[Slide],
     url: str,
     image_dir: Path,
     compact: bool = False,
     slide_mode: bool = False,
 ) -> str:
     """Generate Typst content for all slides."""
-    blocks = []
+    return "".join(slides_typst_stream(slides, url, image_dir, compact, slide_mode))
+
+
+def slides_typst_stream(
+    slides: Iterable[Slide],
+    url: str,
+    image_dir: Path,
+    compact: bool = False,
+    slide_mode: bool = False,
+) -> Iterator[str]:
+    """:func:`generate_slides_typst`, a block at a time."""
+    separator = ""
     for slide in slides:
         if slide_mode:
             block = render_slide_page(slide, url, image_dir)
@@ -133,25 +204,24 @@ def generate_slides_typst(
         else:
             block = render_slide_typst(slide, url, image_dir)
         if block:
-            blocks.append(block)
-    return "\n".join(blocks)
+            yield separator
+            yield block
+            separator = "\n"
 
 
 def render_slide_typst(slide: Slide, url: str, image_dir: Path) -> str:
     """Render a single slide as a Typst block."""
-    img_filename = f"img{slide.index:04d}.jpg"
-    img_path = image_dir / img_filename
-    if not img_path.exists():
+    image = slide_image(slide, image_dir, "width: 100%")
+    if image is None:
         return ""
 
-    caption_text = get_slide_text(slide.captions)
-    escaped_caption = escape_typst(caption_text)
+    escaped_caption = escape_typst(slide.text)
 
-    timestamp = slide.index * SECONDS_PER_SHOT
+    timestamp = slide.timestamp
     video_link = f"{url}&t={timestamp}s"
 
     return f"""#block(breakable: false, width: 100%)[
-  #image("{img_filename}", width: 100%)
+  #{image}
   #v(0.1cm)
   #text(size: 8pt)[{escaped_caption}]
   #v(0.05cm)
@@ -163,22 +233,20 @@ def render_slide_typst(slide: Slide, url: str, image_dir: Path) -> str:
 
 def render_slide_compact(slide: Slide, url: str, image_dir: Path) -> str:
     """Render a slide in compact side-by-side layout (image left, text right)."""
-    img_filename = f"img{slide.index:04d}.jpg"
-    img_path = image_dir / img_filename
-    if not img_path.exists():
+    image = slide_image(slide, image_dir, "width: 100%")
+    if image is None:
         return ""
 
-    caption_text = get_slide_text(slide.captions)
-    escaped_caption = escape_typst(caption_text)
+    escaped_caption = escape_typst(slide.text)
 
-    timestamp = slide.index * SECONDS_PER_SHOT
+    timestamp = slide.timestamp
     video_link = f"{url}&t={timestamp}s"
 
     return f"""#block(breakable: false, width: 100%)[
   #grid(
     columns: (1fr, 1fr),
     gutter: 0.15cm,
-    image("{img_filename}", width: 100%),
+    {image},
     [
       #text(size: 7pt)[{escaped_caption}]
       #v(0.05cm)
@@ -191,14 +259,14 @@ def render_slide_compact(slide: Slide, url: str, image_dir: Path) -> str:
 
 
 def render_slide_page(slide: Slide, url: str, image_dir: Path) -> str:
-    img_filename = f"img{slide.index:04d}.jpg"
-    img_path = image_dir / img_filename
-    if not img_path.exists():
+    image = slide_image(
+        slide, image_dir, 'width: 100%, height: 100%, fit: "contain"'
+    )
+    if image is None:
         return ""
 
-    caption_text = get_slide_text(slide.captions)
-    escaped_caption = escape_typst(caption_text)
-    timestamp = slide.index * SECONDS_PER_SHOT
+    escaped_caption = escape_typst(slide.text)
+    timestamp = slide.timestamp
     video_link = f"{url}&t={timestamp}s"
 
     return f"""
@@ -220,38 +288,47 @@ def render_slide_page(slide: Slide, url: str, image_dir: Path) -> str:
       #text(size: 7pt)[#link("{video_link}")[▶ {format_timestamp(timestamp)}]]
     ],
     align(right + top)[
-      #image("{img_filename}", width: 100%, height: 100%, fit: "contain")
+      #{image}
     ]
   )
 ]
 """
 
 
-def get_slide_text(captions: list[Caption]) -> str:
+def slide_image(slide: Slide, image_dir: Path, arguments: str) -> str | None:
+    """Typst expression showing the slide's still, or None if it is missing.
+
+    Slides already shown in an earlier video of the playlist get a short
+    note instead of their image.
+    """
+    if slide.seen_elsewhere:
+        return f'text(style: "italic")[{escape_typst(SEEN_ELSEWHERE_NOTE)}]'
+    for suffix in IMAGE_SUFFIXES.values():
+        img_filename = f"img{slide.index:04d}{suffix}"
+        if (image_dir / img_filename).exists():
+            return f'image("{img_filename}", {arguments})'
+    return None
+
+
+def get_slide_text(captions: CaptionStore | Iterable[Caption]) -> str:
     """Combine captions into a single text block."""
+    captions = as_caption_store(captions)
     if not captions:
         return ""
-    texts = [cap.text for cap in captions]
-    return combine_caption_texts(texts)
+    return combine_caption_texts(captions.texts())
 
 
 def escape_typst(text: str) -> str:
-    """Escape special Typst characters."""
-    # Typst special characters that need escaping
-    replacements = [
-        ("\\", "\\\\"),
-        ("#", "\\#"),
-        ("$", "\\$"),
-        ("*", "\\*"),
-        ("_", "\\_"),
-        ("<", "\\<"),
-        (">", "\\>"),
-        ("@", "\\@"),
-        ("[", "\\["),
-        ("]", "\\]"),
-    ]
-    for old, new in replacements:
-        text = text.replace(old, new)
+    """Escape special Typst characters.
+
+    One ``str.replace`` per character beats a translate table or a single
+    regex here: both fall back to per-character Python work as soon as a
+    replacement is longer than one character, while each ``replace`` is a
+    C-level scan that returns the text as is when the character is absent
+    (see benchmarks/bench_typst_document.py).
+    """
+    for char, escaped in _TYPST_ESCAPES:
+        text = text.replace(char, escaped)
     return text
 
 
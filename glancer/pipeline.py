@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Generator, Iterable, Sequence
+
+# Playlist stages in order and how many videos each works on at once
+STAGE_NAMES = ("metadata", "download", "extract", "render")
+DEFAULT_STAGE_WORKERS = {"metadata": 2, "download": 2, "extract": 1, "render": 1}
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    function: Callable[[Any], Any]
+    workers: int = 1
+    # Releases a result of this stage nothing will take any more, e.g. a
+    # locked cache entry when the pipeline stops before the next stage
+    cleanup: Callable[[Any], None] | None = None
+
+
+def run_pipeline(
+    items: Iterable[Any], stages: Sequence[Stage], max_in_flight: int | None = None
+) -> Generator[Any, None, None]:
+    """Pass every item through ``stages`` and yield the results in order.
+
+    Each stage has its own thread pool, so while one item is in a later
+    stage the next can already be in an earlier one (video N+1 downloads
+    while video N is decoded). Pools take work first in, first out, so a
+    stage with one worker sees the items in input order. At most
+    ``max_in_flight`` items (every worker busy by default) are between the
+    first stage and the consumer: when the consumer or a slow stage falls
+    behind, nothing new is started. The first failure is raised once every
+    item before it has been yielded, and no stage starts on an item after
+    it, so a one-worker last stage never runs past the failure. A result no
+    stage or consumer will take, because of a failure or because the
+    consumer stopped, is passed to its stage's ``cleanup``.
+    """
+    if max_in_flight is None:
+        max_in_flight = sum(stage.workers for stage in stages)
+    executors = [
+        ThreadPoolExecutor(max_workers=stage.workers, thread_name_prefix=stage.name)
+        for stage in stages
+    ]
+    failure = _FirstFailure()
+    in_flight: deque[Future[Any]] = deque()
+    try:
+        for position, item in enumerate(items):
+            future: Future[Any] = Future()
+            future.set_result(item)
+            cleanup = None
+            for stage, executor in zip(stages, executors):
+                future = executor.submit(
+                    _after, stage.function, future, cleanup, position, failure
+                )
+                cleanup = stage.cleanup
+            in_flight.append(future)
+            if len(in_flight) >= max(max_in_flight, 1):
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+    finally:
+        # Every remaining item is skipped rather than cancelled, so whatever
+        # it already holds is cleaned up
+        failure.record(-1)
+        for executor in executors:
+            executor.shutdown(wait=True)
+        for future in in_flight:
+            _discard(future, stages[-1].cleanup if stages else None)
+
+
+class _FirstFailure:
+    """Position of the earliest item that failed in any stage so far."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.position: float = float("inf")
+
+    def record(self, position: int) -> None:
+        with self._lock:
+            self.position = min(self.position, position)
+
+
+def _after(
+    function: Callable[[Any], Any],
+    upstream: Future[Any],
+    upstream_cleanup: Callable[[Any], None] | None,
+    position: int,
+    failure: _FirstFailure,
+) -> Any:
+    if position > failure.position:
+        _discard(upstream, upstream_cleanup)
+        raise CancelledError
+    try:
+        # Raises the upstream stage's exception, if any, for the consumer
+        return function(upstream.result())
+    except BaseException:
+        failure.record(position)
+        raise
+
+
+def _discard(future: Future[Any], cleanup: Callable[[Any], None] | None) -> None:
+    """Clean up ``future``'s result, if it has one."""
+    if cleanup is None:
+        return
+    try:
+        result = future.result()
+    except BaseException:
+        # A failed or skipped stage left nothing behind
+        return
+    cleanup(result)
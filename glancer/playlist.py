@@ -1,46 +1,65 @@
 from __future__ import annotations
 
+import json
 import subprocess
+import tempfile
 from dataclasses import dataclass
+from typing import Generator
+
+from .process import Video, video_from_info
 
 
 @dataclass
 class Playlist:
     url: str
+    # yt-dlp --playlist-items spec, e.g. "11:" to resume at the 11th video
+    # or "1:10" for the first ten
+    items: str | None = None
+
+    def __iter__(self) -> Generator[Video, None, None]:
+        """The playlist's videos with the title and duration yt-dlp lists.
 
-    def __post_init__(self) -> None:
-        self._video_ids: list[str] | None = None
-        self._index = 0
-
-    def __iter__(self) -> "Playlist":
-        self._video_ids = self._get_video_ids()
-        self._index = 0
-        return self
-
-    def __next__(self) -> str:
-        if self._video_ids is None:
-            self._video_ids = self._get_video_ids()
-        if self._index < len(self._video_ids):
-            video_id = self._video_ids[self._index]
-            self._index += 1
-            return f"https://www.youtube.com/watch?v={video_id}"
-        raise StopIteration
-
-    def _get_video_ids(self) -> list[str]:
-        result = subprocess.run(
-            [
-                "yt-dlp",
-                "--flat-playlist",
-                "-i",
-                "--get-id",
-                self.url,
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        return result.stdout.strip().split("\n")
+        Entries are yielded as yt-dlp prints them, so the first video can be
+        processed while the rest of a long playlist is still being listed.
+        The flat listing has titles and durations for YouTube playlists, so
+        entries don't need a metadata call of their own; an entry without a
+        title is left for :func:`~glancer.process.get_video_metadata`.
+        """
+        command = ["yt-dlp", "--flat-playlist", "-i", "--dump-json"]
+        if self.items is not None:
+            command.extend(["--playlist-items", self.items])
+        command.append(self.url)
+        # A file rather than a pipe, so yt-dlp can't stall on a full stderr
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=stderr, text=True
+            )
+            stdout = process.stdout
+            assert stdout is not None
+            try:
+                for line in stdout:
+                    if line.strip():
+                        yield playlist_entry(json.loads(line))
+            except BaseException:
+                # Stopped early: nothing is waiting for the rest
+                process.kill()
+                raise
+            finally:
+                stdout.close()
+                process.wait()
+            if process.returncode != 0:
+                stderr.seek(0)
+                raise subprocess.CalledProcessError(
+                    process.returncode,
+                    command,
+                    stderr=stderr.read().decode("utf-8", errors="replace"),
+                )
 
     @staticmethod
     def is_playlist(url: str) -> bool:
         return "list=" in url
+
+
+def playlist_entry(entry: dict) -> Video:
+    url = f"https://www.youtube.com/watch?v={entry['id']}"
+    return video_from_info(url, entry)
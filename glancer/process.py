@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import bisect
+import json
 import logging
-import math
 import os
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from pathlib import Path
+from typing import Any, Callable, Sequence, Tuple
+
+from .cache import CacheEntry, StageManifest, VideoCache, file_fingerprint, stage_key
+from .frames import DEFAULT_THUMBNAIL_SIZE, Frame, FrameStore, split_jpegs
 
 logger = logging.getLogger(__name__)
 
@@ -18,112 +25,346 @@ class Video:
     url: str
     title: str
     video_id: str
+    # Known from yt-dlp's metadata, so neither ffprobe nor yt-dlp is rerun
+    duration: int | None = None
+    caption_languages: tuple[str, ...] = ()
+    # yt-dlp's full info JSON (formats, caption tracks...), which the download
+    # reuses instead of extracting the video again
+    info_json: str | None = field(default=None, repr=False, compare=False)
+
+
+# What process_video hands to rendering: the (still locked) cache entry,
+# video, captions path and stills
+FetchedVideo = Tuple[CacheEntry, Video, Path, FrameStore]
+
+
+@dataclass(frozen=True)
+class DownloadProfile:
+    """Which streams yt-dlp fetches for a video.
+
+    The default downloads video and audio and merges them, keeping the
+    separate streams. Stills never need the audio, so ``lean`` fetches a
+    video-only stream instead, remuxed to mp4 when it isn't one already,
+    with ``fragments`` fragments at once and no intermediates kept. The
+    ``remote`` extraction reads the lean stream in place, with at most
+    ``connections`` HTTP requests at once.
+    """
+
+    lean: bool = False
+    # Tallest video fetched, 720p by default so downloads don't take ages;
+    # stills are taken at this resolution
+    max_height: int = 720
+    fragments: int = 4
+    connections: int = 4
+
+    @property
+    def video_format(self) -> str:
+        height = f"[height<={self.max_height}]"
+        if self.lean:
+            return f"bv{height}[ext=mp4]/bv{height}/b{height}/b"
+        return f"bv*{height}[ext=mp4]+ba[ext=m4a]/b{height}[ext=mp4]/best[ext=mp4]"
+
+    def yt_dlp_options(self) -> list[str]:
+        if self.lean:
+            return [
+                "-f",
+                self.video_format,
+                "--remux-video",
+                "mp4",
+                "--concurrent-fragments",
+                str(self.fragments),
+            ]
+        return ["-f", self.video_format, "--merge-output-format", "mp4", "-k"]
 
 
 def get_video_metadata(url: str) -> Video:
-    title = _get_title(url)
-    video_id = _get_id(url)
-    return Video(url, title, video_id)
+    """Title, id, duration, formats and caption tracks from one yt-dlp call."""
+    try:
+        result = subprocess.run(
+            [
+                "yt-dlp",
+                "--dump-single-json",
+                "--no-warnings",
+                "--no-playlist",
+                url,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+    except subprocess.CalledProcessError as e:
+        print(
+            f"yt-dlp error getting metadata:\nstdout: {e.stdout}\nstderr: {e.stderr}",
+            file=sys.stderr,
+        )
+        raise
+    return video_from_info(url, json.loads(result.stdout), result.stdout)
+
+
+def video_from_info(
+    url: str, info: dict[str, Any], info_json: str | None = None
+) -> Video:
+    """Build a :class:`Video` from a yt-dlp info dict or flat-playlist entry."""
+    duration = info.get("duration")
+    captions = {
+        *(info.get("subtitles") or {}),
+        *(info.get("automatic_captions") or {}),
+    }
+    return Video(
+        url,
+        info.get("title") or "",
+        info["id"],
+        duration=int(duration) if duration is not None else None,
+        caption_languages=tuple(sorted(captions)),
+        info_json=info_json,
+    )
+
+
+@dataclass(frozen=True)
+class RemoteStream:
+    """A video whose stills are read from its stream URL instead of a download."""
 
+    video: Video
+    profile: DownloadProfile = DownloadProfile()
 
-def prepare_cache_directory(video_id: str) -> Path:
-    temp_root = Path(tempfile.gettempdir()) / "glancer"
-    cache_dir = temp_root / video_id
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    return cache_dir
+    @property
+    def video_format(self) -> str:
+        # One video-only stream: ffmpeg can't seek in a merge that never happened
+        return replace(self.profile, lean=True).video_format
 
+    def resolve(self) -> str:
+        """The stream's URL, which yt-dlp picks without downloading anything.
 
-def download_video_and_captions(video: Video, cache_dir: Path) -> Path:
+        URLs expire after a few hours, so it's resolved for every extraction
+        rather than cached.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            source = _yt_dlp_source(self.video, Path(directory))
+            try:
+                result = subprocess.run(
+                    [
+                        "yt-dlp",
+                        "--no-playlist",
+                        "--no-warnings",
+                        "-f",
+                        self.video_format,
+                        "--get-url",
+                        *source,
+                    ],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+            except subprocess.CalledProcessError as e:
+                print(
+                    f"yt-dlp error resolving the stream URL:\nstdout: {e.stdout}\n"
+                    f"stderr: {e.stderr}",
+                    file=sys.stderr,
+                )
+                raise
+        return result.stdout.split()[0]
+
+
+def download_video_and_captions(
+    video: Video, cache_dir: Path, profile: DownloadProfile | None = None
+) -> Path:
+    profile = profile or DownloadProfile()
     video_path = cache_dir / f"{video.video_id}.mp4"
     captions_path = cache_dir / f"{video.video_id}.en.srt"
-    if not (video_path.exists() and captions_path.exists()):
+    stages = StageManifest(cache_dir)
+    inputs = {
+        "video_id": video.video_id,
+        "format": profile.video_format,
+        "captions": "en",
+    }
+    artifacts = [video_path.name, captions_path.name]
+    # Downloads from before the stage manifest existed are reused too
+    legacy = not stages.known("download") and all(
+        (cache_dir / name).exists() for name in artifacts
+    )
+    if stages.get("download", inputs) is None and not legacy:
+        if video.info_json is not None and "en" not in video.caption_languages:
+            logger.warning(f"yt-dlp lists no English captions for {video.url}")
         print("Downloading video (this may take a while)", file=sys.stderr)
-        _generate_video(video, cache_dir)
+        _generate_video(video, cache_dir, profile)
         print(
             f"Downloaded video to {cache_dir}/{video.video_id}(.mp4|en.srt)",
             file=sys.stderr,
         )
     else:
         print(f"Reusing cached video in {cache_dir}", file=sys.stderr)
+    if video_path.exists() and captions_path.exists():
+        stages.put("download", inputs, artifacts=artifacts)
     return captions_path
 
 
-def generate_stills(cache_dir: Path, video_id: str, log_level: str) -> None:
+def download_captions(video: Video, cache_dir: Path) -> Path:
+    """Download only the captions, for a video whose stills come from its stream.
+
+    Captions an earlier full download left behind are reused.
+    """
+    captions_path = cache_dir / f"{video.video_id}.en.srt"
+    stages = StageManifest(cache_dir)
+    inputs = {"video_id": video.video_id, "captions": "en"}
+    if stages.get("download", inputs) is None and not captions_path.exists():
+        if video.info_json is not None and "en" not in video.caption_languages:
+            logger.warning(f"yt-dlp lists no English captions for {video.url}")
+        print("Downloading captions", file=sys.stderr)
+        _generate_video(video, cache_dir, captions_only=True)
+    else:
+        print(f"Reusing cached captions in {cache_dir}", file=sys.stderr)
+    if captions_path.exists():
+        stages.put("download", inputs, artifacts=[captions_path.name])
+    return captions_path
+
+
+def generate_stills(
+    cache_dir: Path,
+    video_id: str,
+    log_level: str,
+    extraction: str = "decode",
+    duration: int | None = None,
+    stream: RemoteStream | None = None,
+) -> FrameStore:
+    """Extract a cached video's stills, or load them from an earlier run.
+
+    Stills are saved next to the video keyed by everything that shapes them,
+    so a re-run (say PDF after HTML) with the same settings skips ffmpeg.
+    The ``remote`` extraction reads ``stream`` instead of a downloaded video.
+    """
+    stages = StageManifest(cache_dir)
+    video_path = cache_dir / f"{video_id}.mp4"
+    if extraction == "remote":
+        if stream is None:
+            raise ValueError("Remote extraction needs the video's stream")
+        # The stream's URL changes, the video it points to doesn't
+        fingerprint = {"video_id": video_id, "format": stream.video_format}
+    else:
+        fingerprint = file_fingerprint(video_path)
+    inputs = {
+        "video": fingerprint,
+        "extraction": extraction,
+        "interval": SECONDS_PER_SHOT,
+        "first_shot": FIRST_SHOT_SECONDS,
+        "quality": JPEG_QUALITY,
+        "thumbnail_size": list(DEFAULT_THUMBNAIL_SIZE),
+    }
+    key = stage_key(inputs)
+    pack_name = f"stills-{key}.pack"
+    if stages.get("stills", inputs) is not None:
+        frames = FrameStore.read_pack(cache_dir / pack_name)
+        frames.key = key
+        print(f"Reusing {len(frames)} cached images", file=sys.stderr)
+        return frames
+
+    source = None
+    if stream is not None and extraction == "remote":
+        source = stream.resolve()
+    elif duration is None and extraction != "decode":
+        duration = probe_duration(cache_dir, video_path)
     print("Generating still images (this may take a while)", file=sys.stderr)
-    _generate_shots(cache_dir, video_id, log_level)
-    print("Generated images", file=sys.stderr)
+    frames = _generate_shots(
+        cache_dir,
+        video_id,
+        log_level,
+        extraction,
+        duration=duration,
+        source=source,
+        connections=stream.profile.connections if stream else None,
+    )
+    print(f"Generated {len(frames)} images", file=sys.stderr)
+    frames.key = key
+    frames.write_pack(cache_dir / pack_name)
+    stages.put("stills", inputs, {"count": len(frames)}, [pack_name])
+    return frames
+
+
+def probe_duration(cache_dir: Path, video_path: Path) -> int:
+    """:func:`get_video_duration`, remembered for the downloaded file."""
+    stages = StageManifest(cache_dir)
+    inputs = {"video": file_fingerprint(video_path)}
+    recorded = stages.get("duration", inputs)
+    if recorded is not None:
+        return recorded["duration"]
+    duration = get_video_duration(video_path)
+    stages.put("duration", inputs, {"duration": duration})
+    return duration
 
 
 def process_video(
-    url: str, ffmpeg_log_level: str = "error"
-) -> tuple[Path, Video, Path]:
+    url: str,
+    ffmpeg_log_level: str = "error",
+    extraction: str = "decode",
+    cache: VideoCache | None = None,
+    profile: DownloadProfile | None = None,
+) -> FetchedVideo:
+    """Download a video into the cache and extract its stills.
+
+    The ``remote`` extraction downloads only the captions. The returned cache
+    entry stays locked until the caller closes it.
+    """
     video = get_video_metadata(url)
     print(f"Processing video: '{video.title}'", file=sys.stderr)
-    cache_dir = prepare_cache_directory(video.video_id)
-    captions_path = download_video_and_captions(video, cache_dir)
-    generate_stills(cache_dir, video.video_id, ffmpeg_log_level)
-    return cache_dir, video, captions_path
-
-
-def _get_title(url: str) -> str:
+    entry = (cache or VideoCache()).open(video.video_id)
     try:
-        result = subprocess.run(
-            [
-                "yt-dlp",
-                "-e",
-                "--no-warnings",
-                "--no-playlist",
-                url,
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
+        captions_path, stream = download_for_extraction(
+            video, entry.path, extraction, profile
         )
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(
-            f"yt-dlp error getting title:\nstdout: {e.stdout}\nstderr: {e.stderr}",
-            file=sys.stderr,
+        frames = generate_stills(
+            entry.path,
+            video.video_id,
+            ffmpeg_log_level,
+            extraction,
+            video.duration,
+            stream,
         )
+    except BaseException:
+        entry.close()
         raise
+    return entry, video, captions_path, frames
 
 
-def _get_id(url: str) -> str:
-    try:
-        result = subprocess.run(
-            [
-                "yt-dlp",
-                "--get-id",
-                "--no-warnings",
-                "--no-playlist",
-                url,
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(
-            f"yt-dlp error getting ID:\nstdout: {e.stdout}\nstderr: {e.stderr}",
-            file=sys.stderr,
-        )
-        raise
+def download_for_extraction(
+    video: Video,
+    cache_dir: Path,
+    extraction: str,
+    profile: DownloadProfile | None = None,
+) -> tuple[Path, RemoteStream | None]:
+    """What ``extraction`` needs fetched: captions, and the video or its stream."""
+    if extraction == "remote":
+        stream = RemoteStream(video, profile or DownloadProfile())
+        return download_captions(video, cache_dir), stream
+    return download_video_and_captions(video, cache_dir, profile), None
+
+
+def _yt_dlp_source(video: Video, directory: Path) -> list[str]:
+    if video.info_json is None:
+        return [video.url]
+    # Download from the metadata already fetched instead of extracting again
+    info_path = directory / f"{video.video_id}.info.json"
+    info_path.write_text(video.info_json, encoding="utf-8")
+    return ["--load-info-json", str(info_path)]
 
 
-def _generate_video(video: Video, directory: Path) -> None:
+def _generate_video(
+    video: Video,
+    directory: Path,
+    profile: DownloadProfile | None = None,
+    captions_only: bool = False,
+) -> None:
     output_template = directory / f"{video.video_id}.%(ext)s"
+    source = _yt_dlp_source(video, directory)
+    if captions_only:
+        media = ["--skip-download"]
+    else:
+        media = (profile or DownloadProfile()).yt_dlp_options()
     args = [
         "yt-dlp",
         "-q",
         "--no-playlist",
-        "-f",
-        # Hardcoding to at most 720p so that download doesn't take ages
-        "bv*[height<=720][ext=mp4]+ba[ext=m4a]/b[height<=720][ext=mp4]/best[ext=mp4]",
+        *media,
         "-o",
         str(output_template),
-        "--merge-output-format",
-        "mp4",
         "--sub-langs",
         "en",
         "--write-auto-sub",
@@ -132,9 +373,8 @@ def _generate_video(video: Video, directory: Path) -> None:
         "--sub-format",
         "srt",
         "--no-warnings",
-        "-k",
         "--no-cache-dir",
-        video.url,
+        *source,
     ]
     try:
         subprocess.run(args, check=True, capture_output=True, text=True)
@@ -146,156 +386,326 @@ def _generate_video(video: Video, directory: Path) -> None:
         raise
 
 
-def _ffmpeg_args(
-    directory: Path,
-    filename: str,
-    selector: list[str],
-    suffix: str,
-    *,
-    pre_input: list[str] | None = None,
-    extra_args: list[str] | None = None,
+def _frame_outputs(
+    thumbnail_output: str, thumbnail_size: tuple[int, int]
+) -> tuple[str, list[str]]:
+    """Filter suffix and output options shared by every extraction mode.
+
+    Selected frames are split in two: full-size JPEGs go to stdout as an MJPEG
+    stream and tiny grayscale thumbnails for hashing go to ``thumbnail_output``
+    as raw pixels, so both come out of the same decode.
+    """
+    width, height = thumbnail_size
+    filter_suffix = (
+        "setpts=N,split=2[full][small];"
+        f"[small]scale={width}:{height}:flags=area,format=gray[thumb]"
+    )
+    outputs = [
+        "-map",
+        "[full]",
+        "-fps_mode",
+        "passthrough",
+        "-f",
+        "image2pipe",
+        "-c:v",
+        "mjpeg",
+        "-pix_fmt",
+        "yuvj420p",
+        "-q:v",
+        JPEG_QUALITY,
+        "pipe:1",
+        "-map",
+        "[thumb]",
+        "-fps_mode",
+        "passthrough",
+        "-f",
+        "rawvideo",
+        thumbnail_output,
+    ]
+    return filter_suffix, outputs
+
+
+def _single_pass_args(
+    video_path: Path,
     log_level: str = "error",
+    thumbnail_output: str = "pipe:3",
+    thumbnail_size: tuple[int, int] = DEFAULT_THUMBNAIL_SIZE,
 ) -> list[str]:
-    input_path = directory / f"{filename}.mp4"
-    output_pattern = directory / f"glancer-img{suffix}.jpg"
-    command = ["ffmpeg", "-y", "-hide_banner", "-loglevel", log_level]
-    if pre_input:
-        command.extend(pre_input)
-    command.extend(["-i", str(input_path)])
-    command.extend(selector)
-    if extra_args:
-        command.extend(extra_args)
-    command.append(str(output_pattern))
-    return command
+    """Build one ffmpeg command that decodes the video once and emits every shot.
+
+    Shot 0 is the first frame at ``FIRST_SHOT_SECONDS``, which skips the usual
+    black intro frame, and every later shot is the first frame of its
+    ``SECONDS_PER_SHOT`` window.
+    """
+    select = (
+        "select='if(isnan(prev_selected_t),"
+        f"gte(t,{FIRST_SHOT_SECONDS}),"
+        f"gt(floor(t/{SECONDS_PER_SHOT}),floor(prev_selected_t/{SECONDS_PER_SHOT})))'"
+    )
+    filter_suffix, outputs = _frame_outputs(thumbnail_output, thumbnail_size)
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        log_level,
+        "-i",
+        str(video_path),
+        "-filter_complex",
+        f"[0:v]{select},{filter_suffix}",
+        *outputs,
+    ]
 
 
-def run_ffmpeg(cmd: list[str]) -> None:
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"ffmpeg error: {result.stderr}", file=sys.stderr)
-        result.check_returncode()
+def _seek_args(
+    video_path: Path | str,
+    targets: list[float],
+    log_level: str = "error",
+    thumbnail_output: str = "pipe:3",
+    thumbnail_size: tuple[int, int] = DEFAULT_THUMBNAIL_SIZE,
+    *,
+    keyframes_only: bool = False,
+    input_options: Sequence[str] = (),
+) -> list[str]:
+    """Build one ffmpeg command that seeks to each target and decodes one frame.
+
+    Every target gets its own input so ffmpeg seeks straight to it instead of
+    decoding the video in between, and the single frames are concatenated in
+    order. With ``keyframes_only`` the decoder drops everything but keyframes
+    and the seek lands on the keyframe itself. ``video_path`` can be a URL,
+    read with ``input_options``.
+    """
+    command = ["ffmpeg", "-hide_banner", "-loglevel", log_level]
+    for seconds in targets:
+        command.extend(input_options)
+        if keyframes_only:
+            # Nudge past the keyframe so rounding never seeks to the previous one
+            command.extend(["-skip_frame", "nokey", "-noaccurate_seek"])
+            seconds += KEYFRAME_SEEK_EPSILON
+        command.extend(["-ss", f"{seconds:.6f}", "-i", str(video_path)])
+    trims = "".join(
+        f"[{index}:v:0]trim=end_frame=1[v{index}];" for index in range(len(targets))
+    )
+    inputs = "".join(f"[v{index}]" for index in range(len(targets)))
+    filter_suffix, outputs = _frame_outputs(thumbnail_output, thumbnail_size)
+    command.extend(
+        [
+            "-filter_complex",
+            f"{trims}{inputs}concat=n={len(targets)}:v=1:a=0,{filter_suffix}",
+            *outputs,
+        ]
+    )
+    return command
 
 
-def _generate_shots(directory: Path, filename: str, log_level: str) -> None:
-    video_path = directory / f"{filename}.mp4"
-    duration = get_video_duration(video_path)
+def run_ffmpeg_frames(
+    build_command: Callable[[str], list[str]], thumbnail_size: tuple[int, int]
+) -> list[tuple[bytes, bytes | None]]:
+    """Run an extraction command and collect its JPEGs and thumbnails.
 
-    logger.debug(f"Generating shots for video: {filename}")
-    logger.debug(f"Video duration: {duration} seconds")
+    ``build_command`` receives the ``pipe:N`` output the thumbnails should be
+    written to. Both pipes are drained concurrently so neither can fill up
+    and stall ffmpeg.
+    """
+    read_fd, write_fd = os.pipe()
+    try:
+        cmd = build_command(f"pipe:{write_fd}")
+        logger.debug(f"ffmpeg command: {' '.join(cmd)}")
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=(write_fd,),
+        )
+    finally:
+        os.close(write_fd)
 
-    frame_selector = ["-vf", "fps=1/30", "-pix_fmt", "yuvj420p", "-q:v", JPEG_QUALITY]
-    starts = (
-        [0]
-        if duration <= 0
-        else list(range(0, duration, max(CHUNK_SECONDS, SECONDS_PER_SHOT)))
-    )
+    thumbnails = bytearray()
+    with os.fdopen(read_fd, "rb") as thumbnail_stream:
+        reader = threading.Thread(
+            target=lambda: thumbnails.extend(thumbnail_stream.read())
+        )
+        reader.start()
+        stdout, stderr = process.communicate()
+        reader.join()
 
-    logger.debug(f"Processing {len(starts)} chunks for video")
+    if process.returncode != 0:
+        message = stderr.decode("utf-8", errors="replace")
+        print(f"ffmpeg error: {message}", file=sys.stderr)
+        raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
 
-    tasks = []
-    for chunk_idx, start in enumerate(starts):
-        length = max(0, min(CHUNK_SECONDS, duration - start))
-        if length <= 0:
-            logger.warning(f"Skipping chunk {chunk_idx} at {start}s: length={length}")
-            continue
+    jpegs = split_jpegs(stdout)
+    width, height = thumbnail_size
+    step = width * height
+    results: list[tuple[bytes, bytes | None]] = []
+    for position, jpeg in enumerate(jpegs):
+        thumbnail = bytes(thumbnails[position * step : (position + 1) * step])
+        results.append((jpeg, thumbnail if len(thumbnail) == step else None))
+    return results
 
-        pre_input = ["-ss", str(start)]
-        pre_input.extend(["-t", str(length)])
-        start_number = int(math.floor(start / SECONDS_PER_SHOT))
-        extra = ["-start_number", str(start_number)]
 
-        expected_frames = int(math.ceil(length / SECONDS_PER_SHOT))
-        logger.debug(
-            f"Chunk {chunk_idx}: start={start}s, length={length}s, "
-            f"start_number={start_number}, expected_frames={expected_frames}"
-        )
+def shot_targets(duration: int) -> list[float]:
+    """Timestamps the still for each shot is taken at, mirroring the decode mode."""
+    later = range(SECONDS_PER_SHOT, max(duration, 0), SECONDS_PER_SHOT)
+    return [float(FIRST_SHOT_SECONDS), *(float(t) for t in later)]
 
-        # For short chunks, use a higher frame rate to ensure we get at least one frame
-        current_frame_selector = frame_selector
-        if length < SECONDS_PER_SHOT:
-            current_frame_selector = [
-                "-vf",
-                f"fps=1/{max(1, length)}",
-                "-pix_fmt",
-                "yuvj420p",
-                "-q:v",
-                JPEG_QUALITY,
-            ]
-            logger.debug(f"Chunk {chunk_idx}: Using adjusted fps for short chunk")
-
-        cmd = _ffmpeg_args(
-            directory,
-            filename,
-            current_frame_selector,
-            "%04d",
-            pre_input=pre_input,
-            extra_args=extra,
-            log_level=log_level,
-        )
-        logger.debug(f"Chunk {chunk_idx}: ffmpeg command: {' '.join(cmd)}")
-        tasks.append(cmd)
-
-    if tasks:
-        logger.debug(f"Running {len(tasks)} ffmpeg tasks in parallel")
-        with ThreadPoolExecutor(
-            max_workers=max(1, min(len(tasks), (os.cpu_count() or 1) * 2))
-        ) as executor:
-            executor.map(run_ffmpeg, tasks)
-
-    # Generate first slide image at 3 seconds
-    first_frame_selector = [
-        "-pix_fmt",
-        "yuvj420p",
-        "-q:v",
-        JPEG_QUALITY,
-        "-vframes",
-        "1",
-    ]
-    first_frame_pre_input = ["-ss", "3"]
-    first_frame_args = _ffmpeg_args(
-        directory,
-        filename,
-        first_frame_selector,
-        "0000",
-        pre_input=first_frame_pre_input,
-        log_level=log_level,
-    )
 
-    logger.debug("Generating first slide image (glancer-img0000.jpg)")
-    run_ffmpeg(first_frame_args)
+def nearest_keyframe(keyframes: list[float], target: float) -> float:
+    if not keyframes:
+        return target
+    position = bisect.bisect_left(keyframes, target)
+    candidates = keyframes[max(position - 1, 0) : position + 1]
+    return min(candidates, key=lambda keyframe: abs(keyframe - target))
 
 
-def cleanup_cache(path: Path) -> None:
-    if not path.exists():
-        return
-    for item in path.iterdir():
-        if item.is_dir():
-            cleanup_cache(item)
-        else:
-            try:
-                item.unlink()
-            except FileNotFoundError:
-                continue
-    try:
-        path.rmdir()
-    except OSError:
-        pass
+def first_keyframe_from(keyframes: list[float], target: float) -> float:
+    """The first keyframe at or after ``target``, or the nearest if none is."""
+    position = bisect.bisect_left(keyframes, target)
+    if position < len(keyframes):
+        return keyframes[position]
+    return nearest_keyframe(keyframes, target)
 
 
-def delete_images(directory: Path) -> None:
-    for img_path in directory.glob("glancer-img*.jpg"):
+def _generate_shots(
+    directory: Path,
+    filename: str,
+    log_level: str,
+    extraction: str = "decode",
+    thumbnail_size: tuple[int, int] = DEFAULT_THUMBNAIL_SIZE,
+    duration: int | None = None,
+    source: str | None = None,
+    connections: int | None = None,
+) -> FrameStore:
+    """Extract the stills of a cached video into an in-memory frame store.
+
+    The ``decode`` mode samples on the nominal 30s grid and records no
+    timestamps. The ``seek`` and ``keyframe`` modes only decode around each
+    shot and record the exact or the nearest-keyframe timestamps respectively;
+    they probe the video's ``duration`` unless it is given.
+
+    The ``remote`` mode seeks like ``seek`` in the stream at the ``source``
+    URL, so ffmpeg fetches the index and the byte ranges around each shot
+    with HTTP range requests instead of the whole video. Each shot is its
+    own ffmpeg run, at most ``connections`` (``REMOTE_CONNECTIONS`` by
+    default) at once, retried when it fails.
+    """
+    logger.debug(f"Generating shots for video: {filename} ({extraction})")
+    video_path: Path | str = directory / f"{filename}.mp4"
+    if extraction == "decode":
+        stills = run_ffmpeg_frames(
+            lambda output: _single_pass_args(
+                video_path, log_level, output, thumbnail_size
+            ),
+            thumbnail_size,
+        )
+        return FrameStore(
+            Frame(index, jpeg, thumbnail, thumbnail_size)
+            for index, (jpeg, thumbnail) in enumerate(stills)
+        )
+    if extraction not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode: {extraction}")
+
+    remote = extraction == "remote"
+    if remote:
+        if source is None:
+            raise ValueError("Remote extraction needs the stream URL")
+        video_path = source
+    if duration is None:
+        duration = get_video_duration(video_path)
+    targets = shot_targets(duration)
+    keyframes_only = extraction == "keyframe"
+    if keyframes_only:
+        keyframes = get_keyframe_times(video_path)
+        logger.debug(f"Indexed {len(keyframes)} keyframes")
+        # Snapping shot 0 back would land on the intro FIRST_SHOT_SECONDS skips
+        targets = [
+            first_keyframe_from(keyframes, targets[0]),
+            *(nearest_keyframe(keyframes, target) for target in targets[1:]),
+        ]
+
+    # A remote input holds a connection open for as long as its process runs
+    per_process = 1 if remote else SHOTS_PER_PROCESS
+    batches = [
+        targets[start : start + per_process]
+        for start in range(0, len(targets), per_process)
+    ]
+
+    def extract(batch: list[float]) -> list[tuple[bytes, bytes | None]]:
+        def run() -> list[tuple[bytes, bytes | None]]:
+            return run_ffmpeg_frames(
+                lambda output: _seek_args(
+                    video_path,
+                    batch,
+                    log_level,
+                    output,
+                    thumbnail_size,
+                    keyframes_only=keyframes_only,
+                    input_options=REMOTE_INPUT_OPTIONS if remote else (),
+                ),
+                thumbnail_size,
+            )
+
+        stills = _retry(run, REMOTE_ATTEMPTS) if remote else run()
+        if len(stills) != len(batch):
+            logger.warning(
+                f"Expected {len(batch)} stills from ffmpeg but got {len(stills)}"
+            )
+        return stills
+
+    logger.debug(f"Running {len(batches)} ffmpeg tasks for {len(targets)} shots")
+    if remote:
+        workers = connections or REMOTE_CONNECTIONS
+    else:
+        workers = os.cpu_count() or 1
+    store = FrameStore()
+    with ThreadPoolExecutor(max_workers=max(1, min(len(batches), workers))) as executor:
+        for batch_index, stills in enumerate(executor.map(extract, batches)):
+            first = batch_index * per_process
+            for offset, (jpeg, thumbnail) in enumerate(stills):
+                index = first + offset
+                store.add(
+                    Frame(index, jpeg, thumbnail, thumbnail_size, targets[index])
+                )
+    return store
+
+
+def _retry(
+    function: Callable[[], list[tuple[bytes, bytes | None]]], attempts: int
+) -> list[tuple[bytes, bytes | None]]:
+    """Run a remote extraction again, after a growing pause, while ffmpeg fails."""
+    delay = REMOTE_RETRY_SECONDS
+    for _ in range(attempts - 1):
         try:
-            img_path.unlink()
-        except FileNotFoundError:
-            continue
+            return function()
+        except subprocess.CalledProcessError:
+            logger.debug(f"ffmpeg failed reading the stream, retrying in {delay}s")
+            time.sleep(delay)
+            delay *= 2
+    return function()
 
 
 SECONDS_PER_SHOT = 30
-CHUNK_SECONDS = 300
+FIRST_SHOT_SECONDS = 3
 JPEG_QUALITY = "5"
-
-
-def get_video_duration(video_path: Path) -> int:
+EXTRACTION_MODES = ("decode", "seek", "keyframe", "remote")
+SHOTS_PER_PROCESS = 16
+KEYFRAME_SEEK_EPSILON = 0.001
+# Remote extraction: ffmpeg runs reading the stream at once, tries per shot
+# and the pause before the first retry, doubled for every later one
+REMOTE_CONNECTIONS = 4
+REMOTE_ATTEMPTS = 3
+REMOTE_RETRY_SECONDS = 0.5
+# Reconnect when a response ends early and give up on a stalled one (in µs)
+REMOTE_INPUT_OPTIONS = (
+    "-reconnect",
+    "1",
+    "-reconnect_delay_max",
+    "4",
+    "-rw_timeout",
+    "30000000",
+)
+
+
+def get_video_duration(video_path: Path | str) -> int:
     result = subprocess.run(
         [
             "ffprobe",
@@ -315,3 +725,37 @@ def get_video_duration(video_path: Path) -> int:
         return int(float(result.stdout.strip()))
     except ValueError:
         return 0
+
+
+def get_keyframe_times(video_path: Path | str) -> list[float]:
+    """Index the keyframe timestamps of the first video stream.
+
+    Reads packet flags only, so the index costs a demux pass and no decoding.
+    """
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "packet=pts_time,flags",
+            "-of",
+            "csv=print_section=0",
+            str(video_path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" not in flags:
+            continue
+        try:
+            keyframes.append(float(pts_time))
+        except ValueError:
+            continue
+    return sorted(keyframes)
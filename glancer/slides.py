@@ -5,157 +5,350 @@ import logging
 import math
 import re
 from dataclasses import dataclass, replace
+from functools import cached_property
 from pathlib import Path
-
-from .html_builder import embody
-from .image_similarity import find_similar_shots
-from .parser import Caption
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from .frames import FrameStore, as_frame_store
+from .html_builder import AssetDirectory, embody_stream, write_atomically
+from .hash_store import HashCache
+from .output_images import ImageOptions, prepare_frames
+from .image_similarity import (
+    ShotSimilarityConfig,
+    find_frames_seen_elsewhere,
+    match_similar_frames,
+)
+from .parser import (
+    Caption,
+    CaptionIndex,
+    CaptionStore,
+    CaptionStoreBuilder,
+    as_caption_store,
+)
 from .process import Video
 
 logger = logging.getLogger(__name__)
 
 SECONDS_PER_SHOT = 30
+SEEN_ELSEWHERE_NOTE = "Slide already shown in an earlier video of this playlist"
 
 
 @dataclass(frozen=True)
 class Slide:
     index: int
-    captions: list[Caption]
+    captions: CaptionStore
     duplicate: bool
+    timestamp: int
+    # Already shown in an earlier video of the playlist, so not embedded again
+    seen_elsewhere: bool = False
+    # For duplicates, the earlier shot whose still this one repeats
+    same_as: int | None = None
+
+    @cached_property
+    def text(self) -> str:
+        """The slide's captions merged into one text, shared by every renderer."""
+        if not self.captions:
+            return ""
+        return combine_caption_texts(self.captions.texts())
 
 
 def convert_to_html(
     video: Video,
-    directory: Path,
-    captions: list[Caption],
+    frames: FrameStore | Path,
+    captions: CaptionStore | list[Caption],
     detect_duplicates: bool = True,
+    similarity: ShotSimilarityConfig | None = None,
+    hash_cache: HashCache | None = None,
 ) -> str:
-    return captions_to_html(video, directory, captions, detect_duplicates)
+    return captions_to_html(
+        video, frames, captions, detect_duplicates, similarity, hash_cache
+    )
 
 
 def captions_to_html(
     video: Video,
-    directory: Path,
-    captions: list[Caption],
+    frames: FrameStore | Path,
+    captions: CaptionStore | list[Caption],
     detect_duplicates: bool = True,
+    similarity: ShotSimilarityConfig | None = None,
+    hash_cache: HashCache | None = None,
 ) -> str:
-    slides = generate_slides(captions, directory, detect_duplicates)
-    slides_html = render_slides(slides, video.url, directory)
-    return embody(video, slides_html)
+    return "".join(
+        html_stream(video, frames, captions, detect_duplicates, similarity, hash_cache)
+    )
+
+
+def write_html(
+    video: Video,
+    frames: FrameStore | Path,
+    captions: CaptionStore | list[Caption],
+    output_path: Path,
+    detect_duplicates: bool = True,
+    similarity: ShotSimilarityConfig | None = None,
+    hash_cache: HashCache | None = None,
+    external_assets: bool = False,
+    images: ImageOptions | None = None,
+    slides: list[Slide] | None = None,
+) -> None:
+    """Stream the HTML document to ``output_path`` one slide at a time.
+
+    Only one slide's base64 still is in memory at once, however long the
+    video, and the file appears at ``output_path`` only once it's complete.
+    With ``external_assets`` the stills go to an ``assets/`` directory next
+    to it instead, named by content so documents can share them. ``slides``
+    already generated for another output are reused as they are.
+    """
+    assets = AssetDirectory.next_to(output_path) if external_assets else None
+    write_atomically(
+        html_stream(
+            video,
+            frames,
+            captions,
+            detect_duplicates,
+            similarity,
+            hash_cache,
+            assets,
+            images,
+            slides,
+        ),
+        output_path,
+    )
+
+
+def html_stream(
+    video: Video,
+    frames: FrameStore | Path,
+    captions: CaptionStore | list[Caption],
+    detect_duplicates: bool = True,
+    similarity: ShotSimilarityConfig | None = None,
+    hash_cache: HashCache | None = None,
+    assets: AssetDirectory | None = None,
+    images: ImageOptions | None = None,
+    slides: Iterable[Slide] | None = None,
+) -> Iterator[str]:
+    """The HTML document, a chunk at a time.
+
+    With ``images`` the stills are re-encoded first, which needs every slide
+    up front so a byte budget only counts the stills actually embedded.
+    """
+    frames = as_frame_store(frames)
+    if slides is None:
+        slides = iter_slides(
+            captions, frames, detect_duplicates, similarity, hash_cache
+        )
+    if images is not None and not images.is_passthrough:
+        slides = list(slides)
+        shots = embedded_shots(slides, shared_duplicates=assets is not None)
+        frames = prepare_frames(frames, images, shots)
+    return embody_stream(video, render_slide_blocks(slides, video.url, frames, assets))
 
 
 def generate_slides(
-    captions: list[Caption], directory: Path, detect_duplicates: bool = True
+    captions: CaptionStore | list[Caption],
+    frames: FrameStore | Path,
+    detect_duplicates: bool = True,
+    similarity: ShotSimilarityConfig | None = None,
+    hash_cache: HashCache | None = None,
 ) -> list[Slide]:
+    """Bucket captions into slides.
+
+    Slides link to the timestamp their still was taken at when the frame
+    store records one, and to their nominal 30s grid position otherwise.
+    With a ``hash_cache`` the still hashes are persisted for later runs, and
+    slides matching the cache's previously seen videos are flagged.
+    """
+    slides = list(
+        iter_slides(captions, frames, detect_duplicates, similarity, hash_cache)
+    )
+    if slides:
+        logger.debug(f"Created {len(slides)} slides (indices 0-{len(slides) - 1})")
+    return slides
+
+
+def iter_slides(
+    captions: CaptionStore | list[Caption],
+    frames: FrameStore | Path,
+    detect_duplicates: bool = True,
+    similarity: ShotSimilarityConfig | None = None,
+    hash_cache: HashCache | None = None,
+) -> Iterator[Slide]:
+    """:func:`generate_slides`, yielding each slide as it's assembled."""
     if not captions:
-        return []
+        return
 
-    per_slide = captions_per_slide(captions)
+    frames = as_frame_store(frames)
+    shot_times = frames.shot_times()
+    per_slide = captions_per_slide(captions, shot_times)
     logger.debug(f"Generated {len(per_slide)} slides from captions")
 
     if detect_duplicates:
-        duplicate_shots = find_similar_shots(directory.glob("glancer-img*.jpg"))
+        originals = match_similar_frames(frames, similarity, hash_cache)
+    else:
+        originals = {}
+
+    if hash_cache is not None and hash_cache.seen_video_ids:
+        seen_shots = find_frames_seen_elsewhere(frames, hash_cache, similarity)
     else:
-        duplicate_shots = set()
+        seen_shots = set()
 
-    slides: list[Slide] = []
     for index, slide_captions in enumerate(per_slide):
-        is_duplicate = index in duplicate_shots
-        slides.append(
-            Slide(index=index, captions=slide_captions, duplicate=is_duplicate)
+        yield Slide(
+            index=index,
+            captions=slide_captions,
+            duplicate=index in originals,
+            timestamp=slide_timestamp(index, shot_times),
+            seen_elsewhere=index in seen_shots,
+            same_as=originals.get(index),
         )
 
-    if slides:
-        logger.debug(f"Created {len(slides)} slides (indices 0-{len(slides) - 1})")
 
-    return slides
+def embedded_shots(
+    slides: Iterable[Slide], shared_duplicates: bool = False
+) -> set[int]:
+    """Shots whose stills end up in the document.
 
+    Slides seen in an earlier video show a note instead, and with
+    ``shared_duplicates`` a duplicate reuses its original's still.
+    """
+    shots = set()
+    for slide in slides:
+        if slide.seen_elsewhere:
+            continue
+        if shared_duplicates and slide.same_as is not None:
+            shots.add(slide.same_as)
+        else:
+            shots.add(slide.index)
+    return shots
 
-def render_slides(slides: list[Slide], url: str, directory: Path) -> str:
-    blocks = [render_slide(slide, url, directory) for slide in slides]
-    return "\n".join(blocks)
 
+def render_slides(slides: list[Slide], url: str, frames: FrameStore | Path) -> str:
+    return "\n".join(render_slide_blocks(slides, url, frames))
 
-def render_slide(slide: Slide, url: str, directory: Path) -> str:
-    image_block = slide_block(url, directory, slide.index, slide.duplicate)
+
+def render_slide_blocks(
+    slides: Iterable[Slide],
+    url: str,
+    frames: FrameStore | Path,
+    assets: AssetDirectory | None = None,
+) -> Iterator[str]:
+    frames = as_frame_store(frames)
+    return (render_slide(slide, url, frames, assets) for slide in slides)
+
+
+def render_slide(
+    slide: Slide, url: str, frames: FrameStore, assets: AssetDirectory | None = None
+) -> str:
+    image_block = slide_block(
+        url,
+        frames,
+        slide.index,
+        slide.duplicate,
+        slide.seen_elsewhere,
+        assets,
+        slide.same_as,
+    )
     if not image_block:
         return ""
-    text_block = caps(slide.captions)
-    to_video = to_video_block(url, slide.index)
+    text_block = text_div(slide.text)
+    to_video = to_video_block(url, slide.timestamp)
     return f"{image_block}{text_block}{to_video}</div>"
 
 
-def slide_block(url: str, directory: Path, shot: int, duplicate: bool) -> str:
-    img_path = directory / f"glancer-img{shot:04d}.jpg"
-    if not img_path.exists():
+def slide_block(
+    url: str,
+    frames: FrameStore | Path,
+    shot: int,
+    duplicate: bool,
+    seen_elsewhere: bool = False,
+    assets: AssetDirectory | None = None,
+    same_as: int | None = None,
+) -> str:
+    """The slide's opening markup and image.
+
+    With ``assets`` the still is written to the asset directory and linked
+    with a lazily loaded ``<img>`` instead of being inlined; a duplicate
+    links to the file of the shot it repeats (``same_as``).
+    """
+    frames = as_frame_store(frames)
+    frame = frames.get(shot)
+    if frame is None:
         # Log available images around this slide number
-        all_images = sorted(directory.glob("glancer-img*.jpg"))
-        image_numbers = []
-        for img in all_images:
-            try:
-                num = int(img.stem.replace("glancer-img", ""))
-                image_numbers.append(num)
-            except ValueError:
-                pass
-
+        image_numbers = frames.indexes()
         context = []
         for num in image_numbers:
             if abs(num - shot) <= 5:
                 context.append(num)
 
         logger.warning(
-            f"Missing image for slide {shot}: {img_path}\n"
+            f"Missing image for slide {shot}\n"
             f"  Expected timestamp: {shot * SECONDS_PER_SHOT}s\n"
-            f"  Total images available: {len(all_images)}\n"
+            f"  Total images available: {len(image_numbers)}\n"
             f"  Image numbers near slide {shot}: {context if context else 'none'}"
         )
         return ""
-    data = img_path.read_bytes()
-    encoded = base64.b64encode(data).decode("ascii")
     classes = ["slide-block"]
     if duplicate:
         classes.append("duplicate")
+    if seen_elsewhere:
+        classes.append("seen")
+        image = f"<p class='seen-note'>{SEEN_ELSEWHERE_NOTE}</p>"
+    elif assets is not None:
+        original = frames.get(same_as) if same_as is not None else None
+        still = original or frame
+        src = assets.store(still.data, still.suffix)
+        image = f"<img loading='lazy' src='{src}'/>"
+    else:
+        encoded = base64.b64encode(frame.data).decode("ascii")
+        image = f"<img src='data:{frame.media_type};base64, {encoded}'/></a>"
     class_attr = " ".join(classes)
     return (
         f"<div id='slide{shot}' class='{class_attr}'>\n"
         "\t<div class='img'>\n"
-        f"\t\t<img src='data:image/jpeg;base64, {encoded}'/></a>\n"
+        f"\t\t{image}\n"
         "\t</div>\n"
     )
 
 
-def to_video_block(url: str, shot: int) -> str:
-    when = shot_seconds(shot, SECONDS_PER_SHOT)
+def to_video_block(url: str, when: int) -> str:
     return (
         f"<div class='to-video'><a title='Go to video at timestamp {when}s' "
         f"href='{url}&t={when}s'>&#8688;</a></div>"
     )
 
 
-def caps(captions: list[Caption]) -> str:
+def caps(captions: CaptionStore | Iterable[Caption]) -> str:
+    captions = as_caption_store(captions)
     if not captions:
-        return "\t<div class='txt'>\n\t</div>"
+        return text_div("")
+    return text_div(combine_caption_texts(captions.texts()))
 
-    paragraphs = [normalize_caption_text(caption.text) for caption in captions]
-    combined = combine_caption_texts(paragraphs)
-    if not combined:
+
+def text_div(text: str) -> str:
+    if not text:
         return "\t<div class='txt'>\n\t</div>"
-    return f"\t<div class='txt'>\n\t\t{combined}\n\t</div>"
+    return f"\t<div class='txt'>\n\t\t{text}\n\t</div>"
 
 
 def normalize_caption_text(text: str) -> str:
     return " ".join(text.strip().replace("\n", " ").split())
 
 
-def combine_caption_texts(texts: list[str]) -> str:
-    normalized = [normalize_caption_text(text) for text in texts]
-    normalized = [text for text in normalized if text]
-    if not normalized:
-        return ""
+def combine_caption_texts(texts: Iterable[str]) -> str:
+    """Join captions, dropping the words rolling auto-captions repeat.
 
-    merged_words = normalized[0].split()
-    for text in normalized[1:]:
+    Each caption's words are split once; splitting on any whitespace gives
+    the same words as normalizing first.
+    """
+    merged_words: list[str] = []
+    for text in texts:
         next_words = text.split()
+        if not next_words:
+            continue
+        if not merged_words:
+            merged_words = next_words
+            continue
         overlap = overlapping_word_count(merged_words, next_words)
         if overlap == len(next_words):
             continue
@@ -166,36 +359,125 @@ def combine_caption_texts(texts: list[str]) -> str:
 def overlapping_word_count(
     existing_words: list[str], next_words: list[str], min_overlap_words: int = 5
 ) -> int:
-    max_overlap = min(len(existing_words), len(next_words))
-    for overlap in range(max_overlap, min_overlap_words - 1, -1):
-        if existing_words[-overlap:] == next_words[:overlap]:
-            return overlap
-    return 0
+    """Longest suffix of ``existing_words`` that is a prefix of ``next_words``.
 
+    Overlaps shorter than ``min_overlap_words`` count as none. Only the last
+    ``len(next_words)`` existing words can overlap, and KMP matches
+    ``next_words`` against them in a single pass, so the cost doesn't grow
+    with the text merged so far.
+    """
+    max_overlap = min(len(existing_words), len(next_words))
+    if max_overlap < min_overlap_words:
+        return 0
 
-def captions_per_slide(captions: list[Caption]) -> list[list[Caption]]:
-    cleaned = [clean_caption(caption) for caption in captions]
-    cleaned = [caption for caption in cleaned if caption.text]
+    pattern = next_words[:max_overlap]
+    fallback = _kmp_fallback(pattern)
+    matched = 0
+    for position in range(len(existing_words) - max_overlap, len(existing_words)):
+        word = existing_words[position]
+        while matched and word != pattern[matched]:
+            matched = fallback[matched - 1]
+        if word == pattern[matched]:
+            matched += 1
+    return matched if matched >= min_overlap_words else 0
+
+
+def _kmp_fallback(pattern: list[str]) -> list[int]:
+    """KMP failure function: for each prefix, its longest proper border."""
+    fallback = [0] * len(pattern)
+    border = 0
+    for position in range(1, len(pattern)):
+        word = pattern[position]
+        while border and word != pattern[border]:
+            border = fallback[border - 1]
+        if word == pattern[border]:
+            border += 1
+        fallback[position] = border
+    return fallback
+
+
+def captions_per_slide(
+    captions: CaptionStore | Iterable[Caption],
+    shot_times: dict[int, float] | None = None,
+) -> list[CaptionStore]:
+    """Bucket cleaned captions into one store per slide.
+
+    Slides start on the 30s grid unless ``shot_times`` says when a shot's
+    still was actually taken (e.g. the nearest keyframe), in which case the
+    slide starts there so its captions line up with the still, and each
+    slide's captions come from a :class:`CaptionIndex` range query.
+    """
+    cleaned = clean_captions(as_caption_store(captions))
     total_shots = num_shots(cleaned, SECONDS_PER_SHOT)
     if total_shots <= 0:
         return []
 
-    slides: list[list[Caption]] = [[] for _ in range(total_shots)]
-    for caption in cleaned:
-        slide_index = assigned_slide_index(caption, total_shots)
-        slides[slide_index].append(caption)
-    return slides
+    boundaries = shot_boundaries(total_shots, shot_times)
+    slide_indexes = assigned_slide_indexes(cleaned, boundaries)
+    if shot_times:
+        return captions_between_boundaries(cleaned, boundaries, slide_indexes)
+    # Stable, so captions keep their order within a slide
+    order = np.argsort(slide_indexes, kind="stable")
+    bounds = np.concatenate(
+        ([0], np.cumsum(np.bincount(slide_indexes, minlength=total_shots)))
+    ).tolist()
+    return [
+        cleaned.take(order[bounds[slide] : bounds[slide + 1]])
+        for slide in range(total_shots)
+    ]
+
+
+def captions_between_boundaries(
+    captions: CaptionStore, boundaries: np.ndarray, slide_indexes: np.ndarray
+) -> list[CaptionStore]:
+    """One store per slide, each from the captions overlapping its time range.
+
+    A caption overlapping several slides still only lands on the one
+    ``slide_indexes`` assigns it. The first slide reaches back and the last
+    one forward indefinitely, and every range is widened by the boundary
+    tolerance so captions ending a hair past a boundary are found.
+    """
+    index = CaptionIndex(captions)
+    starts = boundaries.tolist()
+    starts[0] = -math.inf
+    ends = boundaries[1:].tolist() + [math.inf]
+    per_slide = []
+    for slide, (start, end) in enumerate(zip(starts, ends)):
+        positions = index.overlapping_indexes(start, end + 1e-9)
+        per_slide.append(captions.take(positions[slide_indexes[positions] == slide]))
+    return per_slide
+
+
+def shot_boundaries(
+    total_shots: int, shot_times: dict[int, float] | None = None
+) -> np.ndarray:
+    """Start time of every slide: the 30s grid, or the shot's still time.
+
+    The first slide always starts at 0 so leading captions have a home, and
+    boundaries never go backwards even if two shots share a keyframe.
+    """
+    boundaries = np.arange(total_shots, dtype=np.float64) * SECONDS_PER_SHOT
+    for shot, time in (shot_times or {}).items():
+        if 0 < shot < total_shots:
+            boundaries[shot] = time
+    return np.maximum.accumulate(boundaries)
 
 
 def shot_seconds(shot_number: int, secs_per_shot: int) -> int:
     return shot_number * secs_per_shot
 
 
-def num_shots(captions: list[Caption], secs_per_shot: int) -> int:
-    if not captions:
+def slide_timestamp(shot_number: int, shot_times: dict[int, float] | None) -> int:
+    if shot_times and shot_number in shot_times:
+        return int(shot_times[shot_number])
+    return shot_seconds(shot_number, SECONDS_PER_SHOT)
+
+
+def num_shots(captions: CaptionStore | list[Caption], secs_per_shot: int) -> int:
+    if not len(captions):
         return 0
 
-    last_end = captions[-1].end
+    last_end = as_caption_store(captions).ends[-1]
     # Use floor to match ffmpeg's behavior with fps=1/30
     # ffmpeg generates frames at 0s, 30s, 60s, ... and stops when time exceeds duration
     shots = int(math.floor(last_end / secs_per_shot))
@@ -203,10 +485,26 @@ def num_shots(captions: list[Caption], secs_per_shot: int) -> int:
 
 
 def clean_caption(caption: Caption) -> Caption:
-    unescaped = html.unescape(caption.text)
+    return replace(caption, text=clean_caption_text(caption.text))
+
+
+def clean_caption_text(text: str) -> str:
+    unescaped = html.unescape(text)
     cleaned_text = strip_tags(unescaped)
     normalized = cleaned_text.replace("\u00a0", " ")
-    return replace(caption, text=normalized.strip())
+    return normalized.strip()
+
+
+def clean_captions(captions: CaptionStore) -> CaptionStore:
+    """Clean every caption's text, dropping captions left empty."""
+    builder = CaptionStoreBuilder()
+    for start, end, text in zip(
+        captions.starts.tolist(), captions.ends.tolist(), captions.texts()
+    ):
+        cleaned = clean_caption_text(text)
+        if cleaned:
+            builder.append(start, end, cleaned)
+    return builder.build()
 
 
 TAG_RE = re.compile(r"<[^>]+>")
@@ -232,3 +530,22 @@ def assigned_slide_index(caption: Caption, total_shots: int) -> int:
 
     slide_index = int(anchor_time // SECONDS_PER_SHOT)
     return min(max(slide_index, 0), total_shots - 1)
+
+
+def assigned_slide_indexes(
+    captions: CaptionStore, boundaries: np.ndarray
+) -> np.ndarray:
+    """:func:`assigned_slide_index` for every caption, with any slide starts.
+
+    ``boundaries`` holds the sorted start time of each slide; a binary search
+    over them places every caption in O(log slides).
+    """
+    starts, ends = captions.starts, captions.ends
+    latest = np.searchsorted(boundaries, ends, side="right") - 1
+    ends_on_boundary = (latest >= 0) & (
+        ends - boundaries[np.maximum(latest, 0)] <= 1e-9
+    )
+    anchor_times = np.where(ends_on_boundary & (starts < ends), ends - 1e-9, ends)
+    slide_indexes = np.searchsorted(boundaries, anchor_times, side="right") - 1
+    slide_indexes = np.clip(slide_indexes, 0, len(boundaries) - 1)
+    return np.where(ends <= 0, 0, slide_indexes)
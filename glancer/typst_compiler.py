@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import atexit
+import functools
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# "bindings" compiles in-process through the typst package, "subprocess" runs
+# the typst CLI and "auto" uses the bindings when they're installed
+TYPST_BACKENDS = ("auto", "bindings", "subprocess")
+DEFAULT_TYPST_WORKERS = 2
+MAIN_FILE_NAME = "main.typ"
+
+
+class TypstCompiler:
+    """Compiles Typst documents, at most ``workers`` at once.
+
+    Each worker owns a build directory with a fixed main file, inside a
+    directory of this compiler's own (created under ``directory`` when
+    given), so processes sharing a cache never build in each other's
+    directories. With the bindings, a worker keeps one in-process compiler bound to
+    that file, so fonts and packages are loaded once per worker rather than
+    once per document. The typst CLI has to rescan them every time.
+    Documents are built in whichever directory is free; images hard-linked
+    into it should come from the same filesystem as ``directory``.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        backend: str = "auto",
+        directory: Path | None = None,
+    ) -> None:
+        if backend not in TYPST_BACKENDS:
+            raise ValueError(
+                f"unknown Typst backend {backend!r}, expected one of "
+                f"{', '.join(TYPST_BACKENDS)}"
+            )
+        self.workers = max(workers or DEFAULT_TYPST_WORKERS, 1)
+        self.backend = backend
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+        self.directory = Path(tempfile.mkdtemp(prefix="glancer-typst-", dir=directory))
+        self._builds: queue.LifoQueue[TypstBuild] = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def build(self) -> Iterator[TypstBuild]:
+        """An empty build directory, waiting while every worker is busy."""
+        build = self._take()
+        try:
+            build.clear()
+            yield build
+        finally:
+            self._builds.put(build)
+
+    def close(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self) -> TypstCompiler:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _take(self) -> TypstBuild:
+        with self._lock:
+            if self._builds.empty() and self._created < self.workers:
+                path = self.directory / f"build{self._created}"
+                build = TypstBuild(path, self._bindings())
+                self._created += 1
+                return build
+        return self._builds.get()
+
+    def _bindings(self) -> Any | None:
+        """The typst module, or None to run the typst CLI."""
+        if self.backend == "subprocess":
+            return None
+        try:
+            import typst  # type: ignore[import-not-found]
+        except ImportError:
+            if self.backend == "bindings":
+                raise
+            logger.debug("typst bindings not installed, running the typst CLI")
+            return None
+        return typst
+
+
+class TypstBuild:
+    """One worker's build directory and, with the bindings, its warm compiler."""
+
+    def __init__(self, path: Path, bindings: Any | None = None) -> None:
+        self.path = path
+        self.main_file = path / MAIN_FILE_NAME
+        self._bindings = bindings
+        self._compiler: Any | None = None
+        path.mkdir(parents=True, exist_ok=True)
+
+    def clear(self) -> None:
+        """Delete the previous document's files."""
+        for entry in os.scandir(self.path):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+
+    def compile(self, content: str | Iterable[str], output_path: Path) -> None:
+        """Write ``content`` as the main file and compile it to ``output_path``.
+
+        ``content`` can be the document's chunks, streamed to the file as
+        they're produced.
+        """
+        chunks = [content] if isinstance(content, str) else content
+        with self.main_file.open("w", encoding="utf-8") as handle:
+            handle.writelines(chunks)
+        if self._bindings is None:
+            subprocess.run(
+                [
+                    "typst",
+                    "compile",
+                    "--root",
+                    str(self.path),
+                    str(self.main_file),
+                    str(output_path),
+                ],
+                check=True,
+            )
+            return
+        compiler = self._compiler
+        if compiler is None:
+            # Searches fonts once; later compiles only re-read the sources
+            compiler = self._compiler = self._bindings.Compiler(
+                str(self.main_file), root=str(self.path)
+            )
+        compiler.compile(output=str(output_path))
+
+
+@functools.lru_cache(maxsize=None)
+def default_compiler() -> TypstCompiler:
+    """The process-wide compiler for PDFs built without one of their own."""
+    compiler = TypstCompiler()
+    atexit.register(compiler.close)
+    return compiler
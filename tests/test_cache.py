@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from pathlib import Path
+
+from glancer.cache import MANIFEST_NAME, VideoCache
+
+
+def _fill(cache: VideoCache, video_id: str, size: int) -> None:
+    with cache.open(video_id) as entry:
+        (entry.path / f"{video_id}.mp4").write_bytes(b"v" * size)
+
+
+def test_manifest_records_artifact_sizes(tmp_path: Path) -> None:
+    cache = VideoCache(tmp_path)
+    with cache.open("abc") as entry:
+        (entry.path / "abc.mp4").write_bytes(b"v" * 100)
+        (entry.path / "abc.en.srt").write_bytes(b"c" * 10)
+        (entry.path / "pdf-stills").mkdir()
+        (entry.path / "pdf-stills" / "still.jpg").write_bytes(b"s" * 5)
+
+    manifest = json.loads((tmp_path / MANIFEST_NAME).read_text())
+    assert manifest["abc"]["artifacts"] == {
+        "abc.mp4": 100,
+        "abc.en.srt": 10,
+        "pdf-stills": 5,
+    }
+    assert manifest["abc"]["size"] == 115
+    assert cache.total_size() == 115
+
+
+def test_least_recently_used_videos_are_evicted(tmp_path: Path) -> None:
+    cache = VideoCache(tmp_path, max_bytes=250)
+    _fill(cache, "first", 100)
+    _fill(cache, "second", 100)
+    # Using "first" again makes "second" the least recently used
+    cache.open("first").close()
+
+    _fill(cache, "third", 100)
+
+    assert (tmp_path / "first").exists()
+    assert not (tmp_path / "second").exists()
+    assert (tmp_path / "third").exists()
+    assert cache.total_size() == 200
+
+
+def test_entries_in_use_are_not_evicted(tmp_path: Path) -> None:
+    cache = VideoCache(tmp_path, max_bytes=150)
+    _fill(cache, "old", 100)
+    in_use = cache.open("old")
+
+    _fill(cache, "new", 100)
+
+    assert (tmp_path / "old" / "old.mp4").exists()
+    assert not (tmp_path / "new").exists()
+    in_use.close()
+
+
+def test_same_video_is_used_by_one_run_at_a_time(tmp_path: Path) -> None:
+    cache = VideoCache(tmp_path)
+    first = cache.open("abc")
+    opened = threading.Event()
+
+    def second_run() -> None:
+        with cache.open("abc"):
+            opened.set()
+
+    thread = threading.Thread(target=second_run)
+    thread.start()
+    time.sleep(0.05)
+    assert not opened.is_set()
+    first.close()
+    thread.join(timeout=5)
+    assert opened.is_set()
+
+
+def test_directories_from_older_versions_are_evicted_first(tmp_path: Path) -> None:
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "legacy.mp4").write_bytes(b"v" * 100)
+    cache = VideoCache(tmp_path, max_bytes=150)
+
+    _fill(cache, "new", 100)
+
+    assert not legacy.exists()
+    assert (tmp_path / "new" / "new.mp4").exists()
+
+
+def test_remove_deletes_the_entry(tmp_path: Path) -> None:
+    cache = VideoCache(tmp_path)
+    entry = cache.open("abc")
+    (entry.path / "abc.mp4").write_bytes(b"v")
+
+    entry.remove()
+
+    assert not entry.path.exists()
+    assert cache.total_size() == 0
@@ -10,6 +10,7 @@ from glancer.slides import (
     captions_to_html,
     normalize_caption_text,
 )
+from glancer.frames import Frame, FrameStore
 from glancer.parser import Caption
 from glancer.process import Video
 
@@ -60,6 +61,18 @@ def test_captions_to_html(
     assert "slide-block" in html
 
 
+def test_shot_times_carry_through_to_video_links(
+    sample_captions: list[Caption], tmp_path: Path
+) -> None:
+    create_test_image(tmp_path / "glancer-img0000.jpg")
+    data = (tmp_path / "glancer-img0000.jpg").read_bytes()
+    frames = FrameStore([Frame(index=0, data=data, timestamp=2.5)])
+    slides = generate_slides(sample_captions, frames)
+    assert slides[0].timestamp == 2
+    rendered_html = render_slides(slides, "http://example.com", frames)
+    assert "&t=2s" in rendered_html
+
+
 def test_missing_image_returns_empty(tmp_path: Path) -> None:
     from glancer.slides import slide_block
     result = slide_block("http://example.com", tmp_path, 99, False)
@@ -306,3 +319,212 @@ def test_boundary_crossing_cues_move_to_later_slide_from_real_srt_pattern() -> N
         "the relevant chapters.",
         "final slide anchor",
     ]
+
+
+def test_overlapping_word_count_matches_exhaustive_search() -> None:
+    import random
+
+    from glancer.slides import overlapping_word_count
+
+    def exhaustive(existing: list[str], following: list[str]) -> int:
+        for overlap in range(min(len(existing), len(following)), 4, -1):
+            if existing[-overlap:] == following[:overlap]:
+                return overlap
+        return 0
+
+    rng = random.Random(0)
+    for _ in range(2000):
+        existing = [rng.choice("ab") for _ in range(rng.randrange(20))]
+        following = [rng.choice("ab") for _ in range(rng.randrange(20))]
+        assert overlapping_word_count(existing, following) == exhaustive(
+            existing, following
+        )
+
+
+def test_combine_caption_texts_merges_accumulating_cues() -> None:
+    texts = [" ".join(["[Music]"] * count + ["next"]) for count in range(1, 8)]
+    assert combine_caption_texts(texts) == " ".join(texts)
+    assert combine_caption_texts(["one two three four five six", "\n", ""]) == (
+        "one two three four five six"
+    )
+
+
+def test_slides_follow_shot_times_when_stills_are_off_the_grid() -> None:
+    from glancer.slides import captions_per_slide
+
+    captions = [
+        Caption(start=20.0, end=27.0, text="before the keyframe"),
+        Caption(start=27.0, end=33.0, text="after the keyframe"),
+        Caption(start=58.0, end=61.0, text="final slide anchor"),
+    ]
+
+    on_grid = captions_per_slide(captions)
+    # The second still came from a keyframe at 25s rather than at 30s
+    on_keyframes = captions_per_slide(captions, {0: 3.0, 1: 25.0})
+
+    assert [cap.text for cap in on_grid[0]] == ["before the keyframe"]
+    assert [cap.text for cap in on_keyframes[0]] == []
+    assert [cap.text for cap in on_keyframes[1]] == [
+        "before the keyframe",
+        "after the keyframe",
+        "final slide anchor",
+    ]
+
+
+def test_keyframe_slides_match_bucketing_by_assigned_slide() -> None:
+    import random
+
+    import numpy as np
+
+    from glancer.parser import CaptionStore
+    from glancer.slides import (
+        assigned_slide_indexes,
+        captions_per_slide,
+        clean_captions,
+        shot_boundaries,
+    )
+
+    rng = random.Random(0)
+    captions = []
+    for index in range(400):
+        start = rng.choice([rng.uniform(-5, 900), 30.0 * rng.randrange(30)])
+        end = start + rng.choice([0.0, rng.uniform(0.5, 8), rng.uniform(30, 90)])
+        captions.append(Caption(start, end, f"caption {index}"))
+    captions.sort(key=lambda caption: caption.end)
+    shot_times = {shot: shot * 30 + rng.uniform(-6, 6) for shot in range(1, 40)}
+    shot_times[7] = shot_times[6]
+
+    slides = captions_per_slide(captions, shot_times)
+
+    cleaned = clean_captions(CaptionStore.from_captions(captions))
+    boundaries = shot_boundaries(len(slides), shot_times)
+    slide_indexes = assigned_slide_indexes(cleaned, boundaries)
+    expected = [
+        cleaned.take(np.flatnonzero(slide_indexes == slide))
+        for slide in range(len(slides))
+    ]
+    assert slides == expected
+
+
+def test_write_html_streams_the_same_document(
+    sample_captions: list[Caption], sample_video: Video, tmp_path: Path
+) -> None:
+    from glancer.slides import write_html
+
+    for i in range(2):
+        create_test_image(tmp_path / f"glancer-img{i:04d}.jpg")
+    output_path = tmp_path / "out.html"
+
+    write_html(sample_video, tmp_path, sample_captions, output_path)
+
+    assert output_path.read_text(encoding="utf-8") == captions_to_html(
+        sample_video, tmp_path, sample_captions
+    )
+    assert not list(tmp_path.glob(".out.html.*"))
+
+
+def test_failed_render_keeps_previous_output(tmp_path: Path) -> None:
+    from glancer.html_builder import write_atomically
+
+    output_path = tmp_path / "out.html"
+    output_path.write_text("previous")
+
+    def chunks():
+        yield "<html>"
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        write_atomically(chunks(), output_path)
+
+    assert output_path.read_text() == "previous"
+    assert list(tmp_path.iterdir()) == [output_path]
+
+
+def test_external_assets_are_content_addressed_and_shared(
+    sample_video: Video, tmp_path: Path
+) -> None:
+    from glancer.slides import write_html
+
+    create_test_image(tmp_path / "glancer-img0000.jpg", (200, 50, 50))
+    # Same slide again with a few pixels changed: a duplicate, different bytes
+    image = Image.new("RGB", (640, 480), (200, 50, 50))
+    image.putpixel((5, 5), (0, 0, 0))
+    image.save(tmp_path / "glancer-img0001.jpg")
+    captions = [
+        Caption(start=0.0, end=20.0, text="first"),
+        Caption(start=30.0, end=50.0, text="second"),
+        Caption(start=58.0, end=61.0, text="anchor"),
+    ]
+    output_path = tmp_path / "site" / "talk.html"
+    output_path.parent.mkdir()
+
+    write_html(sample_video, tmp_path, captions, output_path, external_assets=True)
+    write_html(
+        sample_video,
+        tmp_path,
+        captions,
+        output_path.with_name("again.html"),
+        external_assets=True,
+    )
+
+    document = output_path.read_text(encoding="utf-8")
+    assets = list((output_path.parent / "assets").iterdir())
+    assert "data:image" not in document
+    assert len(assets) == 1
+    assert document.count(f"<img loading='lazy' src='assets/{assets[0].name}'/>") == 2
+
+
+def test_html_embeds_reencoded_stills(
+    sample_captions: list[Caption], sample_video: Video, tmp_path: Path
+) -> None:
+    from glancer.output_images import ImageOptions
+    from glancer.slides import write_html
+
+    for i in range(2):
+        create_test_image(tmp_path / f"glancer-img{i:04d}.jpg")
+    output_path = tmp_path / "talk.html"
+
+    write_html(
+        sample_video,
+        tmp_path,
+        sample_captions,
+        output_path,
+        images=ImageOptions(width=320, quality=50),
+    )
+
+    document = output_path.read_text(encoding="utf-8")
+    assert "data:image/jpeg;base64" in document
+    assert len(document) < len(captions_to_html(sample_video, tmp_path, sample_captions))
+
+
+def test_render_outputs_shares_slides_between_formats(
+    sample_captions: list[Caption], sample_video: Video, tmp_path: Path
+) -> None:
+    from unittest.mock import patch
+
+    from glancer.outputs import render_outputs
+    from glancer.slides import write_html
+
+    for i in range(2):
+        create_test_image(tmp_path / f"glancer-img{i:04d}.jpg")
+    outputs = {
+        "html": tmp_path / "talk.html",
+        "pdf": tmp_path / "talk.pdf",
+        "pdf-slide": tmp_path / "talk.slides.pdf",
+    }
+
+    with patch(
+        "glancer.slides.generate_slides", wraps=generate_slides
+    ) as slides, patch("glancer.pdf_builder.convert_to_pdf") as convert_to_pdf:
+        render_outputs(sample_video, tmp_path, sample_captions, outputs)
+
+    slides.assert_called_once()
+    pdfs = {call.args[3]: call.kwargs for call in convert_to_pdf.call_args_list}
+    assert set(pdfs) == {outputs["pdf"], outputs["pdf-slide"]}
+    assert pdfs[outputs["pdf-slide"]]["slide_mode"]
+    assert not pdfs[outputs["pdf"]]["slide_mode"]
+    assert pdfs[outputs["pdf"]]["slides"] is pdfs[outputs["pdf-slide"]]["slides"]
+    write_html(sample_video, tmp_path, sample_captions, tmp_path / "alone.html")
+    assert outputs["html"].read_text(encoding="utf-8") == (
+        tmp_path / "alone.html"
+    ).read_text(encoding="utf-8")
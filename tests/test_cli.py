@@ -1,45 +1,60 @@
 from __future__ import annotations
 
+import subprocess
+import sys
 from unittest.mock import MagicMock, patch
 from pathlib import Path
 import pytest
+from glancer.cache import VideoCache
 from glancer.cli import main
-from glancer.process import Video
+from glancer.frames import FrameStore
+from glancer.output_images import ImageOptions
+from glancer.process import DownloadProfile, Video
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path: Path):
+    with patch("glancer.cache.default_cache_root") as mock:
+        mock.return_value = tmp_path / "cache"
+        yield mock
 
 
 @pytest.fixture
 def mock_process_video(tmp_path: Path):
     with patch("glancer.cli.process_video") as mock:
-        video_dir = tmp_path / "glancer" / "video_id"
-        video_dir.mkdir(parents=True, exist_ok=True)
-        captions_path = video_dir / "video_id.en.srt"
+        entry = VideoCache(tmp_path / "glancer").open("video_id")
+        captions_path = entry.path / "video_id.en.srt"
         captions_path.touch()
         mock.return_value = (
-            video_dir,
+            entry,
             Video(url="http://example.com", title="Test Video", video_id="video_id"),
             captions_path,
+            FrameStore(),
         )
         yield mock
 
 
 @pytest.fixture
-def mock_parse_srt():
-    with patch("glancer.cli.parse_srt") as mock:
+def mock_load_captions():
+    with patch("glancer.parser.load_captions") as mock:
         mock.return_value = []
         yield mock
 
 
 @pytest.fixture
-def mock_convert_to_html():
-    with patch("glancer.cli.convert_to_html") as mock:
-        mock.return_value = "<html></html>"
+def mock_render_outputs():
+    def render(video, frames, captions, outputs, *args, **kwargs) -> None:
+        for path in outputs.values():
+            path.write_text("<html></html>")
+
+    with patch("glancer.outputs.render_outputs", side_effect=render) as mock:
         yield mock
 
 
 def test_main(
     mock_process_video: MagicMock,
-    mock_parse_srt: MagicMock,
-    mock_convert_to_html: MagicMock,
+    mock_load_captions: MagicMock,
+    mock_render_outputs: MagicMock,
     tmp_path: Path,
 ):
     output_path = tmp_path / "output.html"
@@ -50,11 +65,32 @@ def test_main(
         ]
     )
     mock_process_video.assert_called_once()
-    mock_parse_srt.assert_called_once()
-    mock_convert_to_html.assert_called_once()
+    mock_load_captions.assert_called_once()
+    mock_render_outputs.assert_called_once()
     assert output_path.exists()
     assert output_path.read_text() == "<html></html>"
 
+
+@pytest.mark.parametrize(
+    "flags, opened",
+    [
+        ([], True),
+        (["--no-detect-duplicates"], False),
+        (["--no-detect-duplicates", "--skip-seen-slides"], True),
+    ],
+)
+def test_hash_store_is_only_created_when_used(
+    mock_process_video: MagicMock,
+    mock_load_captions: MagicMock,
+    mock_render_outputs: MagicMock,
+    tmp_path: Path,
+    flags: list[str],
+    opened: bool,
+) -> None:
+    main(["http://example.com/video", str(tmp_path / "talk.html"), *flags])
+    assert (tmp_path / "cache" / "hashes.sqlite").exists() == opened
+
+
 def test_main_playlist(tmp_path: Path) -> None:
     with patch("glancer.cli.run") as mock_run:
         main(["--auto-cleanup", "http://playlist.test", str(tmp_path)])
@@ -67,4 +103,124 @@ def test_main_playlist(tmp_path: Path) -> None:
         output_pdf=False,
         compact=False,
         slide_mode=False,
+        extraction="decode",
+        hash_workers=None,
+        skip_seen_slides=False,
+        external_assets=False,
+        images=ImageOptions(),
+        stage_workers={},
+        playlist_items=None,
+        cache_dir=None,
+        cache_size=None,
+        outputs=["html"],
+        typst_backend="auto",
+        typst_workers=None,
+        download_profile=DownloadProfile(),
     )
+
+
+def test_hash_and_image_workers_are_separate(tmp_path: Path) -> None:
+    with patch("glancer.cli.run") as mock_run:
+        main(["--hash-workers", "3", "http://video.test", str(tmp_path)])
+        main(["--image-workers", "2", "http://video.test", str(tmp_path)])
+    hashing, encoding = (call.kwargs for call in mock_run.call_args_list)
+    assert hashing["hash_workers"] == 3
+    assert hashing["images"].workers is None
+    assert encoding["hash_workers"] is None
+    assert encoding["images"].workers == 2
+
+
+def test_main_renders_every_output_once(
+    mock_process_video: MagicMock,
+    mock_load_captions: MagicMock,
+    mock_render_outputs: MagicMock,
+    tmp_path: Path,
+) -> None:
+    main(
+        [
+            "http://example.com/video",
+            str(tmp_path / "talk.html"),
+            "--output",
+            "html",
+            "--output",
+            "pdf-compact",
+            "--pdf",
+            "--slide-experimental",
+        ]
+    )
+    mock_process_video.assert_called_once()
+    mock_render_outputs.assert_called_once()
+    assert mock_render_outputs.call_args.args[3] == {
+        "html": tmp_path / "talk.html",
+        "pdf-compact": tmp_path / "talk.compact.pdf",
+        "pdf-slide": tmp_path / "talk.slides.pdf",
+    }
+
+
+def test_import_skips_heavy_dependencies() -> None:
+    check = (
+        "import sys, glancer.cli; "
+        "print(' '.join(m for m in ('numpy', 'PIL', 'jinja2') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.split() == []
+
+
+def test_template_is_compiled_once() -> None:
+    from glancer.html_builder import _template
+
+    assert _template() is _template()
+
+
+def test_playlist_pipeline_renders_every_video_in_order(
+    mock_load_captions: MagicMock,
+    mock_render_outputs: MagicMock,
+    tmp_path: Path,
+) -> None:
+    from glancer.cli import run
+
+    captions_path = tmp_path / "captions.srt"
+    captions_path.touch()
+    # The first entry has no title, so only it needs a metadata call
+    entries = [
+        Video(f"http://example.com/watch?v=v{index}", title, f"v{index}")
+        for index, title in enumerate(["", "Title v1", "Title v2"])
+    ]
+
+    def metadata(url: str) -> Video:
+        video_id = url.rsplit("=", 1)[1]
+        return Video(url=url, title=f"Title {video_id}", video_id=video_id)
+
+    with patch("glancer.cli.Playlist") as playlist, patch(
+        "glancer.cli.get_video_metadata", side_effect=metadata
+    ) as get_metadata, patch(
+        "glancer.cli.download_for_extraction", return_value=(captions_path, None)
+    ), patch("glancer.cli.generate_stills", return_value=FrameStore()):
+        playlist.is_playlist.return_value = True
+        playlist.return_value = iter(entries)
+        run(
+            "http://example.com/playlist?list=x",
+            str(tmp_path),
+            verbose=False,
+            auto_cleanup=False,
+            detect_duplicates=True,
+            output_pdf=False,
+            compact=False,
+            slide_mode=False,
+            skip_seen_slides=True,
+            stage_workers={"metadata": 3, "download": 3, "render": 4},
+            cache_dir=str(tmp_path / "cache"),
+        )
+
+    get_metadata.assert_called_once_with(entries[0].url)
+    rendered = [call.args[0].video_id for call in mock_render_outputs.call_args_list]
+    seen = [call.args[6].seen_video_ids for call in mock_render_outputs.call_args_list]
+    assert rendered == ["v0", "v1", "v2"]
+    assert seen == [(), ("v0",), ("v0", "v1")]
+    assert sorted(path.name for path in tmp_path.glob("*.html")) == [
+        "Title v0.html",
+        "Title v1.html",
+        "Title v2.html",
+    ]
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from glancer.frames import Frame, FrameStore, split_jpegs
+
+
+def _jpeg(color: tuple[int, int, int]) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), color=color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_split_jpegs_recovers_concatenated_images() -> None:
+    images = [_jpeg((255, 0, 0)), _jpeg((0, 255, 0)), _jpeg((0, 0, 255))]
+
+    assert split_jpegs(b"".join(images)) == images
+
+
+def test_split_jpegs_drops_truncated_tail() -> None:
+    first, second = _jpeg((10, 10, 10)), _jpeg((200, 200, 200))
+
+    assert split_jpegs(first + second[:-10]) == [first]
+
+
+def test_frame_store_loads_stills_from_a_directory(tmp_path: Path) -> None:
+    (tmp_path / "glancer-img0003.jpg").write_bytes(b"three")
+    (tmp_path / "glancer-img0001.jpg").write_bytes(b"one")
+
+    loaded = FrameStore.from_directory(tmp_path)
+
+    assert loaded.indexes() == [1, 3]
+    third = loaded.get(3)
+    assert third is not None
+    assert third.data == b"three"
+    assert 2 not in loaded
+
+
+def test_frame_store_round_trips_through_a_pack(tmp_path: Path) -> None:
+    store = FrameStore(
+        [
+            Frame(0, _jpeg((1, 2, 3)), b"t" * 72, (9, 8), 3.0),
+            Frame(1, _jpeg((4, 5, 6))),
+        ]
+    )
+    store.write_pack(tmp_path / "stills.pack")
+
+    loaded = FrameStore.read_pack(tmp_path / "stills.pack")
+
+    assert list(loaded) == list(store)
+    assert [path.name for path in tmp_path.iterdir()] == ["stills.pack"]
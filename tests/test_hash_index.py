@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from glancer.hash_index import HASH_INDEXES, make_hash_index
+from glancer.image_similarity import ShotSimilarityConfig, _first_occurrences
+
+
+def _clustered_hashes(count: int, words: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(0, 2**64, size=(count // 4 + 1, words), dtype=np.uint64)
+    hashes = centers[rng.integers(0, len(centers), size=count)]
+    # Flip a few random bits so some hashes land inside the threshold, some not
+    for row in hashes:
+        for _ in range(rng.integers(0, 8)):
+            bit = int(rng.integers(0, words * 64))
+            row[bit // 64] ^= np.uint64(1 << (bit % 64))
+    return hashes
+
+
+def _brute_force(hashes: np.ndarray, threshold: int) -> dict[int, int]:
+    duplicates: dict[int, int] = {}
+    unique: list[tuple[int, int]] = []
+    for index, row in enumerate(hashes):
+        value = int.from_bytes(row.astype("<u8").tobytes(), "little")
+        originals = [
+            original
+            for original, other in unique
+            if (value ^ other).bit_count() <= threshold
+        ]
+        if originals:
+            duplicates[index] = originals[0]
+        else:
+            unique.append((index, value))
+    return duplicates
+
+
+@pytest.mark.parametrize("index", sorted(HASH_INDEXES))
+@pytest.mark.parametrize("words,threshold", [(1, 0), (1, 5), (1, 12), (4, 20)])
+def test_indexes_match_linear_threshold_semantics(
+    index: str, words: int, threshold: int
+) -> None:
+    hashes = _clustered_hashes(400, words)
+    cfg = ShotSimilarityConfig(threshold=threshold, index=index)
+
+    duplicates = _first_occurrences(range(len(hashes)), hashes, cfg)
+
+    assert duplicates == _brute_force(hashes, threshold)
+
+
+def test_unknown_index_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        make_hash_index("lsh", threshold=5, words=1)
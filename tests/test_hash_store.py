@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from glancer.frames import Frame, FrameStore
+from glancer.hash_store import HashCache, HashStore
+from glancer.image_similarity import find_frames_seen_elsewhere, find_similar_frames
+from glancer.parser import Caption
+from glancer.slides import generate_slides, render_slides
+
+RAMP = bytes(range(0, 72 * 3, 3))
+FLIPPED = RAMP[::-1]
+STRIPES = bytes((0 if (i // 3) % 2 else 200) for i in range(72))
+
+
+def _frames(thumbnails: list[bytes]) -> FrameStore:
+    return FrameStore(
+        Frame(index, b"not a jpeg", thumbnail, (9, 8))
+        for index, thumbnail in enumerate(thumbnails)
+    )
+
+
+def test_hash_store_round_trips(tmp_path: Path) -> None:
+    store = HashStore(tmp_path / "hashes.sqlite")
+    hashes = np.array([[1], [2**63 + 5]], dtype=np.uint64)
+    store.save("video", "decode", 8, [0, 3], hashes)
+
+    shots, loaded = store.load("video", "decode", 8)
+
+    assert shots == [0, 3]
+    assert np.array_equal(loaded, hashes)
+    assert store.load("video", "keyframe", 8)[0] == []
+
+
+def test_hash_store_is_shared_by_render_workers(tmp_path: Path) -> None:
+    store = HashStore(tmp_path / "hashes.sqlite")
+    hashes = np.arange(64, dtype=np.uint64).reshape(64, 1)
+
+    def render(worker: int) -> None:
+        for offset in range(25):
+            video_id = f"video{worker}"
+            store.save(video_id, "decode", 8, list(range(64)), hashes + offset)
+            shots, loaded = store.load(video_id, "decode", 8)
+            assert shots == list(range(64))
+            assert np.array_equal(loaded, hashes + offset)
+            store.load_videos([f"video{other}" for other in range(4)], "decode", 8)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(render, range(4)))
+
+
+def test_rerun_reuses_persisted_hashes(tmp_path: Path) -> None:
+    store = HashStore(tmp_path / "hashes.sqlite")
+    cache = HashCache(store, "video", "decode")
+    assert find_similar_frames(_frames([RAMP, FLIPPED, RAMP]), cache=cache) == {2}
+
+    # Without thumbnails these frames could not be hashed at all
+    undecodable = FrameStore(Frame(index, b"not a jpeg") for index in range(3))
+    assert find_similar_frames(undecodable, cache=cache) == {2}
+
+
+def test_hashes_of_other_stills_are_recomputed(tmp_path: Path) -> None:
+    store = HashStore(tmp_path / "hashes.sqlite")
+    old = HashCache(store, "video", "decode", stills="old-download")
+    assert find_similar_frames(_frames([RAMP, FLIPPED, RAMP]), cache=old) == {2}
+
+    # Re-extracted from another download: the old hashes would say {2}
+    new = HashCache(store, "video", "decode", stills="new-download")
+    assert find_similar_frames(_frames([RAMP, FLIPPED, STRIPES]), cache=new) == set()
+    assert store.load("video", "decode", 8, "old-download")[0] == []
+
+
+def test_hashes_without_stills_keys_are_dropped(tmp_path: Path) -> None:
+    path = tmp_path / "hashes.sqlite"
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE shot_hashes (video_id TEXT, variant TEXT, "
+            "hash_size INTEGER, shot INTEGER, hash BLOB)"
+        )
+        connection.execute(
+            "INSERT INTO shot_hashes VALUES ('video', 'decode', 8, 0, x'00')"
+        )
+    connection.close()
+
+    store = HashStore(path)
+    assert store.load("video", "decode", 8)[0] == []
+    store.save("video", "decode", 8, [0], np.array([[1]], dtype=np.uint64), "key")
+    assert store.load("video", "decode", 8, "key")[0] == [0]
+
+
+def test_slides_seen_in_earlier_playlist_videos_are_not_embedded(
+    tmp_path: Path,
+) -> None:
+    store = HashStore(tmp_path / "hashes.sqlite")
+    first = HashCache(store, "first", "decode")
+    second = HashCache(store, "second", "decode", seen_video_ids=("first",))
+
+    assert find_frames_seen_elsewhere(_frames([RAMP, STRIPES]), first) == set()
+
+    frames = _frames([FLIPPED, STRIPES])
+    captions = [
+        Caption(start=0.0, end=20.0, text="intro"),
+        Caption(start=40.0, end=61.0, text="talk"),
+    ]
+    slides = generate_slides(captions, frames, hash_cache=second)
+
+    assert [slide.seen_elsewhere for slide in slides] == [False, True]
+    html = render_slides(slides, "http://example.com", frames)
+    assert html.count("data:image/jpeg") == 1
+    assert "seen-note" in html
@@ -2,9 +2,18 @@ from __future__ import annotations
 
 from pathlib import Path
 
+import numpy as np
 from PIL import Image, ImageDraw
 
-from glancer.image_similarity import ShotSimilarityConfig, find_similar_shots
+from glancer.frames import Frame, FrameStore
+from glancer.hash_index import hamming_distances
+from glancer.image_similarity import (
+    ShotSimilarityConfig,
+    dhash_images,
+    find_similar_frames,
+    find_similar_shots,
+    match_similar_frames,
+)
 
 
 def _write_image(
@@ -69,3 +78,60 @@ def test_find_similar_shots_detects_near_duplicates(tmp_path) -> None:
 
     assert 1 in duplicates
     assert 2 not in duplicates
+
+
+def test_find_similar_frames_hashes_thumbnails_without_decoding() -> None:
+    ramp = bytes(range(0, 72 * 3, 3))
+    flipped = ramp[::-1]
+    frames = FrameStore(
+        Frame(index, b"not a jpeg", thumbnail, (9, 8))
+        for index, thumbnail in enumerate([ramp, flipped, ramp])
+    )
+
+    assert find_similar_frames(frames) == {2}
+
+
+def test_dhash_images_packs_one_uint64_per_image(tmp_path) -> None:
+    first = tmp_path / "first.jpg"
+    second = tmp_path / "second.jpg"
+    _write_image(first, (200, 200, 200), variant="horizontal")
+    _write_image(second, (120, 80, 200), variant="diagonal")
+
+    hashes = dhash_images([first, second.read_bytes(), first])
+
+    assert hashes.shape == (3, 1)
+    assert hashes.dtype == np.uint64
+    distances = hamming_distances(hashes, hashes[0])
+    assert distances[0] == distances[2] == 0
+    assert distances[1] > 0
+
+
+def test_parallel_hashing_matches_sequential(tmp_path) -> None:
+    variants = ["horizontal", "vertical", "diagonal", None]
+    for index in range(100):
+        color = (40 * (index % 5), 90, 200 - 30 * (index % 4))
+        _write_image(
+            tmp_path / f"glancer-img{index:04d}.jpg", color, variants[index % 4]
+        )
+    (tmp_path / "glancer-img0100.jpg").write_bytes(b"corrupt")
+    paths = list(tmp_path.glob("glancer-img*.jpg"))
+
+    sequential = find_similar_shots(paths, ShotSimilarityConfig(workers=1))
+    parallel = find_similar_shots(paths, ShotSimilarityConfig(workers=4))
+
+    assert sequential
+    assert parallel == sequential
+
+
+def test_match_similar_frames_points_duplicates_at_their_original(tmp_path) -> None:
+    variants = ["horizontal", "diagonal", "horizontal", "diagonal", "vertical"]
+    frames = FrameStore()
+    for index, variant in enumerate(variants):
+        path = tmp_path / f"glancer-img{index:04d}.jpg"
+        _write_image(path, (200, 200, 200), variant=variant)
+        frames.add(Frame(index=index, data=path.read_bytes()))
+
+    originals = match_similar_frames(frames)
+
+    assert originals == {2: 0, 3: 1}
+    assert set(originals) == find_similar_frames(frames)
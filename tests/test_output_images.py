@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from glancer.frames import Frame, FrameStore
+from glancer.output_images import ImageOptions, prepare_frames, supported_codecs
+
+
+def _noisy_jpeg(seed: int, size: tuple[int, int] = (320, 180)) -> bytes:
+    # Noise keeps the encoded size sensitive to quality
+    rng = random.Random(seed)
+    image = Image.frombytes(
+        "RGB", size, bytes(rng.getrandbits(8) for _ in range(size[0] * size[1] * 3))
+    )
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=95)
+    return output.getvalue()
+
+
+def _total_size(frames: FrameStore, shots: list[int]) -> int:
+    total = 0
+    for shot in shots:
+        frame = frames.get(shot)
+        assert frame is not None
+        total += len(frame.data)
+    return total
+
+
+@pytest.fixture
+def frames() -> FrameStore:
+    return FrameStore(
+        Frame(index=index, data=_noisy_jpeg(index), timestamp=index * 30.0)
+        for index in range(4)
+    )
+
+
+def test_default_options_keep_stills_untouched(frames: FrameStore) -> None:
+    assert prepare_frames(frames) is frames
+
+
+def test_stills_are_downscaled_and_reencoded(frames: FrameStore) -> None:
+    if "webp" not in supported_codecs():
+        pytest.skip("Pillow without WebP support")
+
+    prepared = prepare_frames(frames, ImageOptions(codec="webp", width=160))
+
+    for original, frame in zip(frames, prepared):
+        assert frame.media_type == "image/webp"
+        assert frame.suffix == ".webp"
+        assert frame.timestamp == original.timestamp
+        with Image.open(io.BytesIO(frame.data)) as image:
+            assert image.format == "WEBP"
+            assert image.size == (160, 90)
+
+
+def test_byte_budget_picks_a_quality_that_fits(frames: FrameStore) -> None:
+    unconstrained = prepare_frames(frames, ImageOptions(quality=90), shots=[1, 2])
+    full_size = _total_size(unconstrained, [1, 2])
+
+    prepared = prepare_frames(
+        frames, ImageOptions(byte_budget=full_size // 2, quality=90), shots=[1, 2]
+    )
+
+    assert _total_size(prepared, [1, 2]) <= full_size // 2
+    # Stills outside the document are neither re-encoded nor counted
+    assert prepared.get(0) == frames.get(0)
+    assert prepared.get(3) == frames.get(3)
+
+
+def test_unknown_codec_is_rejected(frames: FrameStore) -> None:
+    with pytest.raises(ValueError, match="unknown image codec"):
+        prepare_frames(frames, ImageOptions(codec="gif"))
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import textwrap
 
+import pytest
+
 from glancer.parser import parse_srt
 from glancer.slides import (
     captions_per_slide,
@@ -109,3 +111,158 @@ def test_boundary_crossing_caption_moves_to_later_slide() -> None:
     assert EXPECTED_FIRST_SLIDE_TEXT in first_slide_combined
     assert EXPECTED_SECOND_SLIDE_PREFIX in second_slide_combined
     assert EXPECTED_SECOND_SLIDE_PREFIX not in first_slide_combined
+
+
+def test_parse_srt_reads_files_and_mmaps(tmp_path) -> None:
+    import mmap
+
+    path = tmp_path / "captions.srt"
+    path.write_bytes(SAMPLE_SRT.replace("\n", "\r\n").encode("utf-8"))
+    expected = parse_srt(SAMPLE_SRT)
+
+    with path.open("rb") as handle:
+        assert parse_srt(handle) == expected
+    with path.open(encoding="utf-8") as handle:
+        assert parse_srt(handle) == expected
+    with path.open("rb") as handle, mmap.mmap(
+        handle.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped:
+        assert parse_srt(mapped) == expected
+
+
+def test_parse_srt_keeps_blank_lines_inside_captions() -> None:
+    contents = textwrap.dedent(
+        """\
+        1
+        00:00:01,000 --> 00:00:02,500
+        first
+
+        still first
+        2
+        00:00:02.5 --> 00:00:04,000 X1:40 X2:600
+        second
+
+
+        """
+    )
+    captions = parse_srt(contents)
+
+    assert [(c.start, c.end, c.text) for c in captions] == [
+        (1.0, 2.5, "first\n\nstill first"),
+        (2.005, 4.0, "second\n"),
+    ]
+
+
+def test_parse_srt_splits_malformed_captions_like_srt() -> None:
+    contents = textwrap.dedent(
+        """\
+        00:00:01,000 --> 00:00:02,000
+        no index above
+
+        2
+        00:00:02,000 --> 00:00:03,000
+
+        3
+        00:00:03,000 --> 00:00:04,000
+        after an empty body
+        00:00:04,000 --> 00:00:05,000
+        a timing line with no blank line before it
+        """
+    )
+
+    assert [(c.start, c.end, c.text) for c in parse_srt(contents)] == [
+        (1.0, 2.0, "no index above"),
+        (2.0, 3.0, ""),
+        (
+            3.0,
+            4.0,
+            "after an empty body\n00:00:04,000 --> 00:00:05,000\n"
+            "a timing line with no blank line before it",
+        ),
+    ]
+
+
+def test_parse_srt_matches_srt_on_malformed_input() -> None:
+    import random
+
+    srt = pytest.importorskip("srt")
+
+    rng = random.Random(0)
+    pieces = [
+        "",
+        "",
+        " ",
+        "7",
+        "12 ",
+        "00:00:01,500 --> 00:00:03,000",
+        "00:00:04.2 -> 00:00:05 X1:40",
+        "00:00:06,000",
+        "text",
+        "more text",
+        "\r",
+    ]
+    for _ in range(500):
+        lines = [rng.choice(pieces) for _ in range(rng.randrange(12))]
+        contents = rng.choice(["", "\ufeff"]) + rng.choice(["\n", "\r\n"]).join(
+            lines
+        )
+        expected = [
+            (
+                s.start.total_seconds(),
+                s.end.total_seconds(),
+                s.content.replace("\r", "\n"),
+            )
+            for s in srt.parse(contents, ignore_errors=True)
+        ]
+
+        captions = parse_srt(contents)
+        assert [(c.start, c.end, c.text) for c in captions] == expected, contents
+        assert parse_srt(contents.encode("utf-8")) == captions
+
+
+def test_caption_store_slices_share_the_text_buffer() -> None:
+    captions = parse_srt(SAMPLE_SRT)
+    window = captions[2:5]
+
+    assert window.buffer is captions.buffer
+    assert [c.text for c in window] == [c.text for c in list(captions)[2:5]]
+    assert captions.take([4, 2])[0] == captions[4]
+
+
+def test_caption_index_range_queries_match_a_scan() -> None:
+    import random
+
+    from glancer.parser import Caption, CaptionIndex, CaptionStore
+
+    rng = random.Random(0)
+    captions = []
+    for index in range(300):
+        start = rng.uniform(0, 600)
+        duration = rng.choice([0.0, rng.uniform(0.5, 8), rng.uniform(30, 90)])
+        captions.append(Caption(start, start + duration, f"caption {index}"))
+    index = CaptionIndex(CaptionStore.from_captions(captions))
+
+    for _ in range(200):
+        t0 = rng.uniform(-10, 620)
+        t1 = t0 + rng.uniform(0, 60)
+        expected = [
+            c for c in captions if c.start < t1 and (c.end > t0 or c.start >= t0)
+        ]
+        assert list(index.overlapping(t0, t1)) == expected
+
+
+def test_load_captions_reuses_the_parsed_arrays(tmp_path) -> None:
+    from unittest.mock import patch
+
+    from glancer.parser import load_captions
+
+    path = tmp_path / "video.en.srt"
+    path.write_text(SAMPLE_SRT, encoding="utf-8")
+
+    first = load_captions(path)
+    with patch("glancer.parser.parse_srt") as parse:
+        second = load_captions(path)
+
+    parse.assert_not_called()
+    assert first == parse_srt(SAMPLE_SRT)
+    assert second == first
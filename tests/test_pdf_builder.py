@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import random
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from glancer import pdf_builder
+from glancer.frames import Frame, FrameStore
+from glancer.parser import Caption, CaptionStore
+from glancer.pdf_builder import escape_typst, generate_typst, stage_stills
+from glancer.process import Video
+from glancer.slides import Slide
+from glancer.typst_compiler import TypstBuild
+
+# Typst markup, lookalikes and multi-byte characters mixed with plain text
+ALPHABET = "\\#$*_<>@[]{}()=-+/`'\"~ \n\tabcXYZ019éü→中😀"
+
+
+def _random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randrange(0, 60)))
+
+
+def _reference_escape_typst(text: str) -> str:
+    """The sequential replacements :func:`escape_typst` must match."""
+    replacements = [
+        ("\\", "\\\\"),
+        ("#", "\\#"),
+        ("$", "\\$"),
+        ("*", "\\*"),
+        ("_", "\\_"),
+        ("<", "\\<"),
+        (">", "\\>"),
+        ("@", "\\@"),
+        ("[", "\\["),
+        ("]", "\\]"),
+    ]
+    for old, new in replacements:
+        text = text.replace(old, new)
+    return text
+
+
+def _reference_generate_typst(
+    video: Video, slides: list[Slide], image_dir: Path, compact: bool, slide_mode: bool
+) -> str:
+    """The document as nested f-strings, the way it used to be assembled."""
+    blocks = []
+    for slide in slides:
+        if slide_mode:
+            block = pdf_builder.render_slide_page(slide, video.url, image_dir)
+        elif compact:
+            block = pdf_builder.render_slide_compact(slide, video.url, image_dir)
+        else:
+            block = pdf_builder.render_slide_typst(slide, video.url, image_dir)
+        if block:
+            blocks.append(block)
+    slides_content = "\n".join(blocks)
+    if slide_mode:
+        header = pdf_builder.generate_header_slide_mode(video)
+        return f"""{header}
+
+{slides_content}
+"""
+    header = pdf_builder.generate_header(video, compact)
+    gutter = "0.3cm" if compact else "0.4cm"
+    return f"""{header}
+
+#columns(2, gutter: {gutter})[
+{slides_content}
+]
+"""
+
+
+def _slide(index: int, seen_elsewhere: bool = False) -> Slide:
+    captions = CaptionStore.from_captions([])
+    return Slide(index, captions, False, index * 30, seen_elsewhere)
+
+
+def test_staged_stills_are_linked_from_one_stored_copy(tmp_path: Path) -> None:
+    frames = FrameStore(
+        [Frame(0, b"first"), Frame(1, b"second"), Frame(2, b"first"), Frame(3, b"x")]
+    )
+    slides = [_slide(0), _slide(1), _slide(2), _slide(3, seen_elsewhere=True)]
+    stills_dir = tmp_path / "stills"
+    builds = [stills_dir / "build-a", stills_dir / "build-b"]
+    stills_dir.mkdir()
+
+    for build in builds:
+        build.mkdir()
+        stage_stills(frames, slides, build, stills_dir)
+
+    stored = [path.read_bytes() for path in stills_dir.iterdir() if path.is_file()]
+    assert sorted(stored) == [b"first", b"second"]
+    for build in builds:
+        staged = sorted(path.name for path in build.iterdir())
+        assert staged == ["img0000.jpg", "img0001.jpg", "img0002.jpg"]
+        assert (build / "img0002.jpg").read_bytes() == b"first"
+        assert (build / "img0000.jpg").samefile(builds[0] / "img0002.jpg")
+
+
+def test_escape_typst_matches_sequential_replacements() -> None:
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = _random_text(rng)
+        assert escape_typst(text) == _reference_escape_typst(text)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_streamed_document_is_byte_identical(seed: int, tmp_path: Path) -> None:
+    rng = random.Random(seed)
+    video = Video("http://example.com/watch?v=x", _random_text(rng), "x")
+    slides = []
+    for index in range(rng.randrange(0, 40)):
+        captions = CaptionStore.from_captions(
+            Caption(index * 30.0, index * 30.0 + 5, _random_text(rng))
+            for _ in range(rng.randrange(0, 4))
+        )
+        seen = rng.random() < 0.1
+        slides.append(Slide(index, captions, False, index * 30, seen))
+        # Some stills are missing, which drops their slide from the document
+        if rng.random() < 0.8:
+            suffix = rng.choice([".jpg", ".webp"])
+            (tmp_path / f"img{index:04d}{suffix}").write_bytes(b"still")
+    build = TypstBuild(tmp_path / "build")
+
+    for compact, slide_mode in [(False, False), (True, False), (False, True)]:
+        expected = _reference_generate_typst(
+            video, slides, tmp_path, compact, slide_mode
+        )
+        assert generate_typst(video, slides, tmp_path, compact, slide_mode) == expected
+        document = pdf_builder.typst_stream(
+            video, slides, tmp_path, compact, slide_mode
+        )
+        with patch("glancer.typst_compiler.subprocess.run"):
+            build.compile(document, tmp_path / "talk.pdf")
+        assert build.main_file.read_bytes() == expected.encode("utf-8")
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+
+import pytest
+
+from glancer.pipeline import Stage, run_pipeline
+
+
+def test_results_keep_input_order_with_concurrent_stages() -> None:
+    rng = random.Random(0)
+    delays = {item: rng.random() / 200 for item in range(30)}
+
+    def slow(offset: int):
+        def stage(item: int) -> int:
+            time.sleep(delays[item % 30])
+            return item + offset
+
+        return stage
+
+    stages = [Stage("a", slow(0), 4), Stage("b", slow(100), 3), Stage("c", slow(0), 2)]
+    assert list(run_pipeline(range(30), stages)) == [item + 100 for item in range(30)]
+
+
+def test_next_item_starts_while_previous_is_in_a_later_stage() -> None:
+    second_downloaded = threading.Event()
+
+    def download(item: int) -> int:
+        if item == 1:
+            second_downloaded.set()
+        return item
+
+    def extract(item: int) -> int:
+        # Item 0 can only finish once item 1 went through the first stage
+        if item == 0:
+            assert second_downloaded.wait(timeout=5)
+        return item
+
+    stages = [Stage("download", download), Stage("extract", extract)]
+    assert list(run_pipeline(range(3), stages)) == [0, 1, 2]
+
+
+def test_slow_consumer_holds_back_the_first_stage() -> None:
+    started: list[int] = []
+    stages = [Stage("download", lambda item: started.append(item) or item)]
+
+    results = run_pipeline(range(10), stages, max_in_flight=2)
+    assert next(results) == 0
+    time.sleep(0.05)
+    assert len(started) <= 3
+    assert list(results) == list(range(1, 10))
+
+
+def test_failure_is_raised_after_earlier_results() -> None:
+    rendered: list[int] = []
+
+    def extract(item: int) -> int:
+        if item == 2:
+            raise RuntimeError("ffmpeg failed")
+        return item
+
+    stages = [Stage("extract", extract), Stage("render", rendered.append)]
+    with pytest.raises(RuntimeError, match="ffmpeg failed"):
+        list(run_pipeline(range(6), stages))
+    assert rendered == [0, 1]
+
+
+@pytest.mark.parametrize("stop_early", [False, True])
+def test_results_nothing_takes_are_cleaned_up(stop_early: bool) -> None:
+    lock = threading.Lock()
+    calls: dict[str, list[int]] = {
+        name: [] for name in ("downloaded", "handed", "extracted")
+    }
+    released: dict[str, list[int]] = {"download": [], "extract": []}
+
+    def record(name: str, item: int) -> None:
+        with lock:
+            calls[name].append(item)
+
+    def download(item: int) -> int:
+        record("downloaded", item)
+        return item
+
+    def extract(item: int) -> int:
+        record("handed", item)
+        if item == 2:
+            raise RuntimeError("ffmpeg failed")
+        record("extracted", item)
+        return item
+
+    def release(stage: str):
+        def cleanup(item: int) -> None:
+            with lock:
+                released[stage].append(item)
+
+        return cleanup
+
+    stages = [
+        Stage("download", download, 4, release("download")),
+        Stage("extract", extract, 1, release("extract")),
+    ]
+    results = run_pipeline(range(10), stages)
+    if stop_early:
+        yielded = [next(results)]
+        results.close()
+    else:
+        yielded = []
+        with pytest.raises(RuntimeError, match="ffmpeg failed"):
+            for result in results:
+                yielded.append(result)
+
+    # Each result went on to the next stage or the consumer, or was released
+    assert sorted(calls["handed"] + released["download"]) == sorted(calls["downloaded"])
+    assert sorted(yielded + released["extract"]) == sorted(calls["extracted"])
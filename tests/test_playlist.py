@@ -1,26 +1,96 @@
 from __future__ import annotations
 
+import subprocess
 from unittest.mock import MagicMock, patch
 
+import pytest
+
 from glancer.playlist import Playlist
+from glancer.process import Video
+
+
+class FakeStdout:
+    def __init__(self, lines) -> None:
+        self.lines = lines
+        self.closed = False
 
+    def __iter__(self):
+        return iter(self.lines)
 
-@patch("subprocess.run")
-def test_playlist_iteration(mock_run: MagicMock) -> None:
-    mock_run.return_value.stdout = "video1\nvideo2\nvideo3"
+    def close(self) -> None:
+        self.closed = True
+
+
+@patch("subprocess.Popen")
+def test_playlist_iteration(mock_popen: MagicMock) -> None:
+    mock_popen.return_value.stdout = FakeStdout(
+        [
+            '{"id": "video1", "title": "First", "duration": 61.0}\n',
+            '{"id": "video2", "title": "Second", "duration": null}\n',
+            '{"id": "video3"}\n',
+        ]
+    )
+    mock_popen.return_value.returncode = 0
     playlist = Playlist("http://playlist.test")
-    urls = list(playlist)
-    assert urls == [
-        "https://www.youtube.com/watch?v=video1",
-        "https://www.youtube.com/watch?v=video2",
-        "https://www.youtube.com/watch?v=video3",
+    videos = list(playlist)
+    assert videos == [
+        Video("https://www.youtube.com/watch?v=video1", "First", "video1", 61),
+        Video("https://www.youtube.com/watch?v=video2", "Second", "video2"),
+        Video("https://www.youtube.com/watch?v=video3", "", "video3"),
     ]
-    mock_run.assert_called_once_with(
-        ["yt-dlp", "--flat-playlist", "-i", "--get-id", "http://playlist.test"],
-        check=True,
-        capture_output=True,
-        text=True,
-    )
+    assert mock_popen.call_args.args[0] == [
+        "yt-dlp",
+        "--flat-playlist",
+        "-i",
+        "--dump-json",
+        "http://playlist.test",
+    ]
+
+
+@patch("subprocess.Popen")
+def test_entries_are_yielded_while_the_listing_continues(
+    mock_popen: MagicMock,
+) -> None:
+    received: list[str] = []
+
+    def listing():
+        yield '{"id": "first", "title": "First"}\n'
+        # The first video is already out before yt-dlp prints the second
+        assert received == ["first"]
+        yield '{"id": "second", "title": "Second"}\n'
+
+    mock_popen.return_value.stdout = FakeStdout(listing())
+    mock_popen.return_value.returncode = 0
+
+    for video in Playlist("http://playlist.test", items="11:"):
+        received.append(video.video_id)
+
+    assert received == ["first", "second"]
+    command = mock_popen.call_args.args[0]
+    assert command[command.index("--playlist-items") + 1] == "11:"
+
+
+@patch("subprocess.Popen")
+def test_stopping_early_kills_the_listing(mock_popen: MagicMock) -> None:
+    process = mock_popen.return_value
+    process.stdout = FakeStdout(['{"id": "a", "title": "A"}\n'] * 3)
+
+    videos = iter(Playlist("http://playlist.test"))
+    next(videos)
+    videos.close()
+
+    process.kill.assert_called_once()
+    assert process.stdout.closed
+
+
+@patch("subprocess.Popen")
+def test_failed_listing_raises(mock_popen: MagicMock) -> None:
+    mock_popen.return_value.stdout = FakeStdout([])
+    mock_popen.return_value.returncode = 1
+
+    with pytest.raises(subprocess.CalledProcessError):
+        list(Playlist("http://playlist.test"))
+
 
 def test_is_playlist() -> None:
     assert Playlist.is_playlist("https://www.youtube.com/playlist?list=123")
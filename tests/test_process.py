@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import http.server
+import json
+import re
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import Iterator
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from glancer.process import (
+    DownloadProfile,
+    RemoteStream,
+    Video,
+    _generate_shots,
+    _generate_video,
+    _seek_args,
+    _single_pass_args,
+    download_for_extraction,
+    get_keyframe_times,
+    get_video_metadata,
+    first_keyframe_from,
+    nearest_keyframe,
+    shot_targets,
+)
+
+
+def test_single_pass_args_decode_input_once(tmp_path: Path) -> None:
+    video_path = tmp_path / "video.mp4"
+    cmd = _single_pass_args(video_path, thumbnail_output="pipe:5")
+
+    assert cmd.count("-i") == 1
+    assert cmd[cmd.index("-i") + 1] == str(video_path)
+    assert "pipe:1" in cmd
+    assert cmd[-1] == "pipe:5"
+
+
+@patch("glancer.process.run_ffmpeg_frames")
+def test_generate_shots_spawns_single_ffmpeg(
+    mock_frames: MagicMock, tmp_path: Path
+) -> None:
+    mock_frames.return_value = [(b"jpeg0", b"t" * 72), (b"jpeg1", None)]
+
+    frames = _generate_shots(tmp_path, "video", "error")
+
+    mock_frames.assert_called_once()
+    assert frames.indexes() == [0, 1]
+    first = frames.get(0)
+    assert first is not None
+    assert first.thumbnail == b"t" * 72
+    assert frames.shot_times() == {}
+
+
+def test_shot_targets_follow_decode_grid() -> None:
+    assert shot_targets(100) == [3.0, 30.0, 60.0, 90.0]
+    assert shot_targets(0) == [3.0]
+
+
+def test_nearest_keyframe_picks_closest() -> None:
+    keyframes = [0.0, 9.8, 20.2, 41.0]
+    assert nearest_keyframe(keyframes, 3.0) == 0.0
+    assert nearest_keyframe(keyframes, 30.0) == 20.2
+    assert nearest_keyframe(keyframes, 100.0) == 41.0
+    assert nearest_keyframe([], 30.0) == 30.0
+
+
+def test_first_keyframe_from_never_goes_back() -> None:
+    keyframes = [0.0, 9.8, 20.2, 41.0]
+    assert first_keyframe_from(keyframes, 3.0) == 9.8
+    assert first_keyframe_from(keyframes, 9.8) == 9.8
+    assert first_keyframe_from(keyframes, 50.0) == 41.0
+    assert first_keyframe_from([], 3.0) == 3.0
+
+
+@patch("glancer.process.subprocess.run")
+def test_get_keyframe_times_reads_keyframe_packets(
+    mock_run: MagicMock, tmp_path: Path
+) -> None:
+    mock_run.return_value.stdout = (
+        "0.000000,K__\n0.040000,___\nN/A,K__\n10.010000,K__\n"
+    )
+    assert get_keyframe_times(tmp_path / "video.mp4") == [0.0, 10.01]
+
+
+def test_seek_args_use_one_input_per_shot(tmp_path: Path) -> None:
+    cmd = _seek_args(tmp_path / "video.mp4", [0.0, 30.0], keyframes_only=True)
+
+    assert cmd.count("-i") == 2
+    assert cmd.count("-skip_frame") == 2
+    assert "concat=n=2" in cmd[cmd.index("-filter_complex") + 1]
+
+
+@patch("glancer.process.get_keyframe_times", return_value=[0.0, 4.5, 28.0, 62.0])
+@patch("glancer.process.get_video_duration", return_value=70)
+@patch("glancer.process.run_ffmpeg_frames")
+def test_keyframe_mode_reports_keyframe_timestamps(
+    mock_frames: MagicMock, _duration: MagicMock, _keyframes: MagicMock, tmp_path: Path
+) -> None:
+    mock_frames.return_value = [(b"a", None), (b"b", None), (b"c", None)]
+
+    frames = _generate_shots(tmp_path, "video", "error", "keyframe")
+
+    # Shot 0 takes the first keyframe past the intro, not the one at 0s
+    assert frames.shot_times() == {0: 4.5, 1: 28.0, 2: 62.0}
+    mock_frames.assert_called_once()
+
+
+@patch("glancer.process.get_video_duration")
+@patch("glancer.process.run_ffmpeg_frames", return_value=[(b"a", None)] * 3)
+def test_known_duration_skips_ffprobe(
+    _frames: MagicMock, mock_duration: MagicMock, tmp_path: Path
+) -> None:
+    frames = _generate_shots(tmp_path, "video", "error", "seek", duration=70)
+
+    mock_duration.assert_not_called()
+    assert frames.shot_times() == {0: 3.0, 1: 30.0, 2: 60.0}
+
+
+@patch("glancer.process.subprocess.run")
+def test_metadata_comes_from_one_yt_dlp_call(mock_run: MagicMock) -> None:
+    info = {
+        "id": "abc",
+        "title": "A talk",
+        "duration": 3599.5,
+        "formats": [{"format_id": "22"}],
+        "subtitles": {"en": []},
+        "automatic_captions": {"en": [], "de": []},
+    }
+    mock_run.return_value.stdout = json.dumps(info)
+
+    video = get_video_metadata("https://youtube.com/watch?v=abc")
+
+    mock_run.assert_called_once()
+    assert "--dump-single-json" in mock_run.call_args.args[0]
+    assert video == Video(
+        "https://youtube.com/watch?v=abc", "A talk", "abc", 3599, ("de", "en")
+    )
+    assert video.info_json is not None
+    assert json.loads(video.info_json) == info
+
+
+@patch("glancer.process.subprocess.run")
+def test_download_reuses_fetched_metadata(mock_run: MagicMock, tmp_path: Path) -> None:
+    video = Video("https://youtube.com/watch?v=abc", "A talk", "abc", info_json="{}")
+
+    _generate_video(video, tmp_path)
+
+    command = mock_run.call_args.args[0]
+    assert command[-2:] == ["--load-info-json", str(tmp_path / "abc.info.json")]
+    assert video.url not in command
+    assert (tmp_path / "abc.info.json").read_text() == "{}"
+
+
+@patch("glancer.process._generate_shots")
+def test_stills_are_reused_until_their_inputs_change(
+    mock_shots: MagicMock, tmp_path: Path
+) -> None:
+    from glancer.frames import Frame, FrameStore
+    from glancer.process import generate_stills
+
+    video_path = tmp_path / "abc.mp4"
+    video_path.write_bytes(b"video")
+    mock_shots.return_value = FrameStore([Frame(0, b"jpeg", timestamp=3.0)])
+
+    first = generate_stills(tmp_path, "abc", "error", "seek", duration=40)
+    again = generate_stills(tmp_path, "abc", "error", "seek", duration=40)
+    assert mock_shots.call_count == 1
+    assert list(again) == list(first)
+    first_key = first.key
+    assert first_key is not None and again.key == first_key
+
+    generate_stills(tmp_path, "abc", "error", "keyframe", duration=40)
+    assert mock_shots.call_count == 2
+
+    # A new download invalidates the stills taken from the old one
+    video_path.write_bytes(b"another video")
+    redownloaded = generate_stills(tmp_path, "abc", "error", "seek", duration=40)
+    assert mock_shots.call_count == 3
+    assert redownloaded.key != first_key
+
+
+@patch("glancer.process.get_video_duration", return_value=120)
+def test_duration_probe_is_remembered(mock_duration: MagicMock, tmp_path: Path) -> None:
+    from glancer.process import probe_duration
+
+    video_path = tmp_path / "abc.mp4"
+    video_path.write_bytes(b"video")
+
+    assert probe_duration(tmp_path, video_path) == 120
+    assert probe_duration(tmp_path, video_path) == 120
+    mock_duration.assert_called_once()
+
+
+@patch("glancer.process._generate_video")
+def test_recorded_download_is_reused(mock_download: MagicMock, tmp_path: Path) -> None:
+    from glancer.process import download_video_and_captions
+
+    def download(video: Video, directory: Path, profile: DownloadProfile) -> None:
+        (directory / "abc.mp4").write_bytes(b"video")
+        (directory / "abc.en.srt").write_text("")
+
+    mock_download.side_effect = download
+    video = Video("https://youtube.com/watch?v=abc", "A talk", "abc")
+
+    download_video_and_captions(video, tmp_path)
+    download_video_and_captions(video, tmp_path)
+    mock_download.assert_called_once()
+
+    # Another stream is another download
+    download_video_and_captions(video, tmp_path, DownloadProfile(lean=True))
+    assert mock_download.call_count == 2
+
+
+@patch("glancer.process.subprocess.run")
+def test_lean_profile_downloads_only_video(mock_run: MagicMock, tmp_path: Path) -> None:
+    video = Video("https://youtube.com/watch?v=abc", "A talk", "abc")
+
+    _generate_video(video, tmp_path, DownloadProfile(lean=True, max_height=480))
+    lean = mock_run.call_args.args[0]
+    _generate_video(video, tmp_path)
+    full = mock_run.call_args.args[0]
+
+    video_format = lean[lean.index("-f") + 1]
+    assert "ba" not in video_format.split("/")[0]
+    assert "[height<=480]" in video_format
+    assert lean[lean.index("--concurrent-fragments") + 1] == "4"
+    assert "-k" not in lean and "--merge-output-format" not in lean
+    assert "-k" in full and "+ba" in full[full.index("-f") + 1]
+
+
+class RangeServer(http.server.ThreadingHTTPServer):
+    """Serves one file in ranges of at most ``CHUNK`` bytes, like a CDN might.
+
+    Counts the bytes sent and the most requests handled at once, and fails
+    the first ``failures`` requests with a 503.
+    """
+
+    CHUNK = 256 * 1024
+
+    def __init__(self, path: Path, failures: int = 0) -> None:
+        super().__init__(("127.0.0.1", 0), RangeHandler)
+        self.path = path
+        self.size = path.stat().st_size
+        self.failures = failures
+        self.sent = 0
+        self.active = 0
+        self.most_active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/video.mp4"
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: RangeServer
+
+    def do_GET(self) -> None:
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.most_active = max(server.most_active, server.active)
+            failing = server.failures > 0
+            server.failures -= failing
+        try:
+            if failing:
+                self.send_error(503)
+                return
+            match = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+            start = int(match.group(1)) if match else 0
+            end = min(start + server.CHUNK, server.size) - 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{server.size}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            with server.path.open("rb") as video:
+                video.seek(start)
+                self.wfile.write(video.read(end - start + 1))
+            with server.lock:
+                server.sent += end - start + 1
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture(scope="module")
+def synthetic_video(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    if shutil.which("ffmpeg") is None:
+        pytest.skip("ffmpeg not installed")
+    path = tmp_path_factory.mktemp("remote") / "video.mp4"
+    # Noise keeps the file large, so the bytes a seek reads stand out
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc2=size=160x120:rate=10,noise=alls=60:allf=t",
+            "-t",
+            "125",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-g",
+            "20",
+            "-qp",
+            "20",
+            "-movflags",
+            "+faststart",
+            str(path),
+        ],
+        check=True,
+    )
+    return path
+
+
+@pytest.fixture
+def range_server(synthetic_video: Path) -> Iterator[RangeServer]:
+    server = RangeServer(synthetic_video, failures=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@patch("glancer.process.REMOTE_RETRY_SECONDS", 0)
+def test_remote_extraction_fetches_only_ranges(
+    range_server: RangeServer, tmp_path: Path
+) -> None:
+    frames = _generate_shots(
+        tmp_path,
+        "video",
+        "error",
+        "remote",
+        duration=125,
+        source=range_server.url,
+        connections=2,
+    )
+
+    # The failed first request was retried
+    assert frames.indexes() == [0, 1, 2, 3, 4]
+    assert frames.shot_times() == {0: 3.0, 1: 30.0, 2: 60.0, 3: 90.0, 4: 120.0}
+    assert all(frame.thumbnail is not None for frame in frames)
+    assert range_server.most_active <= 2
+    assert range_server.sent < range_server.size / 4
+
+
+@patch("glancer.process.subprocess.run")
+def test_remote_extraction_downloads_only_captions(
+    mock_run: MagicMock, tmp_path: Path
+) -> None:
+    video = Video("https://youtube.com/watch?v=abc", "A talk", "abc")
+    profile = DownloadProfile(max_height=480, connections=8)
+
+    captions_path, stream = download_for_extraction(video, tmp_path, "remote", profile)
+
+    command = mock_run.call_args.args[0]
+    assert "--skip-download" in command and "-f" not in command
+    assert captions_path == tmp_path / "abc.en.srt"
+    assert stream is not None
+    assert stream == RemoteStream(video, profile)
+    # A single video-only stream, which ffmpeg can seek in
+    assert stream.video_format.startswith("bv[height<=480]")
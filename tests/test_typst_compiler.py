@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from glancer.typst_compiler import TypstCompiler
+
+
+class FakeCompiler:
+    """Stands in for ``typst.Compiler``, counting instances and overlap."""
+
+    created = 0
+    running = 0
+    most_running = 0
+    lock = threading.Lock()
+
+    def __init__(self, input: str, root: str) -> None:
+        type(self).created += 1
+        self.input = input
+
+    def compile(self, output: str) -> None:
+        cls = type(self)
+        with cls.lock:
+            cls.running += 1
+            cls.most_running = max(cls.most_running, cls.running)
+        time.sleep(0.01)
+        Path(output).write_text(Path(self.input).read_text())
+        with cls.lock:
+            cls.running -= 1
+
+
+@pytest.fixture
+def bindings(monkeypatch: pytest.MonkeyPatch):
+    # A fresh subclass per test, so the counts start at zero
+    compiler = type(
+        "Compiler",
+        (FakeCompiler,),
+        {"created": 0, "running": 0, "most_running": 0, "lock": threading.Lock()},
+    )
+    monkeypatch.setitem(sys.modules, "typst", types.SimpleNamespace(Compiler=compiler))
+    return compiler
+
+
+def test_subprocess_backend_builds_in_a_cleared_directory(tmp_path: Path) -> None:
+    with patch("glancer.typst_compiler.subprocess.run") as run, TypstCompiler(
+        workers=1, backend="subprocess", directory=tmp_path / "typst"
+    ) as compiler:
+        with compiler.build() as build:
+            (build.path / "img0000.jpg").write_bytes(b"still")
+            build.compile("= First", tmp_path / "first.pdf")
+        with compiler.build() as second:
+            assert second.path == build.path
+            assert list(second.path.iterdir()) == []
+
+    command = run.call_args.args[0]
+    assert command[:4] == ["typst", "compile", "--root", str(build.path)]
+    assert command[4:] == [str(build.main_file), str(tmp_path / "first.pdf")]
+    assert not (tmp_path / "typst" / "build0").exists()
+
+
+def test_compilers_sharing_a_root_build_apart(tmp_path: Path) -> None:
+    root = tmp_path / "typst"
+    with TypstCompiler(workers=1, directory=root) as first:
+        with TypstCompiler(workers=1, directory=root) as second:
+            with first.build() as mine, second.build() as theirs:
+                assert mine.path != theirs.path
+                (mine.path / "img0000.jpg").write_bytes(b"still")
+        # Closing the other compiler leaves this one's builds alone
+        assert (mine.path / "img0000.jpg").exists()
+    assert list(root.iterdir()) == []
+
+
+def test_bindings_keep_one_compiler_per_worker(bindings, tmp_path: Path) -> None:
+    with TypstCompiler(workers=1, directory=tmp_path / "typst") as compiler:
+        for index in range(3):
+            with compiler.build() as build:
+                build.compile(f"= Talk {index}", tmp_path / f"{index}.pdf")
+
+    assert bindings.created == 1
+    assert (tmp_path / "2.pdf").read_text() == "= Talk 2"
+
+
+def test_compiles_are_bounded_by_workers(bindings, tmp_path: Path) -> None:
+    compiler = TypstCompiler(workers=2, backend="bindings")
+
+    def build(index: int) -> None:
+        with compiler.build() as build:
+            build.compile(f"= Talk {index}", tmp_path / f"{index}.pdf")
+
+    with compiler, ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(build, range(12)))
+
+    assert bindings.most_running == 2
+    assert bindings.created == 2
+    assert len(list(tmp_path.glob("*.pdf"))) == 12
+    assert not compiler.directory.exists()
+
+
+def test_missing_bindings_fall_back_to_the_cli(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setitem(sys.modules, "typst", None)
+
+    with pytest.raises(ImportError):
+        with TypstCompiler(backend="bindings", directory=tmp_path) as compiler:
+            with compiler.build():
+                pass
+    with patch("glancer.typst_compiler.subprocess.run") as run, TypstCompiler(
+        directory=tmp_path
+    ) as compiler:
+        with compiler.build() as build:
+            build.compile("= Talk", tmp_path / "talk.pdf")
+    run.assert_called_once()